@@ -0,0 +1,68 @@
+import republic.benchmark.benchmark_runner as bench_runner
+
+
+usage = 'usage: do_benchmarks.py [-b <benchmark>[,<benchmark>...]] [-n <num_scans>] [-r <repeat>] ' \
+        '[-o <results_file>] [-c <baseline_results_file>] [-d <sample_dir> -i <inventory_num> ' \
+        '-p <period_start>] [-m]'
+
+
+if __name__ == "__main__":
+    import getopt
+    import sys
+
+    argv = sys.argv[1:]
+    try:
+        opts, args = getopt.getopt(argv, 'b:n:r:o:c:d:i:p:m')
+    except getopt.GetoptError:
+        print(usage)
+        sys.exit(2)
+    benchmark_names = None
+    fixture_config = {}
+    repeat = 3
+    results_file = 'benchmark_results.jsonl'
+    baseline_file = None
+    sample_dir = None
+    inventory_metadata = {}
+    measure_memory = True
+    for opt, arg in opts:
+        if opt == '-b':
+            benchmark_names = arg.split(',')
+        if opt == '-n':
+            fixture_config['num_scans'] = int(arg)
+        if opt == '-r':
+            repeat = int(arg)
+        if opt == '-o':
+            results_file = arg
+        if opt == '-c':
+            baseline_file = arg
+        if opt == '-d':
+            sample_dir = arg
+        if opt == '-i':
+            inventory_metadata['inventory_num'] = int(arg)
+        if opt == '-p':
+            inventory_metadata['period_start'] = arg
+        if opt == '-m':
+            measure_memory = False
+    if benchmark_names:
+        for name in benchmark_names:
+            if name not in bench_runner.benchmarks:
+                print(f'unknown benchmark {name}, choose from {", ".join(bench_runner.benchmarks)}')
+                sys.exit(2)
+    if sample_dir:
+        if 'inventory_num' not in inventory_metadata or 'period_start' not in inventory_metadata:
+            print('sample scans need the inventory number (-i) and start of the inventory period (-p)')
+            print(usage)
+            sys.exit(2)
+        fixture = bench_runner.make_sample_fixture(sample_dir, inventory_metadata,
+                                                   max_scans=fixture_config.get('num_scans'))
+    else:
+        fixture = bench_runner.make_synthetic_fixture(fixture_config)
+    print(f'running benchmarks on fixture {fixture.name} with {len(fixture.scans)} scans')
+    results = bench_runner.run_benchmarks(fixture, benchmark_names=benchmark_names, repeat=repeat,
+                                          measure_memory=measure_memory)
+    bench_runner.write_results(results, results_file)
+    print(f'results appended to {results_file}')
+    if baseline_file:
+        regressions = bench_runner.compare_results(bench_runner.read_results(baseline_file), results)
+        if len(regressions) > 0:
+            sys.exit(1)
@@ -1,12 +1,18 @@
+import datetime
+import json
+import multiprocessing
 import os
+import traceback
 
 import republic.elastic.republic_elasticsearch as rep_es
 import republic.elastic.republic_indexing as rep_indexing
 import republic.download.republic_data_downloader as downloader
 from republic.config.republic_config import base_config, set_config_inventory_num
 from republic.model.inventory_mapping import get_inventories_by_year
+from republic.model.republic_document_model import get_resolution_searchers
 import republic.analyser.republic_inventory_analyser as inv_analyser
 import republic.elastic.republic_page_checks as page_checker
+import republic.helper.indexing_monitor as indexing_monitor
 # import republic.parser.republic_file_parser as file_parser
 from republic.fuzzy.fuzzy_context_searcher import FuzzyContextSearcher
 from republic.model.republic_phrase_model import resolution_phrases, spelling_variants
@@ -23,10 +29,20 @@ print('host_type:', host_type)
 
 es_anno = rep_es.initialize_es(host_type=host_type)
 es_tr = rep_es.initialize_es_text_repo()
+indexing_monitor.monitor.attach_es(es_anno, es_tr)
+# serialises writes to the checkpoint ledger by worker processes
+ledger_lock = multiprocessing.Lock()
 
 data_type = "hocr"
 base_dir = "/data/republic/"
 
+# the indexing steps per OCR type, in the order in which they depend on each other
+indexing_steps_per_ocr_type = {
+    "hocr": ["scans_pages"],
+    "pagexml": ["download", "scans", "pages", "scans_pages", "page_types", "session-lines",
+                "session_text", "resolutions", "phrase_matches", "resolution_metadata"],
+}
+
 years = [
     #1743,
     #1744,
@@ -166,7 +182,9 @@ def do_resolution_metadata_indexing(inv_num, inv_config, year):
     rep_indexing.index_inventory_resolution_metadata(es_anno, inv_config)
 
 
-def process_inventory_hocr(inv_num, inv_config):
+def process_inventory_hocr(inv_num, inv_config, indexing_step):
+    if indexing_step != "scans_pages":
+        raise ValueError(f"unknown indexing step {indexing_step}")
     year = inv_config["year"]
     #do_downloading(inv_num, inv_config, year)
     #do_scan_indexing_hocr(inv_num, inv_config, year)
@@ -182,39 +200,189 @@ def process_inventory_pagexml(inv_num, inv_config, indexing_step):
     year = inv_config["year"]
     if indexing_step == "download":
         do_downloading(inv_num, inv_config, year)
-    if indexing_step == "scans_pages":
+    elif indexing_step == "scans_pages":
         do_scan_indexing_pagexml(inv_num, inv_config, year)
         do_page_indexing_pagexml(inv_num, inv_config, year)
-    if indexing_step == "scans":
+    elif indexing_step == "scans":
         do_scan_indexing_pagexml(inv_num, inv_config, year)
-    if indexing_step == "pages":
+    elif indexing_step == "pages":
         do_page_indexing_pagexml(inv_num, inv_config, year)
-    #if indexing_step == "metadata":
+    #elif indexing_step == "metadata":
     #    do_inventory_metadata_indexing_pagexml(inv_num, inv_config, year)
-    if indexing_step == "page_types":
+    elif indexing_step == "page_types":
         do_page_type_indexing_pagexml(inv_num, inv_config, year)
-    #if indexing_step == "page_numbers":
+    #elif indexing_step == "page_numbers":
     #    do_typed_page_number_indexing_pagexml(inv_num, inv_config, year)
-    if indexing_step == "session-lines":
+    elif indexing_step == "session-lines":
         do_session_lines_indexing(inv_num, inv_config, year)
-    if indexing_step == "session_text":
+    elif indexing_step == "session_text":
         do_session_text_indexing(inv_num, inv_config, year)
-    if indexing_step == "resolutions":
+    elif indexing_step == "resolutions":
         do_resolution_indexing(inv_num, inv_config, year)
-    if indexing_step == "phrase_matches":
+    elif indexing_step == "phrase_matches":
         do_resolution_phrase_match_indexing(inv_num, inv_config, year)
-    if indexing_step == "resolution_metadata":
+    elif indexing_step == "resolution_metadata":
         do_resolution_metadata_indexing(inv_num, inv_config, year)
-
-
-def process_inventories(inv_years, ocr_type, indexing_step):
-    for inv_map in get_inventories_by_year(inv_years):
-        inv_num = inv_map["inventory_num"]
-        inv_config = set_config_inventory_num(inv_num, ocr_type, base_config, base_dir=base_dir)
-        if ocr_type == "hocr":
-            process_inventory_hocr(inv_num, inv_config, indexing_step)
-        elif ocr_type == "pagexml":
-            process_inventory_pagexml(inv_num, inv_config, indexing_step)
+    else:
+        raise ValueError(f"unknown indexing step {indexing_step}")
+
+
+def check_indexing_steps(ocr_type, indexing_steps):
+    if ocr_type not in indexing_steps_per_ocr_type:
+        raise ValueError(f"unknown ocr type {ocr_type}")
+    known_steps = indexing_steps_per_ocr_type[ocr_type]
+    unknown_steps = [indexing_step for indexing_step in indexing_steps if indexing_step not in known_steps]
+    if len(unknown_steps) > 0:
+        raise ValueError(f"unknown indexing steps for {ocr_type}: {', '.join(unknown_steps)}, "
+                         f"known steps are: {', '.join(known_steps)}")
+
+
+def get_dependent_steps(indexing_step):
+    """Return the indexing steps that use the output of indexing_step, i.e. the steps after it."""
+    for known_steps in indexing_steps_per_ocr_type.values():
+        if indexing_step in known_steps:
+            return known_steps[known_steps.index(indexing_step)+1:]
+    return []
+
+
+def read_ledger(ledger_file):
+    """Return the set of (inventory_num, indexing_step) pairs that are recorded as done in the ledger.
+    When a step is (re)done or fails after the steps that depend on it were done, those steps
+    are no longer done, as they used the output of the earlier run of the step."""
+    done = set()
+    if not ledger_file or not os.path.isfile(ledger_file):
+        return done
+    with open(ledger_file, 'rt') as fh:
+        for line in fh:
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                # a partially written last line after a crash
+                continue
+            inv_num, indexing_step = entry["inventory_num"], entry["indexing_step"]
+            for dependent_step in get_dependent_steps(indexing_step):
+                done.discard((inv_num, dependent_step))
+            if entry["status"] == "done":
+                done.add((inv_num, indexing_step))
+            else:
+                done.discard((inv_num, indexing_step))
+    return done
+
+
+def write_ledger_entry(ledger_file, inv_num, indexing_step, status):
+    if not ledger_file:
+        return None
+    entry = {
+        "inventory_num": inv_num,
+        "indexing_step": indexing_step,
+        "status": status,
+        "timestamp": datetime.datetime.now().isoformat()
+    }
+    with ledger_lock:
+        with open(ledger_file, 'at') as fh:
+            fh.write(json.dumps(entry) + '\n')
+            fh.flush()
+            os.fsync(fh.fileno())
+
+
+def init_worker(lock, metrics_file):
+    # each worker process uses its own connections and the ledger lock of the parent,
+    # the metrics file is passed explicitly, as spawned workers don't inherit module state
+    global es_anno, es_tr, ledger_lock
+    es_anno = rep_es.initialize_es(host_type=host_type)
+    es_tr = rep_es.initialize_es_text_repo()
+    indexing_monitor.monitor.attach_es(es_anno, es_tr)
+    indexing_monitor.set_metrics_file(metrics_file)
+    ledger_lock = lock
+
+
+def process_inventory(inv_num, ocr_type, indexing_steps, ledger_file=None, done=None, run_id=None):
+    """Run the indexing steps for a single inventory in order, skipping the steps
+    that are already done according to the ledger and recording each finished step.
+    The duration, document counts, Elasticsearch requests and memory use of the
+    inventory and each step are recorded by the indexing monitor."""
+    # a copy, as steps that are redone invalidate the steps that depend on them
+    done = set() if done is None else set(done)
+    monitor = indexing_monitor.monitor
+    inv_config = set_config_inventory_num(inv_num, ocr_type, base_config, base_dir=base_dir)
+    with monitor.stage("inventory", run_id=run_id, inventory_num=inv_num) as inventory_record:
+        for indexing_step in indexing_steps:
+            if (inv_num, indexing_step) in done:
+                print(f"Skipping {indexing_step} for inventory {inv_num}, already done")
+                continue
+            try:
+                with monitor.stage(indexing_step, indexing_step=indexing_step):
+                    if ocr_type == "hocr":
+                        process_inventory_hocr(inv_num, inv_config, indexing_step)
+                    else:
+                        process_inventory_pagexml(inv_num, inv_config, indexing_step)
+            except Exception as err:
+                print(f"Error in {indexing_step} for inventory {inv_num}: {err}")
+                traceback.print_exc()
+                write_ledger_entry(ledger_file, inv_num, indexing_step, "failed")
+                inventory_record.status = "failed"
+                # later steps depend on earlier steps, so stop processing this inventory
+                return inv_num, False
+            write_ledger_entry(ledger_file, inv_num, indexing_step, "done")
+            for dependent_step in get_dependent_steps(indexing_step):
+                done.discard((inv_num, dependent_step))
+    return inv_num, True
+
+
+def process_inventories(inv_years, ocr_type, indexing_steps, num_workers=1, ledger_file=None, metrics_file=None,
+                        force=False):
+    """Process the inventories of the given years, either sequentially or with a pool
+    of num_workers processes handling one inventory each. If a ledger file is given,
+    (inventory, step) pairs that are already done are skipped, so an interrupted
+    run resumes at the first unfinished step of each inventory. With force, all steps
+    are run and recorded in the ledger, regardless of what is already done. If a metrics file
+    is given, the stage records of each inventory are appended to it as JSON lines
+    and a summary per indexing step is printed at the end of the run. Returns the numbers
+    of the inventories for which a step failed."""
+    if isinstance(indexing_steps, str):
+        indexing_steps = [indexing_steps]
+    check_indexing_steps(ocr_type, indexing_steps)
+    run_id = datetime.datetime.now().isoformat()
+    indexing_monitor.set_metrics_file(metrics_file)
+    failed = process_inventory_list(inv_years, ocr_type, indexing_steps, num_workers=num_workers,
+                                    ledger_file=ledger_file, metrics_file=metrics_file, run_id=run_id,
+                                    force=force)
+    if metrics_file and os.path.isfile(metrics_file):
+        print(f"\nIndexing metrics of run {run_id}:")
+        indexing_monitor.print_metrics_summary(indexing_monitor.read_metrics(metrics_file, run_id=run_id))
+    if len(failed) > 0:
+        print(f"\nIndexing failed for inventories: {', '.join(str(inv_num) for inv_num in failed)}")
+    return failed
+
+
+def process_inventory_list(inv_years, ocr_type, indexing_steps, num_workers=1, ledger_file=None,
+                           metrics_file=None, run_id=None, force=False):
+    """Process the inventories of the given years that have steps that are not done yet,
+    returning the numbers of the inventories that failed."""
+    done = set() if force else read_ledger(ledger_file)
+    inv_nums = [inv_map["inventory_num"] for inv_map in get_inventories_by_year(inv_years)]
+    inv_nums = [inv_num for inv_num in inv_nums
+                if any((inv_num, indexing_step) not in done for indexing_step in indexing_steps)]
+    failed = []
+    if num_workers <= 1:
+        for inv_num in inv_nums:
+            _, success = process_inventory(inv_num, ocr_type, indexing_steps, ledger_file=ledger_file,
+                                           done=done, run_id=run_id)
+            if not success:
+                failed.append(inv_num)
+        return failed
+    if "session_text" in indexing_steps or "resolutions" in indexing_steps:
+        # build the resolution searchers once, so the forked workers inherit them
+        get_resolution_searchers()
+    args = [(inv_num, ocr_type, indexing_steps, ledger_file, done, run_id) for inv_num in inv_nums]
+    with multiprocessing.Pool(processes=num_workers, initializer=init_worker,
+                              initargs=(ledger_lock, metrics_file), maxtasksperchild=1) as pool:
+        for inv_num, success in pool.starmap(process_inventory, args, chunksize=1):
+            status = 'finished' if success else 'failed'
+            print(f"Inventory {inv_num} {status}")
+            if not success:
+                failed.append(inv_num)
+    return failed
 
 
 if __name__ == "__main__":
@@ -225,32 +393,54 @@ if __name__ == "__main__":
     argv = sys.argv[1:]
     try:
         # Define the getopt parameters
-        opts, args = getopt.getopt(argv, 's:e:i:', ['foperand', 'soperand'])
-        start, end, indexing_step = None, None, None
+        opts, args = getopt.getopt(argv, 's:e:i:w:l:m:d:f', ['foperand', 'soperand'])
+        start, end, indexing_steps = None, None, None
+        num_workers = 1
+        # without a ledger file, all steps are run
+        ledger_file = None
+        force = False
+        metrics_file = os.path.join(base_dir, 'indexing_metrics.jsonl')
         for opt, arg in opts:
             if opt == '-s':
                 start = int(arg)
             if opt == '-e':
                 end = int(arg)
             if opt == '-i':
-                indexing_step = arg
+                indexing_steps = arg.split(',')
+            if opt == '-w':
+                num_workers = int(arg)
+            if opt == '-l':
+                ledger_file = arg
+            if opt == '-f':
+                # run all steps, even those that are done according to the ledger
+                force = True
+            if opt == '-m':
+                metrics_file = arg
+            if opt == '-d':
+                # keep local stores of the parsed scans and pages, so later steps can skip Elasticsearch
+                base_config['pagexml_store_dir'] = arg
             #print(f'opt: {opt} arg: {arg}')
-        if not start or not end or not indexing_step:
-            print ('usage: add.py -s <start_year> -e <end_year> -i <indexing_step>')
+        if not start or not end or not indexing_steps:
+            print ('usage: add.py -s <start_year> -e <end_year> -i <indexing_step>[,<indexing_step>...] '
+                   '[-w <num_workers>] [-l <ledger_file> [-f]] [-m <metrics_file>] [-d <store_dir>]')
             sys.exit(2)
         years = [year for year in range(start, end+1)]
 
     except getopt.GetoptError:
         # Print something useful
-        print ('usage: add.py -s <start_year> -e <end_year> -i <indexing_step>')
+        print ('usage: add.py -s <start_year> -e <end_year> -i <indexing_step>[,<indexing_step>...] '
+               '[-w <num_workers>] [-l <ledger_file> [-f]] [-m <metrics_file>] [-d <store_dir>]')
         sys.exit(2)
     #years = [year for year in range(1705, 1797)]
     #years = [year for year in range(1705, 1725)]
     #years = [1725, 1740]
     # Jesse respecten years
     #years = [1752, 1755, 1756, 1770, 1771, 1772, 1785]
-    print(f'indexing {indexing_step} for years', years)
+    print(f'indexing {", ".join(indexing_steps)} for years', years)
     ocr_type = "pagexml"
-    process_inventories(years, ocr_type, indexing_step)
+    failed_inventories = process_inventories(years, ocr_type, indexing_steps, num_workers=num_workers,
+                                             ledger_file=ledger_file, metrics_file=metrics_file, force=force)
+    if len(failed_inventories) > 0:
+        sys.exit(1)
 
 
@@ -1,6 +1,218 @@
 import re
+from bisect import bisect_right
+from collections import defaultdict
+from typing import Dict, Iterable, List, Tuple, Union
+
+import numpy as np
 import pandas as pd
 from ...fuzzy.fuzzy_keyword_searcher import score_levenshtein_distance_ratio
+from ...fuzzy.fuzzy_keyword_searcher import ScoringBackend, make_scoring_backend
+
+
+# the passes of the iterative search, from the strictest to the loosest
+search_passes = [
+    {'window': 0, 'fuzzy': False, 'sg': True, 'delegate': True, 'exact_year': True},
+    {'window': 30, 'fuzzy': False, 'sg': True, 'delegate': True, 'exact_year': False},
+    {'window': 10, 'fuzzy': True, 'sg': True, 'delegate': True, 'exact_year': True},
+    {'window': 30, 'fuzzy': True, 'sg': True, 'delegate': True, 'exact_year': False},
+    {'window': 0, 'fuzzy': False, 'sg': False, 'delegate': True, 'exact_year': True},
+    {'window': 30, 'fuzzy': False, 'sg': False, 'delegate': True, 'exact_year': False},
+    {'window': 10, 'fuzzy': True, 'sg': False, 'delegate': True, 'exact_year': True},
+    {'window': 30, 'fuzzy': True, 'sg': False, 'delegate': True, 'exact_year': False},
+]
+
+scoreboard = {1: 1.0, 2: 0.9, 3: 0.8, 4: 0.7, 5: 0.6, 6: 0.5, 7: 0.4, 8: 0.3}
+
+
+class DelegateIndex:
+
+    def __init__(self, df: pd.DataFrame, fuzzy_threshold: float = 0.5,
+                 scoring_backend: Union[str, ScoringBackend] = "accelerated"):
+        """An identification index over a delegate DataFrame, so that names can be
+        identified without scanning all rows of the DataFrame with Python calls.
+
+        The delegate names are deduplicated and concatenated into a single string,
+        so substring lookups are done with str.find instead of per row regexes. For
+        fuzzy lookups, the names are bucketed by length, and only names of which
+        the length difference allows a Levenshtein ratio above the fuzzy threshold
+        are scored. The active periods are stored as arrays of interval bounds, so
+        that a period window is matched against all delegates in one vectorised
+        comparison. Name masks and period masks are cached, as the same names and
+        windows recur across the passes of the iterative search.
+
+        :param df: the delegate DataFrame with columns name, p_interval and sg
+        :type df: pd.DataFrame
+        :param fuzzy_threshold: the minimum Levenshtein ratio for fuzzy name matches
+        :type fuzzy_threshold: float
+        :param scoring_backend: the scoring backend (or its name) for Levenshtein ratios
+        :type scoring_backend: Union[str, ScoringBackend]
+        """
+        self.df = df
+        self.num_rows = len(df)
+        self.fuzzy_threshold = fuzzy_threshold
+        self.scoring_backend = make_scoring_backend(scoring_backend)
+        # map each distinct name to the row positions of the delegates with that name
+        name_rows = defaultdict(list)
+        for row, name in enumerate(df["name"]):
+            name_rows[name].append(row)
+        self.names: List[str] = list(name_rows.keys())
+        self.name_rows: List[np.ndarray] = [np.array(name_rows[name], dtype=int) for name in self.names]
+        # the names joined by newlines, with the start offset of each name
+        self.name_starts: List[int] = []
+        offset = 0
+        for name in self.names:
+            self.name_starts.append(offset)
+            offset += len(name) + 1
+        self.name_string = '\n'.join(self.names)
+        self.length_names: Dict[int, List[int]] = defaultdict(list)
+        for name_id, name in enumerate(self.names):
+            self.length_names[len(name)].append(name_id)
+        # the bounds and closedness of the active period of each delegate
+        intervals = list(df["p_interval"])
+        self.period_left = np.array([interval.left if isinstance(interval, pd.Interval) else np.nan
+                                     for interval in intervals], dtype=float)
+        self.period_right = np.array([interval.right if isinstance(interval, pd.Interval) else np.nan
+                                      for interval in intervals], dtype=float)
+        self.period_closed_left = np.array([isinstance(interval, pd.Interval) and interval.closed_left
+                                            for interval in intervals], dtype=bool)
+        self.period_closed_right = np.array([isinstance(interval, pd.Interval) and interval.closed_right
+                                             for interval in intervals], dtype=bool)
+        self.sg_mask = (df["sg"] == True).to_numpy(dtype=bool)
+        self.period_masks: Dict[Tuple[int, int], np.ndarray] = {}
+        self.substring_masks: Dict[str, np.ndarray] = {}
+        self.fuzzy_masks: Dict[str, np.ndarray] = {}
+
+    def _names_to_mask(self, name_ids: Iterable[int]) -> np.ndarray:
+        mask = np.zeros(self.num_rows, dtype=bool)
+        for name_id in name_ids:
+            mask[self.name_rows[name_id]] = True
+        return mask
+
+    def get_substring_mask(self, name: str) -> np.ndarray:
+        """Return a boolean mask of the delegates of which the name contains the given name."""
+        if name in self.substring_masks:
+            return self.substring_masks[name]
+        if name == '':
+            mask = np.ones(self.num_rows, dtype=bool)
+        elif '\n' in name:
+            mask = self._names_to_mask(name_id for name_id, delegate_name in enumerate(self.names)
+                                       if name in delegate_name)
+        else:
+            name_ids = set()
+            offset = self.name_string.find(name)
+            while offset != -1:
+                name_id = bisect_right(self.name_starts, offset) - 1
+                name_ids.add(name_id)
+                # continue searching in the next delegate name
+                next_start = self.name_starts[name_id + 1] if name_id + 1 < len(self.names) else len(self.name_string)
+                offset = self.name_string.find(name, next_start)
+            mask = self._names_to_mask(name_ids)
+        self.substring_masks[name] = mask
+        return mask
+
+    def get_fuzzy_mask(self, name: str) -> np.ndarray:
+        """Return a boolean mask of the delegates of which the name has a Levenshtein
+        ratio with the given name above the fuzzy threshold."""
+        if name in self.fuzzy_masks:
+            return self.fuzzy_masks[name]
+        name_ids = []
+        for length, length_name_ids in self.length_names.items():
+            # the distance is at least the length difference, which bounds the ratio
+            max_length = max(length, len(name))
+            if max_length > 0 and 1 - abs(length - len(name)) / max_length <= self.fuzzy_threshold:
+                continue
+            for name_id in length_name_ids:
+                ratio = self.scoring_backend.score_levenshtein_distance_ratio(self.names[name_id], name)
+                if ratio > self.fuzzy_threshold:
+                    name_ids.append(name_id)
+        mask = self._names_to_mask(name_ids)
+        self.fuzzy_masks[name] = mask
+        return mask
+
+    def get_period_mask(self, yearmin: int, yearmax: int) -> np.ndarray:
+        """Return a boolean mask of the delegates of which the active period overlaps
+        the closed interval from yearmin to yearmax, following pd.Interval.overlaps."""
+        key = (yearmin, yearmax)
+        if key not in self.period_masks:
+            left_ok = np.where(self.period_closed_left, self.period_left <= yearmax, self.period_left < yearmax)
+            right_ok = np.where(self.period_closed_right, yearmin <= self.period_right, yearmin < self.period_right)
+            self.period_masks[key] = left_ok & right_ok
+        return self.period_masks[key]
+
+    def get_mask(self, name: str, year: int, window: int, sg: bool = True, fuzzy: bool = False,
+                 exact_year: bool = True) -> np.ndarray:
+        """Return a boolean mask of the delegates matching a name with the given settings."""
+        if fuzzy:
+            mask = self.get_fuzzy_mask(name)
+        else:
+            mask = self.get_substring_mask(name)
+        if exact_year is True:
+            mask = mask & self.get_period_mask(int(year) - window, int(year) + window)
+        if sg is True:
+            mask = mask & self.sg_mask
+        return mask
+
+    def identify(self, name: str, year: int, window: int, sg: bool = True, fuzzy: bool = False,
+                 exact_year: bool = True) -> pd.DataFrame:
+        """Return the delegates matching a name with the given settings."""
+        return self.df.loc[self.get_mask(name, year, window, sg=sg, fuzzy=fuzzy, exact_year=exact_year)]
+
+    def iterative_search(self, name: str, year: int, debug: bool = False) -> pd.DataFrame:
+        """Return the delegates of the first search pass that matches the name, with
+        the score of that pass."""
+        for score, item in enumerate(search_passes, 1):
+            mask = self.get_mask(name, year, item['window'], sg=item['sg'], fuzzy=item['fuzzy'],
+                                 exact_year=item['exact_year'])
+            result = self.df.loc[mask]
+            if debug == True:
+                print('window', item['window'],
+                      'fuzzy', item['fuzzy'],
+                      'sg', item['sg'],
+                      'exact_year', item['exact_year'], score, len(result))
+            if len(result) > 0:
+                result = result.copy()
+                result['score'] = scoreboard.get(score) or 0.0
+                return result
+        result['score'] = 0.0
+        return result
+
+    def identify_names(self, names: Iterable[str], year: int, debug: bool = False) -> Dict[str, pd.DataFrame]:
+        """Identify all names of a session in one call. Each distinct name is searched
+        once, and the name and period masks are shared across names and passes.
+
+        :param names: the names to identify
+        :type names: Iterable[str]
+        :param year: the year of the session
+        :type year: int
+        :param debug: whether to print the result size of each pass
+        :type debug: bool
+        :return: a dictionary with per name the matching delegates and their score
+        :rtype: Dict[str, pd.DataFrame]
+        """
+        results = {}
+        for name in names:
+            if name not in results:
+                results[name] = self.iterative_search(name, year, debug=debug)
+        return results
+
+
+# the index of the most recently used delegate DataFrame
+delegate_indexes: Dict[int, Tuple[pd.DataFrame, DelegateIndex]] = {}
+
+
+def get_delegate_index(df: pd.DataFrame) -> DelegateIndex:
+    """Return the identification index of a delegate DataFrame, building it if the
+    DataFrame differs from the one of the cached index. Only a single index is kept."""
+    key = id(df)
+    if key in delegate_indexes:
+        cached_df, index = delegate_indexes[key]
+        if cached_df is df and index.num_rows == len(df):
+            return index
+    delegate_indexes.clear()
+    index = DelegateIndex(df)
+    delegate_indexes[key] = (df, index)
+    return index
+
 
 def identify(name=str,
              df=pd.DataFrame,
@@ -31,34 +243,16 @@ def identify(name=str,
 # iterative identification (see above)
 # delegate is not yet included as conclusion as function at staten generaal may be enough distinction
 
-def iterative_search(name=str, year=int, debug=False, df=pd.DataFrame):
-    scoreboard = {1: 1.0, 2: 0.9, 3: 0.8, 4: 0.7, 5: 0.6, 6: 0.5, 7: 0.4, 8: 0.3}
-    score = 0
-    for item in ({'window': 0, 'fuzzy': False, 'sg': True, 'delegate': True, 'exact_year': True},
-                 {'window': 30, 'fuzzy': False, 'sg': True, 'delegate': True, 'exact_year': False},
-                 {'window': 10, 'fuzzy': True, 'sg': True, 'delegate': True, 'exact_year': True},
-                 {'window': 30, 'fuzzy': True, 'sg': True, 'delegate': True, 'exact_year': False},
-                 {'window': 0, 'fuzzy': False, 'sg': False, 'delegate': True, 'exact_year': True},
-                 {'window': 30, 'fuzzy': False, 'sg': False, 'delegate': True, 'exact_year': False},
-                 {'window': 10, 'fuzzy': True, 'sg': False, 'delegate': True, 'exact_year': True},
-                 {'window': 30, 'fuzzy': True, 'sg': False, 'delegate': True, 'exact_year': False},):
-
-        score += 1
-        result = identify(name=name, year=year, df=df, **item)
-        if debug == True:
-            print('window', item['window'],
-                  'fuzzy', item['fuzzy'],
-                  'sg', item['sg'],
-                  'exact_year', item['exact_year'], score, len(result))
-        if len(result) > 0:
-            result = result.copy()
-            result['score'] = scoreboard.get(score) or 0.0
-            if debug == True:
-                print('window', item['window'],
-                      'fuzzy', item['fuzzy'],
-                      'sg', item['sg'],
-                      'exact_year', item['exact_year'], score, len(result))
-            return result
-        if score == 8 and len(result) == 0:
-            result['score'] = 0.0
-            return result
\ No newline at end of file
+def iterative_search(name=str, year=int, debug=False, df=pd.DataFrame, index: DelegateIndex = None):
+    if index is None:
+        index = get_delegate_index(df)
+    return index.iterative_search(name, year, debug=debug)
+
+
+def identify_names(names: Iterable[str], year: int, df: pd.DataFrame = None, index: DelegateIndex = None,
+                   debug: bool = False) -> Dict[str, pd.DataFrame]:
+    """Identify all names of a session in one call, using the identification index
+    of the delegate DataFrame."""
+    if index is None:
+        index = get_delegate_index(df)
+    return index.identify_names(names, year, debug=debug)
@@ -16,7 +16,7 @@ fuzzysearch_config = {
     "ngram_size": 2,
     "skip_size": 2,
 }
-from .identify import iterative_search  # , identify
+from .identify import identify_names  # , identify, iterative_search
 
 
 # #### praesentibus
@@ -185,6 +185,7 @@ def find_delegates(input=[],
     # matched_heren = defaultdict(list)
     matched_deputies = defaultdict(list)
     unmatched_deputies = []
+    matched_groups = []
     for herengroup in input:
         # we add the whole group to recognized if one name has a result
         recognized_group = []
@@ -202,25 +203,30 @@ def find_delegates(input=[],
                 recognized_group.append((heer, '', 0.0))
         if in_matched == True:  # if there is at least one match, proceed
             kw = keyword_counter.most_common()[0][0]
-            rec = previously_matched.loc[previously_matched.name == kw]
-            # ncol = 'proposed_delegate'
-            ncol = 'name'
-            if len(rec) == 0:
-                rec = iterative_search(name=kw, year=year, df=df)
-                ncol = 'name'
-            drec = rec.to_dict(orient="records")[0]
-            m_id = drec['id']
-            #             if m_id == 'matched':
-            #                 print(rec, kw)
-            name = drec[ncol]
-            score = drec.get('score') or 0.0
-            matched_deputies[m_id] = {'id': m_id,
-                                      'm_kw': kw,
-                                      'score': score,
-                                      'name': name,
-                                      'variants': recognized_group}
+            matched_groups.append((kw, recognized_group))
         else:
             unmatched_deputies.append(herengroup)  # non-matched deputy-groups are also returned
+    # identify all keywords that were not matched previously in one batch
+    previous_recs = {kw: previously_matched.loc[previously_matched.name == kw] for kw, _ in matched_groups}
+    identified = identify_names([kw for kw in previous_recs if len(previous_recs[kw]) == 0], year=year, df=df)
+    for kw, recognized_group in matched_groups:
+        rec = previous_recs[kw]
+        # ncol = 'proposed_delegate'
+        ncol = 'name'
+        if len(rec) == 0:
+            rec = identified[kw]
+            ncol = 'name'
+        drec = rec.to_dict(orient="records")[0]
+        m_id = drec['id']
+        #             if m_id == 'matched':
+        #                 print(rec, kw)
+        name = drec[ncol]
+        score = drec.get('score') or 0.0
+        matched_deputies[m_id] = {'id': m_id,
+                                  'm_kw': kw,
+                                  'score': score,
+                                  'name': name,
+                                  'variants': recognized_group}
     return ({"matched": matched_deputies,
              "unmatched": unmatched_deputies})
 
@@ -0,0 +1,222 @@
+from typing import Dict, List, Tuple, Union
+import glob
+import os
+import random
+
+from republic.model.republic_date import RepublicDate, get_next_workday
+from republic.model.republic_phrase_model import resolution_phrases, spelling_variants
+from republic.model.physical_document_model import PageXMLScan, PageXMLPage
+
+
+default_fixture_config = {
+    'inventory_num': 3780,
+    'num_scans': 10,
+    'lines_per_column': 60,
+    'sessions_per_page': 1,
+    'num_keywords': 250,
+    'max_search_lines': 500,
+    'seed': 25,
+}
+
+body_words = [
+    'ONtfangen', 'een', 'Missive', 'van', 'den', 'Heere', 'Resident', 'geschreven', 'tot', 'Brussel',
+    'houdende', 'advertentie', 'dat', 'de', 'Staten', 'Generaal', 'hebben', 'goedgevonden', 'ende',
+    'verstaan', 'WAAR', 'op', 'gedelibereert', 'zynde', 'is', 'naar', 'voorgaande', 'deliberatie',
+    'Hooghgemelte', 'haar', 'Hoog', 'Mogende', 'Provincie', 'Hollandt', 'Zeelandt', 'Gedeputeerden',
+    'Admiraliteit', 'Amsterdam', 'Rotterdam', 'versoekende', 'sendende', 'copie', 'Requeste', 'Compagnie',
+    'Oost-Indische', 'Koopluyden', 'Schepen', 'Regiment', 'Capitein', 'Generaliteit', 'Raadt', 'van',
+    'State', 'Thesaurier', 'ordinaris', 'betalinge', 'somme', 'guldens', 'ter', 'Vergaderinge', 'gelesen',
+]
+
+attendant_names = [
+    'van Wassenaer', 'van der Duyn', 'Boreel', 'van Heeckeren', 'Torck', 'van Randwyck', 'Fagel',
+    'van Haersolte', 'van Isselmuden', 'Sichterman', 'van Lynden', 'Roukema', 'van Welderen',
+]
+
+# the x ranges of the columns on the even and odd side of a scan
+column_ranges = [(200, 1100), (1250, 2200), (2700, 3600), (3750, 4700)]
+line_height = 50
+line_spacing = 60
+top_margin = 400
+
+
+def make_body_line_text(rng: random.Random, min_chars: int = 55, max_chars: int = 65) -> str:
+    """Return a line of resolution text with a length between min_chars and max_chars."""
+    max_chars = rng.randint(min_chars, max_chars)
+    words = []
+    length = 0
+    while length < min_chars:
+        word = rng.choice(body_words)
+        if length + len(word) + 1 > max_chars and length > 0:
+            break
+        words.append(word)
+        length += len(word) + 1
+    return ' '.join(words)
+
+
+def make_session_opening_lines(session_date: RepublicDate, rng: random.Random) -> List[str]:
+    """Return the lines of a session opening for the given date."""
+    president, *attendants = rng.sample(attendant_names, 5)
+    return [
+        session_date.date_year_string,
+        'PRAESIDE,',
+        f'Den Heere {president}.',
+        'PRAESENTIBUS,',
+        'De Heeren ' + ', '.join(attendants[:2]) + ',',
+        ', '.join(attendants[2:]) + '.',
+        'DE Resolutien gisteren genomen zyn',
+        'gelesen en gearresteert.',
+    ]
+
+
+def make_resolution_lines(rng: random.Random, num_lines: int) -> List[str]:
+    """Return the lines of a resolution, starting with a resolution opening phrase."""
+    opening = rng.choice(['ONtfangen een Missive van', 'ONtfangen een Missive van'] + resolution_phrases[:10])
+    lines = [opening + ' ' + make_body_line_text(rng, 20, 30)]
+    lines += [make_body_line_text(rng) for _ in range(num_lines - 1)]
+    return lines
+
+
+def make_textline_xml(line_id: str, text: str, left: int, right: int, top: int) -> str:
+    bottom = top + line_height
+    coords = f'{left},{top} {right},{top} {right},{bottom} {left},{bottom}'
+    baseline = f'{left},{bottom - 10} {right},{bottom - 10}'
+    return f'<TextLine id="{line_id}"><Coords points="{coords}"/><Baseline points="{baseline}"/>' \
+           f'<TextEquiv><Unicode>{text}</Unicode></TextEquiv></TextLine>'
+
+
+def make_textregion_xml(region_id: str, region_type: str, lines: List[str], left: int, right: int,
+                        top: int) -> str:
+    bottom = top + max(len(lines), 1) * line_spacing
+    coords = f'{left},{top} {right},{top} {right},{bottom} {left},{bottom}'
+    lines_xml = ''.join(make_textline_xml(f'{region_id}_line_{li}', text, left, right, top + li * line_spacing)
+                        for li, text in enumerate(lines))
+    return f'<TextRegion id="{region_id}" custom="structure {{type:{region_type};}}">' \
+           f'<Coords points="{coords}"/>{lines_xml}</TextRegion>'
+
+
+def make_scan_filename(inventory_num: int, scan_num: int) -> str:
+    return f'NL-HaNA_1.01.02_{inventory_num}_{scan_num:04d}.xml'
+
+
+def make_synthetic_scan_pagexml(column_lines: List[List[str]], scan_id: str) -> str:
+    """Return a PageXML document of a double page scan with four columns of resolution
+    text and a date header per page.
+
+    :param column_lines: the text lines of each of the four columns, from left to right
+    :type column_lines: List[List[str]]
+    :param scan_id: the id of the scan, used as prefix of the region and line ids
+    :type scan_id: str
+    :return: the PageXML document
+    :rtype: str
+    """
+    regions = []
+    for side, (left, right) in [('even', (200, 2200)), ('odd', (2700, 4700))]:
+        regions.append(make_textregion_xml(f'{scan_id}_{side}_header', 'date', ['Anno 1725.'], left, right, 200))
+    for ci, lines in enumerate(column_lines):
+        left, right = column_ranges[ci]
+        regions.append(make_textregion_xml(f'{scan_id}_column_{ci}', 'resolution', lines, left, right, top_margin))
+    height = top_margin + max(len(lines) for lines in column_lines) * line_spacing + 200
+    return '<?xml version="1.0" encoding="UTF-8"?>' \
+           '<PcGts xmlns="http://schema.primaresearch.org/PAGE/gts/pagecontent/2013-07-15">' \
+           '<Metadata><Creator>republic benchmark</Creator><Created>2021-01-01T00:00:00</Created>' \
+           '<LastChange>2021-01-01T00:00:00</LastChange></Metadata>' \
+           f'<Page imageFilename="{scan_id}.jpg" imageWidth="4900" imageHeight="{height}">' \
+           + ''.join(regions) + '</Page></PcGts>'
+
+
+def make_synthetic_inventory_scans(config: Union[None, dict] = None) -> List[Tuple[str, str]]:
+    """Return a reproducible list of synthetic PageXML scans of consecutive resolution
+    pages, with sessions_per_page session openings per page, starting on the first
+    workday of the inventory year.
+
+    :param config: settings to override the default fixture config
+    :type config: Union[None, dict]
+    :return: a list of (filename, PageXML string) tuples
+    :rtype: List[Tuple[str, str]]
+    """
+    config = {**default_fixture_config, **(config if config else {})}
+    rng = random.Random(config['seed'])
+    session_date = get_next_workday(RepublicDate(1725, 1, 1))
+    lines_per_page = config['lines_per_column'] * 2
+    scans = []
+    for scan_num in range(1, config['num_scans'] + 1):
+        filename = make_scan_filename(config['inventory_num'], scan_num)
+        column_lines = []
+        for _side in ['even', 'odd']:
+            page_lines = []
+            for _ in range(config['sessions_per_page']):
+                page_lines += make_session_opening_lines(session_date, rng)
+                session_date = get_next_workday(session_date)
+                # fill the rest of the session with resolutions
+                session_end = len(page_lines) + lines_per_page // config['sessions_per_page'] - 8
+                while len(page_lines) < session_end:
+                    page_lines += make_resolution_lines(rng, rng.randint(4, 12))
+            page_lines = page_lines[:lines_per_page]
+            column_lines += [page_lines[:config['lines_per_column']], page_lines[config['lines_per_column']:]]
+        scans.append((filename, make_synthetic_scan_pagexml(column_lines, filename.replace('.xml', ''))))
+    return scans
+
+
+def read_sample_scans(sample_dir: str, max_scans: Union[None, int] = None) -> List[Tuple[str, str]]:
+    """Return the PageXML files in a directory with sample scans, sorted by filename.
+
+    :param sample_dir: the directory with PageXML files
+    :type sample_dir: str
+    :param max_scans: the maximum number of scans to read
+    :type max_scans: Union[None, int]
+    :return: a list of (filename, PageXML string) tuples
+    :rtype: List[Tuple[str, str]]
+    """
+    scan_files = sorted(glob.glob(os.path.join(sample_dir, '*.xml')))
+    if max_scans:
+        scan_files = scan_files[:max_scans]
+    scans = []
+    for scan_file in scan_files:
+        with open(scan_file, 'rt') as fh:
+            scans.append((scan_file, fh.read()))
+    return scans
+
+
+def add_text_repo_version(scan_doc: PageXMLScan, pages: List[PageXMLPage]) -> None:
+    """Add the text repo version metadata that the session parser expects, as it is
+    normally added when scans are retrieved from the text repository."""
+    version = {'id': f"{scan_doc.id}-version", 'createdAt': '2021-01-01T00:00:00'}
+    scan_doc.metadata['textrepo_version'] = version
+    for page in pages:
+        page.metadata['textrepo_version'] = version
+        page.metadata['page_type'] = ['resolution_page']
+        for column in page.columns:
+            for text_region in column.text_regions:
+                for line in text_region.lines:
+                    line.metadata['doc_id'] = scan_doc.id
+                    line.metadata['scan_version'] = version
+
+
+def make_synthetic_keywords(num_keywords: int = default_fixture_config['num_keywords'],
+                            seed: int = default_fixture_config['seed']) -> List[str]:
+    """Return a reproducible list of person-name-like keywords."""
+    rng = random.Random(seed)
+    prefixes = ['van', 'van der', 'de', 'ten', 'van den', '']
+    syllables = ['ha', 'er', 'sol', 'te', 'lyn', 'den', 'wel', 'boo', 'rel', 'torck', 'heek', 'ke',
+                 'ren', 'fa', 'gel', 'sich', 'ter', 'man', 'rand', 'wyck', 'du', 'yn', 'is', 'sel']
+    keywords = set()
+    while len(keywords) < num_keywords:
+        name = ''.join(rng.choice(syllables) for _ in range(rng.randint(2, 4))).capitalize()
+        prefix = rng.choice(prefixes)
+        keywords.add(f'{prefix} {name}'.strip())
+    return sorted(keywords)
+
+
+def get_sample_keywords() -> List[str]:
+    """Return the resolution phrases and their spelling variants as sample keywords."""
+    keywords = list(resolution_phrases)
+    for keyword in spelling_variants:
+        keywords += [keyword] + list(spelling_variants[keyword])
+    return sorted(set(keywords))
+
+
+def get_inventory_fixture_metadata(config: Union[None, dict] = None) -> Dict[str, Union[int, str]]:
+    """Return the inventory metadata that the session parser needs for the synthetic inventory."""
+    config = {**default_fixture_config, **(config if config else {})}
+    return {'inventory_num': config['inventory_num'], 'period_start': '1725-01-01', 'period_end': '1725-12-31'}
@@ -0,0 +1,397 @@
+from typing import Callable, Dict, List, Union
+import copy
+import datetime
+import json
+import os
+import platform
+import statistics
+import subprocess
+import time
+import tracemalloc
+
+from republic.benchmark import benchmark_fixtures as fixtures
+from republic.fuzzy.fuzzy_keyword_searcher import FuzzyKeywordSearcher
+from republic.helper.indexing_monitor import get_max_rss_bytes
+from republic.model.republic_date import RepublicDate
+import republic.model.pagexml_serializer as pagexml_serializer
+from republic.model.reading_order import get_lines_in_reading_order
+from republic.model.republic_document_model import get_resolution_searchers, make_session_text_version
+from republic.model.republic_phrase_model import session_phrase_model
+from republic.model.republic_session import SessionSearcher
+import republic.parser.pagexml.generic_pagexml_parser as pagexml_parser
+import republic.parser.pagexml.republic_pagexml_parser as republic_pagexml_parser
+import republic.parser.logical.pagexml_session_parser as session_parser
+
+
+keyword_searcher_config = {
+    "char_match_threshold": 0.8,
+    "ngram_threshold": 0.6,
+    "levenshtein_threshold": 0.8,
+    "ignorecase": False,
+    "ngram_size": 2,
+    "skip_size": 2,
+}
+
+
+def get_git_commit() -> Union[None, str]:
+    """Return the hash of the current git commit, or None if it can't be determined."""
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], stderr=subprocess.DEVNULL,
+                                       cwd=os.path.dirname(os.path.abspath(__file__))).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def parse_scans(scans: List[tuple]) -> list:
+    return [republic_pagexml_parser.get_scan_pagexml(filename, {}, pagexml_data=data) for filename, data in scans]
+
+
+def split_scans(scan_docs: list) -> list:
+    pages = []
+    for scan_doc in scan_docs:
+        scan_pages = republic_pagexml_parser.split_pagexml_scan(scan_doc)
+        fixtures.add_text_repo_version(scan_doc, scan_pages)
+        pages += scan_pages
+    return sorted(pages, key=lambda page: page.metadata['page_num'])
+
+
+def get_page_lines(doc) -> list:
+    """Return the lines of a scan or page, including those in its columns and extra regions."""
+    lines = doc.get_lines()
+    for text_region in getattr(doc, 'columns', []) + getattr(doc, 'extra', []):
+        lines += text_region.get_lines()
+    return lines
+
+
+def count_lines(docs: list) -> int:
+    return sum(len(get_page_lines(doc)) for doc in docs)
+
+
+class Fixture:
+
+    def __init__(self, name: str, scans: List[tuple], keywords: List[str], inventory_num: int,
+                 inventory_metadata: dict,
+                 max_search_lines: int = fixtures.default_fixture_config['max_search_lines']):
+        """The input data for the benchmarks. Derived data, like parsed scans, pages,
+        lines and sessions, are computed when first needed and reused between benchmarks.
+        Benchmarks that modify their input get a fresh copy in their setup.
+
+        :param name: the name of the fixture, to identify results between runs
+        :type name: str
+        :param scans: a list of (filename, PageXML string) tuples
+        :type scans: List[tuple]
+        :param keywords: the keywords for the keyword searcher
+        :type keywords: List[str]
+        :param inventory_num: the inventory number of the scans
+        :type inventory_num: int
+        :param inventory_metadata: the inventory metadata for the session parser
+        :type inventory_metadata: dict
+        :param max_search_lines: the maximum number of lines to search with the keyword searcher
+        :type max_search_lines: int
+        """
+        self.name = name
+        self.scans = scans
+        self.keywords = keywords
+        self.inventory_num = inventory_num
+        self.inventory_metadata = inventory_metadata
+        self.max_search_lines = max_search_lines
+        self._pages = None
+        self._sessions = None
+
+    @property
+    def inventory_config(self) -> dict:
+        return {'inventory_num': self.inventory_num}
+
+    @property
+    def start_date(self) -> RepublicDate:
+        return session_parser.initialize_inventory_date(self.inventory_metadata)
+
+    @property
+    def pages(self) -> list:
+        if self._pages is None:
+            self._pages = split_scans(parse_scans(self.scans))
+        return self._pages
+
+    @property
+    def line_texts(self) -> List[str]:
+        return [line.text for page in self.pages for line in get_page_lines(page) if line.text]
+
+    @property
+    def sessions(self) -> list:
+        if self._sessions is None:
+            pages = copy.deepcopy(self.pages)
+            self._sessions = list(session_parser.get_sessions(pages, self.inventory_config,
+                                                              self.inventory_metadata))
+        return self._sessions
+
+
+def make_synthetic_fixture(fixture_config: Union[None, dict] = None) -> Fixture:
+    """Return a fixture of reproducible synthetic scans and keywords."""
+    config = {**fixtures.default_fixture_config, **(fixture_config if fixture_config else {})}
+    name = 'synthetic-{num_scans}-scans-{lines_per_column}-lines-{num_keywords}-keywords-seed-{seed}'.format(**config)
+    return Fixture(name, fixtures.make_synthetic_inventory_scans(config),
+                   fixtures.make_synthetic_keywords(config['num_keywords'], config['seed']),
+                   config['inventory_num'], fixtures.get_inventory_fixture_metadata(config),
+                   max_search_lines=config['max_search_lines'])
+
+
+def make_sample_fixture(sample_dir: str, inventory_metadata: dict,
+                        max_scans: Union[None, int] = None) -> Fixture:
+    """Return a fixture of the PageXML scans in sample_dir. The inventory metadata must
+    contain at least the inventory_num and period_start of the inventory."""
+    scans = fixtures.read_sample_scans(sample_dir, max_scans=max_scans)
+    name = f'sample-{os.path.basename(os.path.normpath(sample_dir))}-{len(scans)}-scans'
+    return Fixture(name, scans, fixtures.get_sample_keywords(), inventory_metadata['inventory_num'],
+                   inventory_metadata)
+
+
+###################################################################
+# Benchmarks: each returns a setup function, called before each   #
+# repetition and not timed, a run function, which is timed, and   #
+# the units of work done in a single run.                         #
+###################################################################
+
+def bench_parse_pagexml_file(fixture: Fixture, streaming: bool = False) -> dict:
+    def run(_setup_result):
+        for filename, data in fixture.scans:
+            pagexml_parser.parse_pagexml_file(filename, pagexml_data=data, streaming=streaming)
+    num_lines = count_lines(parse_scans(fixture.scans))
+    return {'setup': lambda: None, 'run': run, 'units': {'scan': len(fixture.scans), 'line': num_lines}}
+
+
+def bench_parse_pagexml_file_streaming(fixture: Fixture) -> dict:
+    return bench_parse_pagexml_file(fixture, streaming=True)
+
+
+def bench_split_pagexml_scan(fixture: Fixture) -> dict:
+    scan_docs = parse_scans(fixture.scans)
+
+    def run(setup_result):
+        for scan_doc in setup_result:
+            republic_pagexml_parser.split_pagexml_scan(scan_doc)
+    return {'setup': lambda: copy.deepcopy(scan_docs), 'run': run,
+            'units': {'scan': len(scan_docs), 'line': count_lines(scan_docs)}}
+
+
+def bench_serialize_pagexml(fixture: Fixture) -> dict:
+    scan_docs = parse_scans(fixture.scans)
+
+    def run(_setup_result):
+        for scan_doc in scan_docs:
+            pagexml_serializer.pagexml_to_json_string(scan_doc)
+    return {'setup': lambda: None, 'run': run,
+            'units': {'scan': len(scan_docs), 'line': count_lines(scan_docs)}}
+
+
+def bench_deserialize_pagexml(fixture: Fixture) -> dict:
+    scan_docs = parse_scans(fixture.scans)
+    scan_jsons = [pagexml_serializer.pagexml_to_json_string(scan_doc) for scan_doc in scan_docs]
+
+    def run(_setup_result):
+        for scan_json in scan_jsons:
+            pagexml_serializer.json_string_to_pagexml(scan_json)
+    return {'setup': lambda: None, 'run': run,
+            'units': {'scan': len(scan_docs), 'line': count_lines(scan_docs)}}
+
+
+def bench_reading_order(fixture: Fixture) -> dict:
+    pages = [page for page in fixture.pages if page.columns]
+
+    def run(_setup_result):
+        for page in pages:
+            for _line in get_lines_in_reading_order(page):
+                pass
+    return {'setup': lambda: None, 'run': run, 'units': {'line': count_lines(pages)}}
+
+
+def bench_index_keywords(fixture: Fixture) -> dict:
+    def run(setup_result):
+        setup_result.index_keywords(fixture.keywords)
+    return {'setup': lambda: FuzzyKeywordSearcher(keyword_searcher_config), 'run': run,
+            'units': {'keyword': len(fixture.keywords)}}
+
+
+def bench_find_candidates(fixture: Fixture) -> dict:
+    # the keyword searcher is slow, so only a sample of the lines is searched
+    line_texts = fixture.line_texts[:fixture.max_search_lines]
+
+    def setup():
+        # a new searcher per repetition, so known candidates aren't carried over
+        searcher = FuzzyKeywordSearcher(keyword_searcher_config)
+        searcher.index_keywords(fixture.keywords)
+        return searcher
+
+    def run(setup_result):
+        for text in line_texts:
+            setup_result.find_candidates(text)
+    return {'setup': setup, 'run': run, 'units': {'line': len(line_texts)}}
+
+
+def bench_session_searcher(fixture: Fixture) -> dict:
+    lines = [line for page in fixture.pages for line in get_page_lines(page) if line.text]
+
+    def setup():
+        return SessionSearcher(fixture.inventory_num, fixture.start_date, session_phrase_model, window_size=30)
+
+    def run(setup_result):
+        for line in lines:
+            setup_result.add_document(line.id, line.text, text_object=line)
+            setup_result.get_session_opening_elements()
+    return {'setup': setup, 'run': run, 'units': {'line': len(lines)}}
+
+
+def bench_get_sessions(fixture: Fixture) -> dict:
+    def run(setup_result):
+        for _session in session_parser.get_sessions(setup_result, fixture.inventory_config,
+                                                    fixture.inventory_metadata):
+            pass
+    return {'setup': lambda: copy.deepcopy(fixture.pages), 'run': run,
+            'units': {'scan': len(fixture.scans), 'line': count_lines(fixture.pages)}}
+
+
+def bench_make_session_text_version(fixture: Fixture) -> dict:
+    # build the resolution searchers before timing, as they are built once per process
+    opening_searcher, verb_searcher = get_resolution_searchers()
+
+    def run(setup_result):
+        for session in setup_result:
+            make_session_text_version(session, opening_searcher=opening_searcher, verb_searcher=verb_searcher)
+    sessions = fixture.sessions
+    return {'setup': lambda: copy.deepcopy(sessions), 'run': run,
+            'units': {'session': len(sessions),
+                      'line': sum(len(text_region.lines) for session in sessions
+                                  for text_region in session.text_regions)}}
+
+
+benchmarks: Dict[str, Callable[[Fixture], dict]] = {
+    'parse_pagexml_file': bench_parse_pagexml_file,
+    'parse_pagexml_file_streaming': bench_parse_pagexml_file_streaming,
+    'split_pagexml_scan': bench_split_pagexml_scan,
+    'serialize_pagexml': bench_serialize_pagexml,
+    'deserialize_pagexml': bench_deserialize_pagexml,
+    'reading_order': bench_reading_order,
+    'index_keywords': bench_index_keywords,
+    'find_candidates': bench_find_candidates,
+    'session_searcher': bench_session_searcher,
+    'get_sessions': bench_get_sessions,
+    'make_session_text_version': bench_make_session_text_version,
+}
+
+
+def run_benchmark(name: str, fixture: Fixture, repeat: int = 3, measure_memory: bool = True) -> dict:
+    """Run a benchmark repeat times and return its timings per run and per unit of work.
+    The peak memory is measured with tracemalloc in a separate run, as tracing slows down
+    the code under test.
+
+    :param name: the name of a registered benchmark
+    :type name: str
+    :param fixture: the fixture to run the benchmark on
+    :type fixture: Fixture
+    :param repeat: the number of timed runs
+    :type repeat: int
+    :param measure_memory: whether to do an extra run to measure the peak memory use
+    :type measure_memory: bool
+    :return: the benchmark result
+    :rtype: dict
+    """
+    if name not in benchmarks:
+        raise ValueError(f"unknown benchmark {name}, must be one of {list(benchmarks.keys())}")
+    benchmark = benchmarks[name](fixture)
+    durations = []
+    for _ in range(repeat):
+        setup_result = benchmark['setup']()
+        start = time.perf_counter()
+        benchmark['run'](setup_result)
+        durations.append(time.perf_counter() - start)
+    peak_memory = None
+    if measure_memory:
+        setup_result = benchmark['setup']()
+        tracemalloc.start()
+        benchmark['run'](setup_result)
+        _current, peak_memory = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    median_seconds = statistics.median(durations)
+    return {
+        'benchmark': name,
+        'fixture': fixture.name,
+        'commit': get_git_commit(),
+        'timestamp': datetime.datetime.now().isoformat(),
+        'python_version': platform.python_version(),
+        'repeat': repeat,
+        'min_seconds': min(durations),
+        'median_seconds': median_seconds,
+        'units': benchmark['units'],
+        'seconds_per_unit': {unit: median_seconds / num if num else None
+                             for unit, num in benchmark['units'].items()},
+        'peak_memory_bytes': peak_memory,
+        'max_rss_bytes': get_max_rss_bytes(),
+    }
+
+
+def run_benchmarks(fixture: Fixture, benchmark_names: Union[None, List[str]] = None, repeat: int = 3,
+                   measure_memory: bool = True) -> List[dict]:
+    """Run the given benchmarks, or all registered benchmarks, on a fixture and print a summary line per benchmark."""
+    if benchmark_names is None:
+        benchmark_names = list(benchmarks.keys())
+    results = []
+    for name in benchmark_names:
+        result = run_benchmark(name, fixture, repeat=repeat, measure_memory=measure_memory)
+        results.append(result)
+        print(format_result(result))
+    return results
+
+
+def format_result(result: dict) -> str:
+    per_unit = ', '.join(f"{seconds * 1000:.3f} ms/{unit}" for unit, seconds in result['seconds_per_unit'].items()
+                         if seconds is not None)
+    memory = f"{result['peak_memory_bytes'] / 1024 / 1024:.1f} MB peak" \
+        if result['peak_memory_bytes'] is not None else 'peak not measured'
+    return f"{result['benchmark']: <30}{result['median_seconds']: >10.3f} s\t{per_unit}\t{memory}"
+
+
+def write_results(results: List[dict], results_file: str) -> None:
+    """Append benchmark results to a JSON lines file."""
+    with open(results_file, 'at') as fh:
+        for result in results:
+            fh.write(json.dumps(result) + '\n')
+
+
+def read_results(results_file: str) -> List[dict]:
+    with open(results_file, 'rt') as fh:
+        return [json.loads(line) for line in fh if line.strip()]
+
+
+def compare_results(baseline_results: List[dict], results: List[dict],
+                    threshold: float = 0.1) -> List[dict]:
+    """Compare the median run time of benchmark results against baseline results of the
+    same benchmark and fixture, and print a comparison table. If the baseline contains
+    several results for a benchmark, the most recent one is used.
+
+    :param baseline_results: the results to compare against, e.g. of an earlier commit
+    :type baseline_results: List[dict]
+    :param results: the results to compare
+    :type results: List[dict]
+    :param threshold: the relative slowdown above which a benchmark counts as a regression
+    :type threshold: float
+    :return: the comparisons that are regressions
+    :rtype: List[dict]
+    """
+    baseline = {(result['benchmark'], result['fixture']): result for result in baseline_results}
+    regressions = []
+    print(f"{'benchmark': <30}{'baseline (s)': >14}{'current (s)': >14}{'change': >10}")
+    for result in results:
+        key = (result['benchmark'], result['fixture'])
+        if key not in baseline:
+            print(f"{result['benchmark']: <30}{'-': >14}{result['median_seconds']: >14.3f}{'new': >10}")
+            continue
+        base_seconds = baseline[key]['median_seconds']
+        change = result['median_seconds'] / base_seconds - 1 if base_seconds > 0 else 0.0
+        flag = ' REGRESSION' if change > threshold else ''
+        print(f"{result['benchmark']: <30}{base_seconds: >14.3f}{result['median_seconds']: >14.3f}"
+              f"{change: >+10.1%}{flag}")
+        if change > threshold:
+            regressions.append({'benchmark': result['benchmark'], 'fixture': result['fixture'],
+                                'baseline_commit': baseline[key]['commit'], 'commit': result['commit'],
+                                'baseline_seconds': base_seconds, 'seconds': result['median_seconds'],
+                                'change': change})
+    return regressions
@@ -176,6 +176,38 @@ base_config = {
     'page_doc_type': 'page',
     'scan_doc_type': 'scan',
     'paragraph_doc_type': 'paragraph',
+    # parse PageXML files from incremental parse events instead of via xmltodict
+    'streaming_pagexml_parser': True,
+    # number of concurrent slices when scrolling through all documents of an inventory
+    'scroll_slices': 4,
+    # directory for local columnar stores of parsed scans and pages, so later indexing steps
+    # can read them without retrieving them from Elasticsearch. None means no stores
+    'pagexml_store_dir': None,
+    'zip_parsing': {
+        # number of worker processes parsing the scans of an inventory zip, 1 means sequential
+        'num_workers': 1,
+        # bounds the number of parsed scans held in memory to num_workers * max_in_flight_per_worker
+        'max_in_flight_per_worker': 4,
+    },
+    'bulk_indexing': {
+        'chunk_size': 500,
+        'max_chunk_bytes': 10 * 1024 * 1024,
+        'max_retries': 5,
+        'initial_backoff': 2,
+        'max_backoff': 600,
+        # raise an error at the end of an indexing function if any document failed to be indexed
+        'raise_on_error': True,
+    },
+    'text_repo': {
+        'pool_size': 16,
+        'max_workers': 8,
+        'max_retries': 3,
+        'timeout': 60,
+        # directory for caching TextRepo version contents on disk, None means no caching
+        'cache_dir': None,
+        # number of versions to fetch concurrently when retrieving an inventory
+        'batch_size': 100,
+    },
     # width numbers are pixel width
     'tiny_word_width': 15,
     'avg_char_width': 20,
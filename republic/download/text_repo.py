@@ -1,14 +1,50 @@
-from typing import Dict, List, Union
+from typing import Dict, Iterable, List, Union
+from concurrent.futures import ThreadPoolExecutor
 import time
 import gzip
+import os
+import tempfile
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 
-def make_request(url: str, accept_encoding: Union[None, str] = None) -> Union[List[dict], dict, str]:
+default_text_repo_config = {
+    # number of pooled keep-alive connections to the TextRepo host
+    'pool_size': 16,
+    # number of concurrent requests for batched lookups
+    'max_workers': 8,
+    # number of retries for failed connections and 502/503/504 responses
+    'max_retries': 3,
+    # seconds to wait for a response
+    'timeout': 60,
+    # directory for caching version contents on disk, None means no caching
+    'cache_dir': None,
+}
+
+
+def make_session(pool_size: int = default_text_repo_config['pool_size'],
+                 max_retries: int = default_text_repo_config['max_retries']) -> requests.Session:
+    """Return a requests session that keeps connections alive and reuses up to pool_size
+    connections per host, retrying failed connections with a backoff."""
+    session = requests.Session()
+    retry = Retry(total=max_retries, backoff_factor=0.5, status_forcelist=[502, 503, 504])
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+def make_request(url: str, accept_encoding: Union[None, str] = None,
+                 session: Union[None, requests.Session] = None,
+                 timeout: Union[None, int] = None) -> Union[List[dict], dict, str]:
     headers = {}
     if accept_encoding:
         headers = {'Accept-Encoding': accept_encoding}
-    response = requests.get(url, headers=headers)
+    if session:
+        response = session.get(url, headers=headers, timeout=timeout)
+    else:
+        response = requests.get(url, headers=headers, timeout=timeout)
     if response.status_code == 200:
         if response.headers['Content-Type'] == 'application/json':
             return response.json()
@@ -24,16 +60,60 @@ def make_request(url: str, accept_encoding: Union[None, str] = None) -> Union[Li
 
 class TextRepo:
 
-    def __init__(self, api_url: str):
+    def __init__(self, api_url: str, pool_size: int = default_text_repo_config['pool_size'],
+                 max_workers: int = default_text_repo_config['max_workers'],
+                 max_retries: int = default_text_repo_config['max_retries'],
+                 timeout: int = default_text_repo_config['timeout'],
+                 cache_dir: Union[None, str] = default_text_repo_config['cache_dir']):
+        """A client for the TextRepo API that reuses pooled keep-alive connections for all
+        requests, remembers the internal document and file IDs of external IDs, and optionally
+        caches version contents on disk. Versions are immutable, so cached contents are keyed
+        by version ID only.
+
+        :param api_url: the base URL of the TextRepo API
+        :type api_url: str
+        :param pool_size: the number of pooled connections to the TextRepo host
+        :type pool_size: int
+        :param max_workers: the number of concurrent requests for batched lookups
+        :type max_workers: int
+        :param max_retries: the number of retries for failed connections
+        :type max_retries: int
+        :param timeout: the number of seconds to wait for a response
+        :type timeout: int
+        :param cache_dir: the directory for caching version contents, or None for no caching
+        :type cache_dir: Union[None, str]
+        """
         self.api_url = api_url
         self.type_name = {}
         self.type_id = {}
         self.documents_url = api_url + '/rest/documents'
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self.cache_dir = cache_dir
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+        self.session = make_session(pool_size=pool_size, max_retries=max_retries)
+        self.internal_ids: Dict[str, str] = {}
+        self.file_type_ids: Dict[tuple, Union[None, str]] = {}
         self.get_types()
 
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def close(self) -> None:
+        """Close the pooled connections."""
+        self.session.close()
+
+    def request(self, url: str, accept_encoding: Union[None, str] = None) -> Union[List[dict], dict, str]:
+        """Make a request using the pooled session of this client."""
+        return make_request(url, accept_encoding=accept_encoding, session=self.session, timeout=self.timeout)
+
     def get_types(self) -> None:
         """Check TextRepo for the available file types and their IDs."""
-        data: List[Dict[str, str]] = make_request(self.api_url + '/rest/types')
+        data: List[Dict[str, str]] = self.request(self.api_url + '/rest/types')
         for type_info in data:
             self.type_id[type_info['name']] = type_info['id']
             self.type_name[type_info['id']] = type_info['name']
@@ -53,14 +133,16 @@ class TextRepo:
 
     def get_internal_id(self, external_id: str) -> str:
         """Return the TextRepo internal document ID for a given external ID"""
-        url = self.documents_url + f'?externalId={external_id}'
-        data: Dict[str, List[Dict[str, str]]] = make_request(url)
-        return data['items'][0]['id']
+        if external_id not in self.internal_ids:
+            url = self.documents_url + f'?externalId={external_id}'
+            data: Dict[str, List[Dict[str, str]]] = self.request(url)
+            self.internal_ids[external_id] = data['items'][0]['id']
+        return self.internal_ids[external_id]
 
     def get_document_metadata(self, external_id, content_type) -> str:
         """Return document metadata for a given external ID."""
         endpoint = f'/task/find/{external_id}/document/metadata?type={content_type}'
-        return make_request(self.api_url + endpoint)
+        return self.request(self.api_url + endpoint)
 
     def get_last_version_content(self, external_id: str, file_type: str) -> Union[str, None]:
         """Return the content of the latest version of a given external ID and file type.
@@ -75,7 +157,7 @@ class TextRepo:
         endpoint = f'/task/find/{external_id}/file/contents?type={file_type}'
         url = self.api_url + endpoint
         try:
-            return make_request(url, accept_encoding="gzip")
+            return self.request(url, accept_encoding="gzip")
         except ConnectionError:
             return None
 
@@ -83,29 +165,75 @@ class TextRepo:
         """Return information on the available files for a given external ID."""
         internal_id = self.get_internal_id(external_id)
         url = self.documents_url + f'/{internal_id}/files'
-        data: Dict[str, List[Dict[str, str]]] = make_request(url)
+        data: Dict[str, List[Dict[str, str]]] = self.request(url)
         for item in data['items']:
             item['type'] = self.get_type_name(item['typeId'])
         return data
 
     def get_file_type_id(self, external_id: str, file_type: str) -> Union[None, str]:
         """Return the file id for a given external document ID and a given file type."""
-        file_info = self.get_file_info(external_id)
-        for item in file_info['items']:
-            if item['type'] == file_type:
-                return item['id']
-        return None
+        if (external_id, file_type) not in self.file_type_ids:
+            file_info = self.get_file_info(external_id)
+            for item in file_info['items']:
+                self.file_type_ids[(external_id, item['type'])] = item['id']
+            if (external_id, file_type) not in self.file_type_ids:
+                return None
+        return self.file_type_ids[(external_id, file_type)]
 
     def get_file_type_versions(self, external_id: str, file_type: str) -> Dict[str, Union[str, List[Dict[str, str]]]]:
         """Return information on the available file versions for a given external document ID and a given file type."""
         file_id = self.get_file_type_id(external_id, file_type)
         url = self.api_url + f'/rest/files/{file_id}/versions'
-        return make_request(url)
+        return self.request(url)
+
+    def get_cache_file(self, version_id: str) -> str:
+        """Return the path of the cache file for the contents of a version."""
+        return os.path.join(self.cache_dir, version_id[:2], f'{version_id}.gz')
+
+    def read_cached_content(self, version_id: str) -> Union[None, str]:
+        """Return the cached content of a version, or None if it is not in the cache."""
+        if not self.cache_dir:
+            return None
+        cache_file = self.get_cache_file(version_id)
+        if not os.path.isfile(cache_file):
+            return None
+        with gzip.open(cache_file, 'rt') as fh:
+            return fh.read()
+
+    def write_cached_content(self, version_id: str, content: str) -> None:
+        """Write the content of a version to the cache."""
+        if not self.cache_dir or not isinstance(content, str):
+            return None
+        cache_file = self.get_cache_file(version_id)
+        os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+        # write to a temporary file first, so concurrent readers never see a partial file
+        # a unique temporary file, as threads of the same process can write the same version
+        fd, temp_file = tempfile.mkstemp(dir=os.path.dirname(cache_file), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as raw_fh:
+                with gzip.open(raw_fh, 'wt') as fh:
+                    fh.write(content)
+            os.replace(temp_file, cache_file)
+        except BaseException:
+            if os.path.exists(temp_file):
+                os.remove(temp_file)
+            raise
 
     def get_content_by_version_id(self, version_id: str) -> str:
         """Return content of a version of a file given a version ID."""
-        url = self.api_url + f'/rest/versions/{version_id}/contents'
-        return make_request(url, accept_encoding="gzip")
+        content = self.read_cached_content(version_id)
+        if content is None:
+            url = self.api_url + f'/rest/versions/{version_id}/contents'
+            content = self.request(url, accept_encoding="gzip")
+            self.write_cached_content(version_id, content)
+        return content
+
+    def get_contents_by_version_ids(self, version_ids: Iterable[str]) -> Dict[str, str]:
+        """Return the contents of a batch of versions, fetching up to max_workers versions concurrently."""
+        version_ids = list(version_ids)
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            contents = executor.map(self.get_content_by_version_id, version_ids)
+            return {version_id: content for version_id, content in zip(version_ids, contents)}
 
     def get_last_version_info(self, scan_id, file_type: str) -> Union[None, Dict[str, str]]:
         """Return information on the the latest available file version
@@ -115,7 +243,25 @@ class TextRepo:
             return None
         return sorted(versions["items"], key=lambda x: x["createdAt"], reverse=True)[0]
 
+    def get_last_version_infos(self, scan_ids: Iterable[str],
+                               file_type: str) -> Dict[str, Union[None, Dict[str, str]]]:
+        """Return information on the latest available file version for a batch of external
+        document IDs and a given file type, looking up up to max_workers IDs concurrently."""
+        scan_ids = list(scan_ids)
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            version_infos = executor.map(lambda scan_id: self.get_last_version_info(scan_id, file_type), scan_ids)
+            return {scan_id: version_info for scan_id, version_info in zip(scan_ids, version_infos)}
+
     def get_version_metadata(self, version_id: str) -> Union[None, Dict[str, str]]:
         """Return content of a version of a file given a version ID."""
         url = self.api_url + f'/rest/versions/{version_id}/metadata'
-        return make_request(url)
+        return self.request(url)
+
+
+def make_text_repo(api_url: str, config: Union[None, dict] = None) -> TextRepo:
+    """Return a TextRepo client using the 'text_repo' settings of the config if available."""
+    text_repo_config = {key: value for key, value in default_text_repo_config.items()}
+    if config and 'text_repo' in config:
+        text_repo_config.update({key: value for key, value in config['text_repo'].items()
+                                 if key in default_text_repo_config})
+    return TextRepo(api_url, **text_repo_config)
@@ -0,0 +1,154 @@
+from typing import Dict, List, Union
+from elasticsearch import Elasticsearch
+from elasticsearch.helpers import BulkIndexError, streaming_bulk
+
+
+default_bulk_config = {
+    'chunk_size': 500,
+    'max_chunk_bytes': 10 * 1024 * 1024,
+    'max_retries': 5,
+    'initial_backoff': 2,
+    'max_backoff': 600,
+    # raise a BulkIndexError when leaving the indexer if any document failed to be indexed
+    'raise_on_error': True,
+}
+
+
+class BulkIndexer:
+
+    def __init__(self, es: Elasticsearch, chunk_size: int = default_bulk_config['chunk_size'],
+                 max_chunk_bytes: int = default_bulk_config['max_chunk_bytes'],
+                 max_retries: int = default_bulk_config['max_retries'],
+                 initial_backoff: Union[int, float] = default_bulk_config['initial_backoff'],
+                 max_backoff: Union[int, float] = default_bulk_config['max_backoff'],
+                 raise_on_error: bool = default_bulk_config['raise_on_error']):
+        """A buffer for index requests that sends them to Elasticsearch in bulk. It
+        exposes the same index method signature as an Elasticsearch client, so it
+        can be passed to the indexing functions in place of the client.
+
+        Documents are flushed when the buffer contains chunk_size documents or
+        max_chunk_bytes bytes, and when the indexer is used as a context manager,
+        any remaining buffered documents are flushed on exit. Bulk requests that
+        are rejected with a 429 (too many requests) are retried max_retries times
+        with an exponential backoff starting at initial_backoff seconds.
+
+        Documents that fail to be indexed are collected in errors and don't stop
+        the remaining documents from being indexed. With raise_on_error, leaving the
+        context manager raises a BulkIndexError with all collected errors, so an
+        indexing function doesn't finish normally with documents missing.
+
+        :param es: the elasticsearch instance to use for indexing
+        :type es: Elasticsearch
+        :param chunk_size: the maximum number of documents per bulk request
+        :type chunk_size: int
+        :param max_chunk_bytes: the maximum size in bytes of a bulk request
+        :type max_chunk_bytes: int
+        :param max_retries: the maximum number of retries for rejected documents
+        :type max_retries: int
+        :param initial_backoff: the number of seconds to wait before the first retry
+        :type initial_backoff: Union[int, float]
+        :param max_backoff: the maximum number of seconds to wait between retries
+        :type max_backoff: Union[int, float]
+        :param raise_on_error: whether to raise an error on exit when any document failed to be indexed
+        :type raise_on_error: bool
+        """
+        self.es = es
+        self.chunk_size = chunk_size
+        self.max_chunk_bytes = max_chunk_bytes
+        self.max_retries = max_retries
+        self.initial_backoff = initial_backoff
+        self.max_backoff = max_backoff
+        self.raise_on_error = raise_on_error
+        self.actions: List[Dict[str, any]] = []
+        self.buffer_bytes = 0
+        self.num_indexed = 0
+        self.num_flushes = 0
+        self.errors: List[Dict[str, any]] = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.flush()
+        if exc_type is None and self.raise_on_error and len(self.errors) > 0:
+            # when the block already raised an error, don't hide it with this one
+            raise BulkIndexError(f'{len(self.errors)} document(s) failed to index', self.errors)
+
+    def index(self, index: str, body: Union[dict, str], id: Union[None, str] = None,
+              doc_type: Union[None, str] = None) -> None:
+        """Add an index request to the buffer, flushing the buffer if it is full.
+
+        :param index: the name of the index to add the document to
+        :type index: str
+        :param body: the document to index
+        :type body: Union[dict, str]
+        :param id: the id of the document
+        :type id: Union[None, str]
+        :param doc_type: the (deprecated) document type
+        :type doc_type: Union[None, str]
+        """
+        # serialize the document once, so its size is known and the
+        # bulk helper doesn't need to serialize it again
+        source = self.es.transport.serializer.dumps(body)
+        action = {'_op_type': 'index', '_index': index, '_source': source}
+        if id is not None:
+            action['_id'] = id
+        if doc_type is not None:
+            action['_type'] = doc_type
+        self.add_action(action, source)
+
+    def update(self, index: str, id: str, body: dict, doc_type: Union[None, str] = None) -> None:
+        """Add an update request to the buffer, flushing the buffer if it is full.
+
+        :param index: the name of the index of the document
+        :type index: str
+        :param id: the id of the document to update
+        :type id: str
+        :param body: the update request body, e.g. {'doc': {...}} for a partial update
+        :type body: dict
+        :param doc_type: the (deprecated) document type
+        :type doc_type: Union[None, str]
+        """
+        # the bulk helper takes the update body from the remaining fields of the action
+        action = {'_op_type': 'update', '_index': index, '_id': id, **body}
+        if doc_type is not None:
+            action['_type'] = doc_type
+        self.add_action(action, self.es.transport.serializer.dumps(body))
+
+    def add_action(self, action: Dict[str, any], source: str) -> None:
+        self.actions.append(action)
+        # add a rough estimate of the size of the action line
+        self.buffer_bytes += len(source.encode('utf-8')) + 100
+        if len(self.actions) >= self.chunk_size or self.buffer_bytes >= self.max_chunk_bytes:
+            self.flush()
+
+    def flush(self) -> None:
+        """Send all buffered documents to Elasticsearch and record any per-document errors."""
+        if len(self.actions) == 0:
+            return None
+        actions = self.actions
+        self.actions = []
+        self.buffer_bytes = 0
+        for ok, item in streaming_bulk(self.es, actions, chunk_size=self.chunk_size,
+                                       max_chunk_bytes=self.max_chunk_bytes,
+                                       raise_on_error=False,
+                                       max_retries=self.max_retries,
+                                       initial_backoff=self.initial_backoff,
+                                       max_backoff=self.max_backoff):
+            if ok:
+                self.num_indexed += 1
+            else:
+                op_type, info = item.popitem()
+                print(f'Error indexing document with id {info.get("_id")} in index {info.get("_index")}:',
+                      info.get('error'))
+                self.errors.append(info)
+        self.num_flushes += 1
+
+
+def make_bulk_indexer(es: Elasticsearch, config: Union[None, dict] = None) -> BulkIndexer:
+    """Return a bulk indexer for the given elasticsearch instance, using the
+    'bulk_indexing' settings of the config if available."""
+    bulk_config = {key: value for key, value in default_bulk_config.items()}
+    if config and 'bulk_indexing' in config:
+        bulk_config.update(config['bulk_indexing'])
+    return BulkIndexer(es, **bulk_config)
@@ -9,10 +9,10 @@ from fuzzy_search.fuzzy_phrase_searcher import FuzzyPhraseSearcher
 from fuzzy_search.fuzzy_phrase_model import PhraseModel
 
 from republic.extraction.extract_resolution_metadata import generate_proposition_searchers, add_resolution_metadata
-from republic.model.physical_document_model import StructureDoc, parse_derived_coords, json_to_pagexml_scan
+from republic.model.physical_document_model import StructureDoc, parse_derived_coords
 from republic.model.physical_document_model import PageXMLPage
 from settings import text_repo_url
-from republic.download.text_repo import TextRepo
+from republic.download.text_repo import TextRepo, make_text_repo
 import republic.parser.logical.pagexml_session_parser as session_parser
 import republic.parser.republic_file_parser as file_parser
 import republic.parser.republic_inventory_parser as inv_parser
@@ -20,11 +20,15 @@ import republic.parser.hocr.republic_page_parser as hocr_page_parser
 import republic.model.resolution_phrase_model as rpm
 from republic.model.republic_date import RepublicDate, make_republic_date
 from republic.model.republic_document_model import Session, get_session_resolutions, get_session_scans_version
-from republic.model.republic_document_model import Resolution, configure_resolution_searchers
+from republic.model.republic_document_model import Resolution, get_resolution_searchers
 from republic.model.republic_document_model import make_session_text_version
 from republic.config.republic_config import set_config_inventory_num
 from republic.elastic.republic_retrieving import create_es_scan_doc, create_es_page_doc
+from republic.elastic.republic_bulk_indexing import BulkIndexer, make_bulk_indexer
 from republic.helper.metadata_helper import get_per_page_type_index
+from republic.helper.indexing_monitor import monitor
+import republic.model.pagexml_store as pagexml_store
+import republic.model.pagexml_serializer as pagexml_serializer
 import republic.parser.pagexml.republic_pagexml_parser as pagexml_parser
 from republic.helper.annotation_helper import make_hash_id
 import republic.elastic.republic_retrieving as rep_es
@@ -37,6 +41,22 @@ def add_timestamp(doc: Union[Dict[str, any], StructureDoc]) -> None:
         doc['metadata']['index_timestamp'] = datetime.datetime.now().isoformat()
 
 
+def read_inventory_store(es: Elasticsearch, config: dict, doc_kind: str) -> Union[None, pagexml_store.PageXMLStore]:
+    """Return the local store with the scans or pages of the inventory in the config, if
+    there is one and it matches the scans or pages in Elasticsearch. A store doesn't match
+    when the documents were indexed again without writing the store, e.g. by a step that
+    was run without a store directory."""
+    store = pagexml_store.read_inventory_store(config, doc_kind)
+    if store is None:
+        return None
+    index = config['scan_index'] if doc_kind == 'scan' else config['page_index']
+    source_max_index_millis = rep_es.retrieve_inventory_max_index_timestamp(es, config['inventory_num'], index)
+    if not pagexml_store.store_matches_source(store, source_max_index_millis):
+        print(f"Not using store {store.store_path}, its {doc_kind}s don't match those in index {index}")
+        return None
+    return store
+
+
 def get_pagexml_page_type(page: Union[PageXMLPage, Dict[str, any]],
                           page_type_index: Dict[str, str]) -> str:
     page_num = page.metadata['page_num'] if isinstance(page, PageXMLPage) else page['metadata']['page_num']
@@ -47,14 +67,26 @@ def get_pagexml_page_type(page: Union[PageXMLPage, Dict[str, any]],
 
 
 def add_pagexml_page_types(es: Elasticsearch, inv_config: dict) -> None:
-    inv_metadata = rep_es.retrieve_inventory_metadata(es, inv_config["inventory_num"], inv_config)
-    page_type_index = get_per_page_type_index(inv_metadata)
-    pages = rep_es.retrieve_inventory_pages(es, inv_config["inventory_num"], inv_config)
-    for pi, page in enumerate(sorted(pages, key=lambda x: x.metadata['page_num'])):
-        page.metadata['page_type'] = get_pagexml_page_type(page, page_type_index)
-        add_timestamp(page)
-        es.index(index=inv_config["page_index"], id=page.metadata['id'], body=page.json())
-        print(page.metadata['id'], page.metadata["page_type"])
+    with monitor.substage('retrieve'):
+        inv_metadata = rep_es.retrieve_inventory_metadata(es, inv_config["inventory_num"], inv_config)
+        page_type_index = get_per_page_type_index(inv_metadata)
+        page_store = read_inventory_store(es, inv_config, 'page')
+        if page_store:
+            pages = list(page_store.iter_docs())
+        else:
+            pages = rep_es.retrieve_inventory_pages(es, inv_config["inventory_num"], inv_config)
+    store_writer = pagexml_store.make_inventory_store_writer(inv_config)
+    with make_bulk_indexer(es, inv_config) as bulk_es:
+        for pi, page in enumerate(sorted(pages, key=lambda x: x.metadata['page_num'])):
+            page.metadata['page_type'] = get_pagexml_page_type(page, page_type_index)
+            add_timestamp(page)
+            monitor.count('pages')
+            with monitor.substage('index'):
+                bulk_es.index(index=inv_config["page_index"], id=page.metadata['id'], body=page.json())
+            if store_writer:
+                store_writer.add_doc(page)
+            print(page.metadata['id'], page.metadata["page_type"])
+    pagexml_store.save_inventory_store(store_writer, inv_config, 'page')
 
 
 def delete_es_index(es: Elasticsearch, index: str):
@@ -80,20 +112,20 @@ def clone_index(es: Elasticsearch, original_index: str, new_index: str):
     print(es.indices.put_settings(index=original_index, body={"index.blocks.write": False}))
 
 
-def index_inventory_metadata(es: Elasticsearch, inventory_metadata: dict, config: dict):
+def index_inventory_metadata(es: Union[Elasticsearch, BulkIndexer], inventory_metadata: dict, config: dict):
     inventory_metadata['index_timestamp'] = datetime.datetime.now()
     es.index(index=config['inventory_index'], doc_type=config['inventory_doc_type'],
              id=inventory_metadata['inventory_num'], body=inventory_metadata)
 
 
-def index_scan(es: Elasticsearch, scan_hocr: dict, config: dict):
+def index_scan(es: Union[Elasticsearch, BulkIndexer], scan_hocr: dict, config: dict):
     doc = create_es_scan_doc(scan_hocr)
     add_timestamp(doc)
     es.index(index=config['scan_index'], doc_type=config['scan_doc_type'],
              id=scan_hocr['metadata']['id'], body=doc)
 
 
-def index_page(es: Elasticsearch, page_hocr: dict, config: dict):
+def index_page(es: Union[Elasticsearch, BulkIndexer], page_hocr: dict, config: dict):
     doc = create_es_page_doc(page_hocr)
     add_timestamp(doc)
     es.index(index=config['page_index'], doc_type=config['page_doc_type'],
@@ -101,14 +133,11 @@ def index_page(es: Elasticsearch, page_hocr: dict, config: dict):
 
 
 def index_lemmata(es: Elasticsearch, lemma_index: dict, config: dict):
-    for lemma in lemma_index:
-        lemma_doc = rep_es.create_es_index_lemma_doc(lemma, lemma_index, config)
-        doc_id = f'{config["inventory_num"]}---{normalize_lemma(lemma)}'
-        try:
-            es.index(index=config['lemma_index'], doc_type=config['lemma_doc_type'], id=doc_id, body=lemma_doc)
-        except RequestError:
-            print(f'Error indexing lemma term with id {doc_id}')
-            raise
+    with make_bulk_indexer(es, config) as bulk_es:
+        for lemma in lemma_index:
+            lemma_doc = rep_es.create_es_index_lemma_doc(lemma, lemma_index, config)
+            doc_id = f'{config["inventory_num"]}---{normalize_lemma(lemma)}'
+            bulk_es.index(index=config['lemma_index'], doc_type=config['lemma_doc_type'], id=doc_id, body=lemma_doc)
 
 
 def normalize_lemma(lemma):
@@ -119,57 +148,97 @@ def normalize_lemma(lemma):
 def index_inventory_from_zip(es: Elasticsearch, inventory_num: int, inventory_config: dict):
     inv_metadata = rep_es.retrieve_inventory_metadata(es, inventory_num, inventory_config)
     page_type_index = get_per_page_type_index(inv_metadata)
-    text_repo = TextRepo(text_repo_url)
-    for scan_doc in inv_parser.parse_inventory_from_zip(inventory_num, inventory_config):
-        version_info = text_repo.get_last_version_info(scan_doc["metadata"]["id"],
-                                                       file_type=inventory_config['ocr_type'])
+    batch_size = inventory_config.get('text_repo', {}).get('batch_size', 100)
+    batch = []
+    with make_text_repo(text_repo_url, inventory_config) as text_repo, \
+            make_bulk_indexer(es, inventory_config) as bulk_es:
+        for scan_doc in monitor.iterate('parse', inv_parser.parse_inventory_from_zip(inventory_num,
+                                                                                     inventory_config)):
+            if not scan_doc:
+                continue
+            batch.append(scan_doc)
+            if len(batch) >= batch_size:
+                index_zip_scan_batch(bulk_es, text_repo, batch, page_type_index, inventory_config)
+                batch = []
+        if len(batch) > 0:
+            index_zip_scan_batch(bulk_es, text_repo, batch, page_type_index, inventory_config)
+
+
+def index_zip_scan_batch(bulk_es: BulkIndexer, text_repo: TextRepo, scan_docs: list,
+                         page_type_index: Dict[int, any], inventory_config: dict):
+    """Look up the latest TextRepo versions of a batch of parsed scans concurrently, then
+    index the scans and the pages of the double page scans."""
+    with monitor.substage('text_repo'):
+        version_infos = text_repo.get_last_version_infos([scan_doc["metadata"]["id"] for scan_doc in scan_docs],
+                                                         file_type=inventory_config['ocr_type'])
+    for scan_doc in scan_docs:
+        version_info = version_infos[scan_doc["metadata"]["id"]]
         scan_doc["version"] = version_info
-        if not scan_doc:
-            continue
         print("Indexing scan", scan_doc["metadata"]["id"])
-        index_scan(es, scan_doc, inventory_config)
+        monitor.count('scans')
+        with monitor.substage('index'):
+            index_scan(bulk_es, scan_doc, inventory_config)
         if 'double_page' not in scan_doc['metadata']['scan_type']:
             continue
-        if inventory_config['ocr_type'] == 'hocr':
-            pages_doc = hocr_page_parser.parse_double_page_scan(scan_doc, inventory_config)
-        else:
-            pages_doc = pagexml_parser.split_pagexml_scan(scan_doc)
+        with monitor.substage('split'):
+            if inventory_config['ocr_type'] == 'hocr':
+                pages_doc = hocr_page_parser.parse_double_page_scan(scan_doc, inventory_config)
+            else:
+                pages_doc = pagexml_parser.split_pagexml_scan(scan_doc)
         for page_doc in pages_doc:
             page_doc.metadata["version"] = version_info
-            page_doc.metadata['type'] = [page_doc.metadata['type'], page_type_index[page_doc.metadata['page_num']]]
-            index_page(es, page_doc.json, inventory_config)
+            page_doc.metadata['type'] = [page_doc.metadata['type'],
+                                         page_type_index[page_doc.metadata['page_num']]]
+            monitor.count('pages')
+            with monitor.substage('index'):
+                index_page(bulk_es, page_doc.json, inventory_config)
 
 
 def index_inventory_from_text_repo(es, inv_num, inventory_config: Dict[str, any], ignore_version: bool = False):
-    text_repo = TextRepo(text_repo_url)
     inventory_metadata = rep_es.retrieve_inventory_metadata(es, inv_num, inventory_config)
     page_type_index = get_per_page_type_index(inventory_metadata)
     if "num_scans" not in inventory_metadata:
         return None
-    for scan_num in range(1, inventory_metadata["num_scans"] + 1):
-        scan_doc = rep_es.parse_latest_version(es, text_repo, scan_num, inventory_metadata,
-                                               inventory_config, ignore_version=ignore_version)
-        if not scan_doc:
-            continue
-        print("Indexing scan", scan_doc["metadata"]["id"])
-        index_scan(es, scan_doc, inventory_config)
-        if 'double_page' not in scan_doc['metadata']['scan_type']:
-            continue
-        if inventory_config['ocr_type'] == 'hocr':
-            pages_doc = hocr_page_parser.parse_double_page_scan(scan_doc, inventory_config)
-        else:
-            pages_doc = pagexml_parser.split_pagexml_scan(scan_doc)
-        for page_doc in pages_doc:
-            page_doc['metadata']['page_type'] = get_pagexml_page_type(page_doc, page_type_index)
-            page_doc["version"] = scan_doc["version"]
-            index_page(es, page_doc, inventory_config)
+    with make_text_repo(text_repo_url, inventory_config) as text_repo, \
+            make_bulk_indexer(es, inventory_config) as bulk_es:
+        for scan_num in range(1, inventory_metadata["num_scans"] + 1):
+            with monitor.substage('retrieve'):
+                scan_doc = rep_es.parse_latest_version(es, text_repo, scan_num, inventory_metadata,
+                                                       inventory_config, ignore_version=ignore_version)
+            if not scan_doc:
+                continue
+            print("Indexing scan", scan_doc["metadata"]["id"])
+            monitor.count('scans')
+            with monitor.substage('index'):
+                index_scan(bulk_es, scan_doc, inventory_config)
+            if 'double_page' not in scan_doc['metadata']['scan_type']:
+                continue
+            with monitor.substage('split'):
+                if inventory_config['ocr_type'] == 'hocr':
+                    pages_doc = hocr_page_parser.parse_double_page_scan(scan_doc, inventory_config)
+                else:
+                    pages_doc = pagexml_parser.split_pagexml_scan(scan_doc)
+            for page_doc in pages_doc:
+                page_doc['metadata']['page_type'] = get_pagexml_page_type(page_doc, page_type_index)
+                page_doc["version"] = scan_doc["version"]
+                monitor.count('pages')
+                with monitor.substage('index'):
+                    index_page(bulk_es, page_doc, inventory_config)
 
 
 def index_inventory_scans_from_text_repo(es_anno, es_text, inventory_num, config):
-    for si, scan_doc in enumerate(rep_es.retrieve_scans_pagexml_from_text_repo_by_inventory(es_text,
-                                                                                            inventory_num, config)):
-        scan_doc.metadata['index_timestamp'] = datetime.datetime.now()
-        es_anno.index(index=config['scan_index'], id=scan_doc.id, body=scan_doc.json)
+    store_writer = pagexml_store.make_inventory_store_writer(config)
+    with make_bulk_indexer(es_anno, config) as bulk_es:
+        scan_docs = rep_es.retrieve_scans_pagexml_from_text_repo_by_inventory(es_text, inventory_num, config)
+        for si, scan_doc in enumerate(monitor.iterate('retrieve', scan_docs)):
+            scan_doc.metadata['index_timestamp'] = datetime.datetime.now()
+            monitor.count('scans')
+            with monitor.substage('index'):
+                bulk_es.index(index=config['scan_index'], id=scan_doc.id,
+                              body=pagexml_serializer.pagexml_to_json_string(scan_doc))
+            if store_writer:
+                store_writer.add_doc(scan_doc)
+    pagexml_store.save_inventory_store(store_writer, config, 'scan')
     return None
 
 
@@ -177,22 +246,40 @@ def index_inventory_pages_from_scans(es_anno: Elasticsearch, inventory_num: int)
     inv_config = set_config_inventory_num(inventory_num, ocr_type="pagexml")
     inv_metadata = rep_es.retrieve_inventory_metadata(es_anno, inv_config["inventory_num"], inv_config)
     page_type_index = rep_es.get_per_page_type_index(inv_metadata)
-    query = rep_es.make_inventory_query(inventory_num)
-    del query['size']
-    for hi, hit in enumerate(rep_es.scroll_hits(es_anno, query, index='scans', size=2)):
-        scan_doc = json_to_pagexml_scan(hit['_source'])
-        pages_doc = pagexml_parser.split_pagexml_scan(scan_doc)
-        for page_doc in pages_doc:
-            if page_doc.metadata['page_num'] not in page_type_index:
-                page_doc.metadata['type'] = "empty_page"
-                print("page without page_num:", page_doc.id)
-                print("\tpage stats:", page_doc.stats)
-            else:
-                page_doc.metadata['type'] = [page_doc.metadata['type'], page_type_index[page_doc.metadata['page_num']]]
-            page_doc.metadata['index_timestamp'] = datetime.datetime.now()
-            es_anno.index(index=inv_config['page_index'], id=page_doc.id, body=page_doc.json)
-        if (hi+1) % 100 == 0:
-            print(hi+1, "scans processed")
+    scan_store = read_inventory_store(es_anno, inv_config, 'scan')
+    if scan_store:
+        # read the parsed scans from the local store instead of from Elasticsearch
+        scan_docs = scan_store.iter_docs()
+    else:
+        query = rep_es.make_inventory_query(inventory_num)
+        del query['size']
+        hits = rep_es.scroll_hits(es_anno, query, index='scans', size=None,
+                                  num_slices=inv_config.get('scroll_slices', 1))
+        scan_docs = (pagexml_serializer.fast_json_to_pagexml_scan(hit['_source']) for hit in hits)
+    store_writer = pagexml_store.make_inventory_store_writer(inv_config)
+    with make_bulk_indexer(es_anno, inv_config) as bulk_es:
+        for hi, scan_doc in enumerate(monitor.iterate('retrieve', scan_docs)):
+            with monitor.substage('split'):
+                pages_doc = pagexml_parser.split_pagexml_scan(scan_doc)
+            monitor.count('scans')
+            for page_doc in pages_doc:
+                if page_doc.metadata['page_num'] not in page_type_index:
+                    page_doc.metadata['type'] = "empty_page"
+                    print("page without page_num:", page_doc.id)
+                    print("\tpage stats:", page_doc.stats)
+                else:
+                    page_doc.metadata['type'] = [page_doc.metadata['type'],
+                                                 page_type_index[page_doc.metadata['page_num']]]
+                page_doc.metadata['index_timestamp'] = datetime.datetime.now()
+                monitor.count('pages')
+                with monitor.substage('index'):
+                    bulk_es.index(index=inv_config['page_index'], id=page_doc.id,
+                                  body=pagexml_serializer.pagexml_to_json_string(page_doc))
+                if store_writer:
+                    store_writer.add_doc(page_doc)
+            if (hi+1) % 100 == 0:
+                print(hi+1, "scans processed")
+    pagexml_store.save_inventory_store(store_writer, inv_config, 'page')
 
 
 def index_hocr_inventory(es: Elasticsearch, inventory_num: int, base_config: dict, base_dir: str):
@@ -200,59 +287,85 @@ def index_hocr_inventory(es: Elasticsearch, inventory_num: int, base_config: dic
                                                 default_config=base_config, base_dir=base_dir)
     # print(inventory_config)
     scan_files = file_parser.get_hocr_files(inventory_config['hocr_dir'])
-    for scan_file in scan_files:
-        scan_hocr = hocr_page_parser.get_scan_hocr(scan_file, config=inventory_config)
-        if not scan_hocr:
-            continue
-        if 'double_page' in scan_hocr['metadata']['scan_type']:
-            # print('double page scan:', scan_hocr['scan_num'], scan_hocr['scan_type'])
-            pages_hocr = hocr_page_parser.parse_double_page_scan(scan_hocr, inventory_config)
-            for page_hocr in pages_hocr:
-                # print(inventory_num, page_hocr['page_num'], page_hocr['page_type'])
-                index_page(es, page_hocr, inventory_config)
-        else:
-            # print('NOT DOUBLE PAGE:', scan_hocr['scan_num'], scan_hocr['scan_type'])
-            index_scan(es, scan_hocr, inventory_config)
-            continue
+    with make_bulk_indexer(es, inventory_config) as bulk_es:
+        for scan_file in scan_files:
+            with monitor.substage('parse'):
+                scan_hocr = hocr_page_parser.get_scan_hocr(scan_file, config=inventory_config)
+            if not scan_hocr:
+                continue
+            monitor.count('scans')
+            if 'double_page' in scan_hocr['metadata']['scan_type']:
+                # print('double page scan:', scan_hocr['scan_num'], scan_hocr['scan_type'])
+                with monitor.substage('split'):
+                    pages_hocr = hocr_page_parser.parse_double_page_scan(scan_hocr, inventory_config)
+                for page_hocr in pages_hocr:
+                    # print(inventory_num, page_hocr['page_num'], page_hocr['page_type'])
+                    monitor.count('pages')
+                    with monitor.substage('index'):
+                        index_page(bulk_es, page_hocr, inventory_config)
+            else:
+                # print('NOT DOUBLE PAGE:', scan_hocr['scan_num'], scan_hocr['scan_type'])
+                with monitor.substage('index'):
+                    index_scan(bulk_es, scan_hocr, inventory_config)
+                continue
 
 
 def index_inventory_hocr_scans(es: Elasticsearch, config: dict):
     scan_files = file_parser.get_hocr_files(config['hocr_dir'])
-    for scan_file in scan_files:
-        scan_hocr = hocr_page_parser.get_scan_hocr(scan_file, config=config)
-        if not scan_hocr:
-            continue
-        print("Indexing scan", scan_hocr["id"])
-        scan_es_doc = create_es_scan_doc(scan_hocr)
-        scan_es_doc['metadata']['index_timestamp'] = datetime.datetime.now()
-        es.index(index=config['scan_index'], doc_type=config['scan_doc_type'],
-                 id=scan_es_doc['id'], body=scan_es_doc)
+    with make_bulk_indexer(es, config) as bulk_es:
+        for scan_file in scan_files:
+            with monitor.substage('parse'):
+                scan_hocr = hocr_page_parser.get_scan_hocr(scan_file, config=config)
+            if not scan_hocr:
+                continue
+            print("Indexing scan", scan_hocr["id"])
+            scan_es_doc = create_es_scan_doc(scan_hocr)
+            scan_es_doc['metadata']['index_timestamp'] = datetime.datetime.now()
+            monitor.count('scans')
+            with monitor.substage('index'):
+                bulk_es.index(index=config['scan_index'], doc_type=config['scan_doc_type'],
+                              id=scan_es_doc['id'], body=scan_es_doc)
 
 
 def index_inventory_sessions_with_lines(es_anno: Elasticsearch, inv_num: int, config: dict) -> None:
-    inv_metadata = rep_es.retrieve_inventory_metadata(es_anno, inv_num, config)
-    pages = rep_es.retrieve_resolution_pages(es_anno, inv_num, config)
+    with monitor.substage('retrieve'):
+        inv_metadata = rep_es.retrieve_inventory_metadata(es_anno, inv_num, config)
+        page_store = read_inventory_store(es_anno, config, 'page')
+        if page_store:
+            pages = pagexml_store.get_store_pages_by_type(page_store, 'resolution_page')
+        else:
+            pages = rep_es.retrieve_resolution_pages(es_anno, inv_num, config)
     pages.sort(key=lambda page: page.metadata['page_num'])
-    for mi, session in enumerate(session_parser.get_sessions(pages, config, inv_metadata)):
-        print('session received from get_sessions:', session.id)
-        date_string = None
-        for match in session.evidence:
-            if match.has_label('session_date'):
-                date_string = match.string
-        print('\tdate string:', date_string)
-        es_anno.index(index='session_lines', id=session.id, body=session.json)
+    monitor.count('pages', len(pages))
+    with make_bulk_indexer(es_anno, config) as bulk_es:
+        sessions = session_parser.get_sessions(pages, config, inv_metadata)
+        for mi, session in enumerate(monitor.iterate('get_sessions', sessions)):
+            print('session received from get_sessions:', session.id)
+            date_string = None
+            for match in session.evidence:
+                if match.has_label('session_date'):
+                    date_string = match.string
+            print('\tdate string:', date_string)
+            monitor.count('sessions')
+            with monitor.substage('index'):
+                bulk_es.index(index='session_lines', id=session.id, body=session.json)
 
 
 def index_inventory_sessions_with_text(es_anno: Elasticsearch, inv_num: int, config: dict) -> None:
     from collections import Counter
-    for mi, session in enumerate(rep_es.retrieve_inventory_sessions_with_lines(es_anno, inv_num, config)):
-        session_text_doc = make_session_text_version(session)
-        session_text_doc['metadata']['index_timestamp'] = datetime.datetime.now().isoformat()
-        type_freq = Counter([anno['type'] for anno in session_text_doc['annotations']])
-        for anno_type, freq in type_freq.most_common():
-            print(f'{anno_type: <20}{freq: >4}')
-        print(session.id, session_text_doc['metadata']['index_timestamp'])
-        es_anno.index(index=config['session_text_index'], id=session.id, body=session_text_doc)
+    with make_bulk_indexer(es_anno, config) as bulk_es:
+        sessions = rep_es.retrieve_inventory_sessions_with_lines(es_anno, inv_num, config)
+        for mi, session in enumerate(monitor.iterate('retrieve', sessions)):
+            with monitor.substage('make_text_version'):
+                session_text_doc = make_session_text_version(session)
+            session_text_doc['metadata']['index_timestamp'] = datetime.datetime.now().isoformat()
+            type_freq = Counter([anno['type'] for anno in session_text_doc['annotations']])
+            for anno_type, freq in type_freq.most_common():
+                print(f'{anno_type: <20}{freq: >4}')
+            print(session.id, session_text_doc['metadata']['index_timestamp'])
+            monitor.count('sessions')
+            with monitor.substage('index'):
+                bulk_es.index(index=config['session_text_index'], id=session.id, body=session_text_doc)
 
 
 def index_sessions_inventory_old(es: Elasticsearch, inv_num: int, inv_config: dict) -> None:
@@ -370,7 +483,7 @@ def add_missing_dates(prev_date: RepublicDate, session: Session):
 
 
 def index_inventory_resolutions(es: Elasticsearch, inv_config: dict):
-    opening_searcher, verb_searcher = configure_resolution_searchers()
+    opening_searcher, verb_searcher = get_resolution_searchers()
     query = {
         'query': {
             'bool': {
@@ -380,27 +493,38 @@ def index_inventory_resolutions(es: Elasticsearch, inv_config: dict):
             }
         }
     }
-    for hit in rep_es.scroll_hits(es, query, index=inv_config['session_index'], doc_type="session", size=2):
-        print(hit['_id'])
-        session_json = hit['_source']
-        session = Session(session_json['metadata'], columns=session_json['columns'],
-                          scan_versions=session_json['scan_versions'])
-        for resolution in get_session_resolutions(session, opening_searcher, verb_searcher):
-            add_timestamp(resolution)
-            es.index(index=inv_config['resolution_index'], id=resolution.metadata['id'], body=resolution.json())
-
-
-def index_session_resolutions(es: Elasticsearch, session: Session, opening_searcher: FuzzyPhraseSearcher,
+    with make_bulk_indexer(es, inv_config) as bulk_es:
+        hits = rep_es.scroll_hits(es, query, index=inv_config['session_index'], doc_type="session",
+                                  size=None, num_slices=inv_config.get('scroll_slices', 1),
+                                  source_includes=['metadata', 'columns', 'scan_versions'])
+        for hit in monitor.iterate('retrieve', hits):
+            print(hit['_id'])
+            session_json = hit['_source']
+            with monitor.substage('parse'):
+                session = Session(session_json['metadata'], columns=session_json['columns'],
+                                  scan_versions=session_json['scan_versions'])
+            monitor.count('sessions')
+            resolutions = get_session_resolutions(session, opening_searcher, verb_searcher)
+            for resolution in monitor.iterate('get_resolutions', resolutions):
+                add_timestamp(resolution)
+                monitor.count('resolutions')
+                with monitor.substage('index'):
+                    bulk_es.index(index=inv_config['resolution_index'], id=resolution.metadata['id'],
+                                  body=resolution.json())
+
+
+def index_session_resolutions(es: Union[Elasticsearch, BulkIndexer], session: Session,
+                              opening_searcher: FuzzyPhraseSearcher,
                               verb_searcher: FuzzyPhraseSearcher, inv_config: dict) -> None:
     for resolution in get_session_resolutions(session, opening_searcher, verb_searcher):
         index_resolution(es, resolution, inv_config)
 
 
-def index_resolution(es: Elasticsearch, resolution: Union[dict, Resolution], config: dict):
+def index_resolution(es: Union[Elasticsearch, BulkIndexer], resolution: Union[dict, Resolution], config: dict):
     """Index an individual resolution.
 
-    :param es: the elasticsearch instance to use for indexing
-    :type es: Elasticsearch
+    :param es: the elasticsearch instance or bulk indexer to use for indexing
+    :type es: Union[Elasticsearch, BulkIndexer]
     :param resolution: the resolution to index, either Resolution class instance or a dictionary
     :type resolution: Union[Resolution, dict]
     :param config: a configuration dictionary containing index names
@@ -413,12 +537,19 @@ def index_resolution(es: Elasticsearch, resolution: Union[dict, Resolution], con
 
 def index_resolution_phrase_matches(es: Elasticsearch, inv_config: dict):
     searcher = make_resolution_phrase_model_searcher()
-    for resolution in rep_es.scroll_inventory_resolutions(es, inv_config):
-        print('indexing phrase matches for resolution', resolution.metadata['id'])
-        for paragraph in resolution.paragraphs:
-            doc = {'id': paragraph.metadata['id'], 'text': paragraph.text}
-            for match in searcher.find_matches(doc):
-                index_resolution_phrase_match(es, match, inv_config)
+    with make_bulk_indexer(es, inv_config) as bulk_es:
+        for resolution in monitor.iterate('retrieve', rep_es.scroll_inventory_resolutions(es, inv_config)):
+            print('indexing phrase matches for resolution', resolution.metadata['id'])
+            monitor.count('resolutions')
+            for paragraph in resolution.paragraphs:
+                doc = {'id': paragraph.metadata['id'], 'text': paragraph.text}
+                with monitor.substage('find_matches'):
+                    matches = searcher.find_matches(doc)
+                monitor.count('paragraphs')
+                monitor.count('phrase_matches', len(matches))
+                with monitor.substage('index'):
+                    for match in matches:
+                        index_resolution_phrase_match(bulk_es, match, inv_config)
 
 
 def index_inventory_resolution_metadata(es: Elasticsearch, inv_config: dict):
@@ -430,19 +561,24 @@ def index_inventory_resolution_metadata(es: Elasticsearch, inv_config: dict):
         'hebben ter Vergaderinge ingebraght',
         'hebben ter Vergaderinge voorgedragen'
     }
-    for resolution in rep_es.scroll_inventory_resolutions(es, inv_config):
-        if resolution.evidence[0].phrase.phrase_string in skip_formulas:
-            continue
-        new_resolution = add_resolution_metadata(resolution, proposition_searcher,
-                                                 template_searcher, variable_matcher)
-        if not new_resolution:
-            continue
-        print('indexing metadata for resolution', resolution.metadata['id'])
-        # print(new_resolution.metadata)
-        index_resolution_metadata(es, new_resolution, inv_config)
-
-
-def index_resolution_phrase_match(es: Elasticsearch, phrase_match: Union[dict, PhraseMatch], config: dict):
+    with make_bulk_indexer(es, inv_config) as bulk_es:
+        for resolution in monitor.iterate('retrieve', rep_es.scroll_inventory_resolutions(es, inv_config)):
+            monitor.count('resolutions')
+            if resolution.evidence[0].phrase.phrase_string in skip_formulas:
+                continue
+            with monitor.substage('add_metadata'):
+                new_resolution = add_resolution_metadata(resolution, proposition_searcher,
+                                                         template_searcher, variable_matcher)
+            if not new_resolution:
+                continue
+            print('indexing metadata for resolution', resolution.metadata['id'])
+            # print(new_resolution.metadata)
+            monitor.count('resolution_metadata')
+            with monitor.substage('index'):
+                index_resolution_metadata(bulk_es, new_resolution, inv_config)
+
+
+def index_resolution_phrase_match(es: Union[Elasticsearch, BulkIndexer], phrase_match: Union[dict, PhraseMatch], config: dict):
     # make sure match object is json dictionary
     match_json = phrase_match.json() if isinstance(phrase_match, PhraseMatch) else phrase_match
     # generate stable id based on match offset, end and text_id
@@ -493,14 +629,15 @@ def index_split_resolutions(es: Elasticsearch, split_resolutions: Dict[str, any]
             delete_resolution_phrase_match(es, remove_match, config)
         except ValueError:
             continue
-    for add_match in split_resolutions['add_matches']:
-        index_resolution_phrase_match(es, add_match, config)
-    for resolution in split_resolutions['resolutions']:
-        add_timestamp(resolution)
-        index_resolution(es, resolution, config)
+    with make_bulk_indexer(es, config) as bulk_es:
+        for add_match in split_resolutions['add_matches']:
+            index_resolution_phrase_match(bulk_es, add_match, config)
+        for resolution in split_resolutions['resolutions']:
+            add_timestamp(resolution)
+            index_resolution(bulk_es, resolution, config)
 
 
-def index_resolution_metadata(es: Elasticsearch, resolution: Resolution, config: dict):
+def index_resolution_metadata(es: Union[Elasticsearch, BulkIndexer], resolution: Resolution, config: dict):
     metadata_doc = {
         'metadata': resolution.metadata,
         'evidence': [pm.json() for pm in resolution.evidence]
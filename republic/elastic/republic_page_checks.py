@@ -1,7 +1,15 @@
-from typing import List
+from typing import Dict, List, Tuple, Union
+from collections import defaultdict
+import json
+import os
+import re
+import tempfile
+
+import numpy as np
 import republic.elastic.republic_retrieving as rep_es
 import republic.analyser.republic_inventory_analyser as inv_analyser
 from elasticsearch import Elasticsearch
+from republic.elastic.republic_bulk_indexing import make_bulk_indexer
 
 
 def score_levenshtein_distance(s1, s2):
@@ -299,6 +307,345 @@ def detect_duplicate_scans(es: Elasticsearch, config: dict):
     print("\nDone with year {}, inventory {}!".format(config["year"], config["inventory_num"]))
 
 
+################################################################
+# Sketch-based duplicate page detection
+#
+# Comparing neighbouring pages with Levenshtein distance requires retrieving each page
+# twice and only finds duplicates of the preceding scan. Instead, the text of each column
+# is reduced once to a MinHash signature over its character shingles. Small OCR variations
+# only change the few shingles around each variation, so duplicate scans keep a high
+# shingle overlap. Locality sensitive hashing (LSH) over bands of the page signatures
+# gives candidate pairs across the entire inventory, which are then verified by comparing
+# their column signatures.
+#
+################################################################
+
+default_sketch_config = {
+    'shingle_size': 4,
+    'num_perm': 128,
+    'num_bands': 32,
+    'min_shingles': 50,
+    'seed': 1,
+}
+
+
+def get_text_line_texts(doc: dict) -> List[str]:
+    """Return the texts of all lines of a column or text region in JSON format, in
+    document order. Both PageXML lines ('text') and hOCR lines ('line_text') are supported."""
+    texts = []
+    lines = doc.get('lines', [])
+    if isinstance(lines, str):
+        # hOCR lines are stored as JSON string in the page index
+        lines = json.loads(lines)
+    for line in lines:
+        text = line.get('text', line.get('line_text'))
+        if text:
+            texts.append(text)
+    for text_region in doc.get('text_regions', []):
+        texts += get_text_line_texts(text_region)
+    return texts
+
+
+def get_page_column_texts(page_doc: dict) -> List[str]:
+    """Return the text of each column of a page in JSON format."""
+    if 'columns' in page_doc and len(page_doc['columns']) > 0:
+        return ['\n'.join(get_text_line_texts(column)) for column in page_doc['columns']]
+    # pages without columns are treated as a single column
+    return ['\n'.join(get_text_line_texts(page_doc))]
+
+
+def get_page_id_num(page_doc: dict) -> Tuple[str, int]:
+    """Return the id and number of a page in PageXML or hOCR JSON format."""
+    if 'metadata' in page_doc and 'page_num' in page_doc['metadata']:
+        return page_doc['id'], page_doc['metadata']['page_num']
+    return page_doc['page_id'], page_doc['page_num']
+
+
+def make_shingle_hashes(text: str, shingle_size: int = default_sketch_config['shingle_size']) -> np.ndarray:
+    """Return the distinct 32-bit hashes of the character shingles of a text, ignoring
+    case and whitespace variation. The hashes are computed for all shingles at once, as
+    a polynomial over the code points of their characters followed by the MurmurHash3
+    finalizer, so they are stable across processes."""
+    text = re.sub(r'\s+', ' ', text.lower()).strip()
+    num_shingles = len(text) - shingle_size + 1
+    if num_shingles <= 0:
+        return np.zeros(0, dtype=np.uint32)
+    code_points = np.frombuffer(text.encode('utf-32-le'), dtype=np.uint32)
+    # uint32 arithmetic wraps around, i.e. is modulo 2**32
+    hashes = np.zeros(num_shingles, dtype=np.uint32)
+    for offset in range(shingle_size):
+        hashes *= np.uint32(0x01000193)
+        hashes ^= code_points[offset:offset + num_shingles]
+    hashes ^= hashes >> np.uint32(16)
+    hashes *= np.uint32(0x85ebca6b)
+    hashes ^= hashes >> np.uint32(13)
+    hashes *= np.uint32(0xc2b2ae35)
+    hashes ^= hashes >> np.uint32(16)
+    return np.unique(hashes)
+
+
+class MinHasher:
+
+    def __init__(self, num_perm: int = default_sketch_config['num_perm'],
+                 seed: int = default_sketch_config['seed']):
+        """Compute MinHash signatures of sets of shingle hashes, using num_perm random
+        hash functions with a fixed seed, so signatures are stable across processes
+        and can be stored and compared later. Each hash function
+        is a multiply-add modulo 2**32 with a random odd multiplier, followed by an
+        xor-shift to mix the high bits into the low bits. This keeps all arithmetic
+        in 32-bit integers, which is much faster than a modulo prime.
+
+        :param num_perm: the number of hash functions, i.e. the length of the signatures
+        :type num_perm: int
+        :param seed: the seed for generating the hash functions
+        :type seed: int
+        """
+        self.num_perm = num_perm
+        self.seed = seed
+        generator = np.random.RandomState(seed)
+        self.a = (generator.randint(0, 2**32, size=num_perm, dtype=np.uint64) | 1).astype(np.uint32)
+        self.b = generator.randint(0, 2**32, size=num_perm, dtype=np.uint64).astype(np.uint32)
+
+    def signature(self, shingle_hashes: np.ndarray) -> np.ndarray:
+        """Return the MinHash signature of a set of shingle hashes. The signature of an
+        empty set has the maximum hash value in each position."""
+        if len(shingle_hashes) == 0:
+            return np.full(self.num_perm, np.iinfo(np.uint32).max, dtype=np.uint32)
+        # uint32 multiplication and addition wrap around, i.e. are modulo 2**32
+        permuted = np.multiply.outer(shingle_hashes, self.a)
+        permuted += self.b
+        permuted ^= permuted >> np.uint32(15)
+        return permuted.min(axis=0)
+
+
+def estimate_jaccard(signature1: np.ndarray, signature2: np.ndarray) -> float:
+    """Estimate the Jaccard similarity of two shingle sets from their MinHash signatures."""
+    return float(np.mean(signature1 == signature2))
+
+
+class PageSketchIndex:
+
+    def __init__(self, shingle_size: int = default_sketch_config['shingle_size'],
+                 num_perm: int = default_sketch_config['num_perm'],
+                 num_bands: int = default_sketch_config['num_bands'],
+                 min_shingles: int = default_sketch_config['min_shingles'],
+                 seed: int = default_sketch_config['seed']):
+        """An index of MinHash sketches of pages, with an LSH table over bands of the
+        page signatures to find pairs of similar pages without comparing all pairs.
+
+        A page signature is the element-wise minimum of its column signatures, which
+        is the signature of the union of the column shingles. Pages with fewer than
+        min_shingles shingles (e.g. empty and title pages) are sketched but not indexed,
+        as they are trivially similar to each other.
+
+        :param shingle_size: the number of characters per shingle
+        :type shingle_size: int
+        :param num_perm: the length of the MinHash signatures
+        :type num_perm: int
+        :param num_bands: the number of LSH bands, must divide num_perm
+        :type num_bands: int
+        :param min_shingles: the minimum number of shingles for a page to be indexed
+        :type min_shingles: int
+        :param seed: the seed for generating the MinHash functions
+        :type seed: int
+        """
+        if num_perm % num_bands != 0:
+            raise ValueError(f"num_bands ({num_bands}) must divide num_perm ({num_perm})")
+        self.shingle_size = shingle_size
+        self.num_bands = num_bands
+        self.band_size = num_perm // num_bands
+        self.min_shingles = min_shingles
+        self.minhasher = MinHasher(num_perm=num_perm, seed=seed)
+        self.page_num: Dict[str, int] = {}
+        self.column_signatures: Dict[str, List[np.ndarray]] = {}
+        self.page_signature: Dict[str, np.ndarray] = {}
+        self.num_shingles: Dict[str, int] = {}
+        self.bands: List[Dict[bytes, List[str]]] = [defaultdict(list) for _ in range(num_bands)]
+
+    def __len__(self):
+        return len(self.page_signature)
+
+    def __contains__(self, page_id: str):
+        return page_id in self.page_signature
+
+    def add_page_doc(self, page_doc: dict) -> None:
+        """Add a page in PageXML or hOCR JSON format to the index."""
+        page_id, page_num = get_page_id_num(page_doc)
+        self.add_page(page_id, page_num, get_page_column_texts(page_doc))
+
+    def add_page(self, page_id: str, page_num: int, column_texts: List[str]) -> None:
+        """Compute the sketch of a page from the texts of its columns and add it to the index."""
+        column_hashes = [make_shingle_hashes(text, self.shingle_size) for text in column_texts]
+        num_shingles = len(np.unique(np.concatenate(column_hashes))) if len(column_hashes) > 0 else 0
+        signatures = [self.minhasher.signature(shingle_hashes) for shingle_hashes in column_hashes]
+        self.add_sketch(page_id, page_num, signatures, num_shingles)
+
+    def add_sketch(self, page_id: str, page_num: int, column_signatures: List[np.ndarray],
+                   num_shingles: int) -> None:
+        """Add a previously computed page sketch to the index."""
+        if page_id in self.page_signature:
+            raise KeyError(f"page {page_id} is already in the sketch index")
+        self.page_num[page_id] = page_num
+        self.column_signatures[page_id] = column_signatures
+        self.page_signature[page_id] = np.minimum.reduce(column_signatures)
+        self.num_shingles[page_id] = num_shingles
+        if num_shingles < self.min_shingles:
+            return None
+        for band_index, band in enumerate(self.bands):
+            start = band_index * self.band_size
+            band[self.page_signature[page_id][start:start + self.band_size].tobytes()].append(page_id)
+
+    def candidate_pairs(self) -> List[Tuple[str, str]]:
+        """Return all pairs of pages that share at least one LSH band, ordered by page number."""
+        pairs = set()
+        for band in self.bands:
+            for page_ids in band.values():
+                if len(page_ids) < 2:
+                    continue
+                page_ids = sorted(page_ids, key=lambda page_id: self.page_num[page_id])
+                for i, page_id1 in enumerate(page_ids):
+                    for page_id2 in page_ids[i + 1:]:
+                        pairs.add((page_id1, page_id2))
+        return sorted(pairs, key=lambda pair: (self.page_num[pair[0]], self.page_num[pair[1]]))
+
+    def page_similarity(self, page_id1: str, page_id2: str) -> float:
+        """Estimate the similarity of two pages as the average Jaccard similarity of their
+        columns. If the pages have a different number of columns, the similarity of the
+        whole pages is used."""
+        columns1 = self.column_signatures[page_id1]
+        columns2 = self.column_signatures[page_id2]
+        if len(columns1) != len(columns2):
+            return estimate_jaccard(self.page_signature[page_id1], self.page_signature[page_id2])
+        return sum(estimate_jaccard(sig1, sig2) for sig1, sig2 in zip(columns1, columns2)) / len(columns1)
+
+    def find_duplicates(self, similarity_threshold: float = 0.5) -> Dict[str, Dict[str, Union[str, float]]]:
+        """Return per duplicate page the most similar earlier page and their similarity.
+
+        :param similarity_threshold: the minimum estimated similarity of duplicate pages
+        :type similarity_threshold: float
+        :return: a dictionary with per duplicate page id the id of the page it duplicates
+            ('is_duplicate_of') and the estimated similarity ('duplicate_similarity')
+        :rtype: Dict[str, Dict[str, Union[str, float]]]
+        """
+        duplicates = {}
+        for page_id1, page_id2 in self.candidate_pairs():
+            similarity = self.page_similarity(page_id1, page_id2)
+            if similarity < similarity_threshold:
+                continue
+            if page_id2 in duplicates and duplicates[page_id2]['duplicate_similarity'] >= similarity:
+                continue
+            duplicates[page_id2] = {'is_duplicate_of': page_id1, 'duplicate_similarity': similarity}
+        return duplicates
+
+    def save(self, sketch_file: str) -> None:
+        """Write the page sketches to a JSON lines file, so they don't have to be computed again."""
+        # a unique temporary file, as several processes can save to the same file
+        fd, temp_file = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(sketch_file)), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wt') as fh:
+                config = {'shingle_size': self.shingle_size, 'num_perm': self.minhasher.num_perm,
+                          'seed': self.minhasher.seed}
+                fh.write(json.dumps({'sketch_config': config}) + '\n')
+                for page_id in self.page_signature:
+                    entry = {
+                        'page_id': page_id,
+                        'page_num': self.page_num[page_id],
+                        'num_shingles': self.num_shingles[page_id],
+                        'column_signatures': [signature.tolist()
+                                              for signature in self.column_signatures[page_id]]
+                    }
+                    fh.write(json.dumps(entry) + '\n')
+            os.replace(temp_file, sketch_file)
+        except BaseException:
+            if os.path.exists(temp_file):
+                os.remove(temp_file)
+            raise
+
+    def load(self, sketch_file: str) -> int:
+        """Add the page sketches of a JSON lines file written by save to the index.
+        Returns the number of loaded sketches.
+
+        :param sketch_file: the file to read the page sketches from
+        :type sketch_file: str
+        :return: the number of loaded sketches
+        :rtype: int
+        """
+        num_loaded = 0
+        with open(sketch_file, 'rt') as fh:
+            config = json.loads(next(fh))['sketch_config']
+            if config != {'shingle_size': self.shingle_size, 'num_perm': self.minhasher.num_perm,
+                          'seed': self.minhasher.seed}:
+                raise ValueError(f"sketches in {sketch_file} were made with a different config: {config}")
+            for line in fh:
+                entry = json.loads(line)
+                signatures = [np.array(signature, dtype=np.uint32) for signature in entry['column_signatures']]
+                self.add_sketch(entry['page_id'], entry['page_num'], signatures, entry['num_shingles'])
+                num_loaded += 1
+        return num_loaded
+
+
+def make_inventory_page_sketch_index(es: Elasticsearch, config: dict, sketch_file: Union[None, str] = None,
+                                     sketch_config: Union[None, dict] = None) -> PageSketchIndex:
+    """Return a sketch index of all pages of an inventory. If sketch_file exists, the
+    stored sketches are loaded instead of retrieving the pages. Otherwise, the pages
+    are retrieved in a single scroll pass and, if sketch_file is given, the computed
+    sketches are stored in it."""
+    sketch_config = {**default_sketch_config, **(sketch_config if sketch_config else {})}
+    sketch_index = PageSketchIndex(**sketch_config)
+    if sketch_file and os.path.isfile(sketch_file):
+        sketch_index.load(sketch_file)
+        return sketch_index
+    query = {'query': {'match': {'metadata.inventory_num': config['inventory_num']}}}
+    for hit in rep_es.scroll_hits(es, query, index=config['page_index'], size=None, scroll='10m'):
+        sketch_index.add_page_doc(hit['_source'])
+    if sketch_file:
+        sketch_index.save(sketch_file)
+    return sketch_index
+
+
+def detect_duplicate_scans_by_sketch(es: Elasticsearch, config: dict, sketch_file: Union[None, str] = None,
+                                     similarity_threshold: float = 0.5,
+                                     sketch_config: Union[None, dict] = None,
+                                     update_pages: bool = True) -> Dict[str, Dict[str, Union[str, float]]]:
+    """Detect duplicate and near-duplicate scans across an entire inventory using MinHash
+    sketches of the page columns, and update the is_duplicate fields of all pages of the
+    inventory with bulk requests.
+
+    :param es: the elasticsearch instance with the page index
+    :type es: Elasticsearch
+    :param config: the inventory config
+    :type config: dict
+    :param sketch_file: an optional file to load stored sketches from or store computed sketches in
+    :type sketch_file: Union[None, str]
+    :param similarity_threshold: the minimum estimated similarity of duplicate pages
+    :type similarity_threshold: float
+    :param sketch_config: optional settings to override the default sketch config
+    :type sketch_config: Union[None, dict]
+    :param update_pages: whether to update the duplicate fields of the pages in the page index
+    :type update_pages: bool
+    :return: a dictionary with per duplicate page id the page it duplicates and their similarity
+    :rtype: Dict[str, Dict[str, Union[str, float]]]
+    """
+    sketch_index = make_inventory_page_sketch_index(es, config, sketch_file=sketch_file,
+                                                    sketch_config=sketch_config)
+    duplicates = sketch_index.find_duplicates(similarity_threshold=similarity_threshold)
+    for page_id, duplicate in duplicates.items():
+        print("Page {} is duplicate of page {} (similarity {:.2f})".format(page_id, duplicate['is_duplicate_of'],
+                                                                           duplicate['duplicate_similarity']))
+    if update_pages:
+        with make_bulk_indexer(es, config) as bulk_es:
+            for page_id in sketch_index.page_signature:
+                # also reset the duplicate of pages that were marked as duplicate in an earlier run
+                doc = {
+                    'is_duplicate': page_id in duplicates,
+                    'is_duplicate_of': duplicates[page_id]['is_duplicate_of'] if page_id in duplicates else None
+                }
+                bulk_es.update(index=config['page_index'], id=page_id, body={'doc': doc})
+    print("\nDone with inventory {}, {} duplicates in {} pages!".format(config['inventory_num'], len(duplicates),
+                                                                        len(sketch_index)))
+    return duplicates
+
+
 ########################################################################
 #
 # **Problem 3**: Page numbers of numbered pages are reset per part, starting from page 1,
@@ -2,12 +2,14 @@ from typing import Union, List, Dict, Generator
 from elasticsearch import Elasticsearch
 import json
 import copy
+import queue
+import threading
 from collections import defaultdict
 
 from fuzzy_search.fuzzy_match import PhraseMatch
 
 from settings import text_repo_url
-from republic.download.text_repo import TextRepo
+from republic.download.text_repo import TextRepo, make_text_repo
 from republic.helper.metadata_helper import get_scan_id, get_per_page_type_index
 from republic.model.republic_session import Session, session_from_json
 from republic.model.republic_date import RepublicDate
@@ -18,26 +20,148 @@ from republic.model.republic_document_model import json_to_republic_session
 import republic.parser.pagexml.republic_pagexml_parser as pagexml_parser
 
 
-def scroll_hits(es: Elasticsearch, query: dict, index: str, doc_type: str = '_doc',
-                size: int = 100, scroll: str = '2m') -> iter:
-    response = es.search(index=index, doc_type=doc_type, scroll=scroll, size=size, body=query)
+default_scroll_config = {
+    'max_batch_bytes': 20 * 1024 * 1024,
+    'max_size': 10000,
+}
+
+
+def estimate_scroll_size(es: Elasticsearch, query: dict, index: str, doc_type: str = '_doc',
+                         max_batch_bytes: int = default_scroll_config['max_batch_bytes'],
+                         max_size: int = default_scroll_config['max_size'],
+                         sample_size: int = 10, **search_kwargs) -> int:
+    """Estimate the number of hits per scroll request such that each response
+    contains roughly max_batch_bytes of document source, based on the average
+    size of a small sample of the hits."""
+    sample_query = copy.deepcopy(query)
+    sample_query['size'] = sample_size
+    response = es.search(index=index, doc_type=doc_type, body=sample_query, **search_kwargs)
+    hits = response['hits']['hits']
+    if len(hits) == 0:
+        return max_size
+    doc_bytes = sum(len(json.dumps(hit['_source'])) for hit in hits) / len(hits)
+    return max(1, min(max_size, int(max_batch_bytes // max(doc_bytes, 1))))
+
+
+def _scroll_slice_hits(es: Elasticsearch, query: dict, index: str, doc_type: str,
+                       size: int, scroll: str, **search_kwargs) -> iter:
+    response = es.search(index=index, doc_type=doc_type, scroll=scroll, size=size, body=query, **search_kwargs)
     sid = response['_scroll_id']
     scroll_size = response['hits']['total']
-    print('total hits:', scroll_size, "\thits per scroll:", len(response['hits']['hits']))
     if type(scroll_size) == dict:
         scroll_size = scroll_size['value']
-    # Start scrolling
-    while scroll_size > 0:
-        for hit in response['hits']['hits']:
-            yield hit
-        response = es.scroll(scroll_id=sid, scroll=scroll)
-        # Update the scroll ID
-        sid = response['_scroll_id']
-        # Get the number of results that we returned in the last scroll
-        scroll_size = len(response['hits']['hits'])
-        # Do something with the obtained page
-    # remove scroll context
-    es.clear_scroll(scroll_id=sid)
+    print('total hits:', scroll_size, "\thits per scroll:", len(response['hits']['hits']))
+    try:
+        # Start scrolling
+        while len(response['hits']['hits']) > 0:
+            for hit in response['hits']['hits']:
+                yield hit
+            response = es.scroll(scroll_id=sid, scroll=scroll)
+            # Update the scroll ID
+            sid = response['_scroll_id']
+    finally:
+        # remove scroll context, also when the consumer stops early
+        es.clear_scroll(scroll_id=sid)
+
+
+def _scroll_sliced_hits(es: Elasticsearch, query: dict, index: str, doc_type: str,
+                        size: int, scroll: str, num_slices: int, **search_kwargs) -> iter:
+    # bound the number of hits waiting in memory to one batch per slice
+    hit_queue = queue.Queue(maxsize=size * num_slices)
+    stop = threading.Event()
+
+    def put(item):
+        while not stop.is_set():
+            try:
+                hit_queue.put(item, timeout=0.1)
+                return None
+            except queue.Full:
+                continue
+
+    def scroll_slice(slice_id: int):
+        slice_query = copy.deepcopy(query)
+        slice_query['slice'] = {'id': slice_id, 'max': num_slices}
+        slice_hits = _scroll_slice_hits(es, slice_query, index, doc_type, size, scroll, **search_kwargs)
+        try:
+            for hit in slice_hits:
+                if stop.is_set():
+                    break
+                put(('hit', hit))
+        except Exception as err:
+            put(('error', err))
+        finally:
+            slice_hits.close()
+            put(('done', None))
+
+    threads = [threading.Thread(target=scroll_slice, args=(slice_id,), daemon=True)
+               for slice_id in range(num_slices)]
+    for thread in threads:
+        thread.start()
+    try:
+        num_done = 0
+        while num_done < num_slices:
+            item_type, item = hit_queue.get()
+            if item_type == 'hit':
+                yield item
+            elif item_type == 'error':
+                raise item
+            else:
+                num_done += 1
+    finally:
+        stop.set()
+        for thread in threads:
+            thread.join()
+
+
+def scroll_hits(es: Elasticsearch, query: dict, index: str, doc_type: str = '_doc',
+                size: Union[None, int] = 100, scroll: str = '2m', num_slices: int = 1,
+                source_includes: Union[None, List[str]] = None,
+                source_excludes: Union[None, List[str]] = None,
+                max_batch_bytes: int = default_scroll_config['max_batch_bytes']) -> iter:
+    """Scroll through all hits for a query and yield them one by one. The scroll
+    context is cleared when all hits are consumed or the generator is closed.
+
+    :param es: the elasticsearch instance to retrieve hits from
+    :type es: Elasticsearch
+    :param query: the query to scroll through
+    :type query: dict
+    :param index: the index to scroll through
+    :type index: str
+    :param doc_type: the document type
+    :type doc_type: str
+    :param size: the number of hits per scroll request. If None, the size is estimated
+        from the average document size so that each response contains about max_batch_bytes
+    :type size: Union[None, int]
+    :param scroll: how long to keep the scroll context alive between requests
+    :type scroll: str
+    :param num_slices: the number of slices to scroll through concurrently. With more
+        than one slice, hits are yielded in the order they are received, not in index order
+    :type num_slices: int
+    :param source_includes: the document source fields to return
+    :type source_includes: Union[None, List[str]]
+    :param source_excludes: the document source fields to leave out
+    :type source_excludes: Union[None, List[str]]
+    :param max_batch_bytes: the target response size in bytes when estimating the size
+    :type max_batch_bytes: int
+    :return: a generator of hits
+    :rtype: iter
+    """
+    query = copy.deepcopy(query)
+    # the scroll size is passed as parameter
+    if 'size' in query:
+        del query['size']
+    search_kwargs = {}
+    if source_includes:
+        search_kwargs['_source_includes'] = source_includes
+    if source_excludes:
+        search_kwargs['_source_excludes'] = source_excludes
+    if size is None:
+        size = estimate_scroll_size(es, query, index, doc_type=doc_type,
+                                    max_batch_bytes=max_batch_bytes, **search_kwargs)
+    if num_slices > 1:
+        return _scroll_sliced_hits(es, query, index, doc_type, size, scroll, num_slices, **search_kwargs)
+    else:
+        return _scroll_slice_hits(es, query, index, doc_type, size, scroll, **search_kwargs)
 
 
 def create_es_scan_doc(scan_doc: dict) -> dict:
@@ -192,6 +316,20 @@ def retrieve_inventory_metadata(es: Elasticsearch, inventory_num: int, config):
     return response['_source']
 
 
+def retrieve_inventory_max_index_timestamp(es: Elasticsearch, inventory_num: int,
+                                           index: str) -> Union[None, int]:
+    """Return the latest index timestamp of the documents of an inventory in index, in
+    milliseconds since the epoch, or None if the inventory has no documents with a timestamp."""
+    query = {
+        'query': {'match': {'metadata.inventory_num': inventory_num}},
+        'size': 0,
+        'aggs': {'max_index_timestamp': {'max': {'field': 'metadata.index_timestamp'}}}
+    }
+    response = es.search(index=index, body=query)
+    value = response['aggregations']['max_index_timestamp']['value']
+    return None if value is None else int(value)
+
+
 def retrieve_inventory_hocr_scans(es: Elasticsearch, inventory_num: int, config: dict) -> list:
     query = {'query': {'match': {'metadata.inventory_num': inventory_num}}, 'size': 10000}
     response = es.search(index=config['scan_index'], body=query)
@@ -231,18 +369,33 @@ def retrieve_scans_by_query(es: Elasticsearch, query: dict, config) -> List[Page
 
 def retrieve_scans_pagexml_from_text_repo_by_inventory(es_text: Elasticsearch,
                                                        inventory_num: int , config: Dict[str, any]):
-    text_repo = TextRepo(text_repo_url)
     query = make_text_repo_inventory_query(inventory_num)
-    for hi, hit in enumerate(scroll_hits(es_text, query, index='file', size=2)):
-        doc = hit['_source']
-        versions = get_tesseract_versions(doc)
-        if len(versions) == 0:
-            continue
-            # raise ValueError(f"Document has no versions: {doc['doc']['externalId']}")
-        version = select_latest_tesseract_version(versions)
-        pagexml = text_repo.get_content_by_version_id(version['id'])
+    batch_size = config.get('text_repo', {}).get('batch_size', 100)
+    batch = []
+    with make_text_repo(text_repo_url, config) as text_repo:
+        for hi, hit in enumerate(scroll_hits(es_text, query, index='file', size=None,
+                                             num_slices=config.get('scroll_slices', 1))):
+            doc = hit['_source']
+            versions = get_tesseract_versions(doc)
+            if len(versions) == 0:
+                continue
+                # raise ValueError(f"Document has no versions: {doc['doc']['externalId']}")
+            version = select_latest_tesseract_version(versions)
+            batch.append((doc, version))
+            if len(batch) >= batch_size:
+                yield from parse_text_repo_versions(text_repo, batch, config)
+                batch = []
+        if len(batch) > 0:
+            yield from parse_text_repo_versions(text_repo, batch, config)
+
+
+def parse_text_repo_versions(text_repo: TextRepo, batch: List[tuple], config: Dict[str, any]):
+    """Fetch the PageXML contents of a batch of (text repo document, version) pairs
+    concurrently and parse them into scan docs."""
+    contents = text_repo.get_contents_by_version_ids([version['id'] for doc, version in batch])
+    for doc, version in batch:
         filename = f"{doc['doc']['externalId']}.xml"
-        scan_doc = pagexml_parser.get_scan_pagexml(filename, config, pagexml_data=pagexml)
+        scan_doc = pagexml_parser.get_scan_pagexml(filename, config, pagexml_data=contents[version['id']])
         scan_doc.metadata['textrepo_version'] = version
         yield scan_doc
 
@@ -374,7 +527,7 @@ def retrieve_paragraphs_by_inventory(es: Elasticsearch, inventory_num: int, conf
 def retrieve_inventory_sessions_with_lines(es: Elasticsearch, inv_num: int,
                                            config: dict) -> Generator[Session, None, None]:
     query = make_inventory_query(inventory_num=inv_num, size=1000)
-    for hit in scroll_hits(es, query, config['session_lines_index'], size=2, scroll='10m'):
+    for hit in scroll_hits(es, query, config['session_lines_index'], size=None, scroll='10m'):
         session = json_to_republic_session(hit['_source'])
         yield session
 
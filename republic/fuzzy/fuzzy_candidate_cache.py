@@ -0,0 +1,257 @@
+from typing import Dict, Iterator, Tuple, Union
+from collections import OrderedDict, defaultdict
+import json
+import os
+import sys
+import tempfile
+
+
+default_cache_config = {
+    'max_entries': 100000,
+    'max_bytes': 100 * 1024 * 1024,
+    'policy': 'lru',
+}
+
+
+def estimate_entry_size(match_string: str, match_term: str, info: Dict[str, Union[str, float]]) -> int:
+    """Return a rough estimate of the number of bytes used by a cache entry, including
+    the key tuple, the info dictionary and its values."""
+    size = sys.getsizeof(match_string) + sys.getsizeof(match_term) + sys.getsizeof(info)
+    size += sum(sys.getsizeof(value) for value in info.values())
+    # key tuple and the bookkeeping of the ordered dict
+    return size + 150
+
+
+class KnownCandidateCache:
+
+    def __init__(self, max_entries: Union[None, int] = default_cache_config['max_entries'],
+                 max_bytes: Union[None, int] = default_cache_config['max_bytes'],
+                 policy: str = default_cache_config['policy']):
+        """A bounded cache of the status and scores of previously seen combinations
+        of match string and match term. When the cache exceeds max_entries entries or
+        an estimated max_bytes bytes, entries are evicted, either the least recently
+        used (policy 'lru') or the least frequently used (policy 'lfu').
+
+        :param max_entries: the maximum number of entries in the cache, or None for no limit
+        :type max_entries: Union[None, int]
+        :param max_bytes: the maximum estimated size in bytes of the cache, or None for no limit
+        :type max_bytes: Union[None, int]
+        :param policy: the eviction policy, either 'lru' or 'lfu'
+        :type policy: str
+        """
+        if policy not in ['lru', 'lfu']:
+            raise ValueError(f"unknown cache policy {policy}, must be 'lru' or 'lfu'")
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.policy = policy
+        self.entries: Dict[Tuple[str, str], Dict[str, Union[str, float]]] = {}
+        self.entry_size: Dict[Tuple[str, str], int] = {}
+        self.num_bytes = 0
+        # LRU: a single ordered dict from least to most recently used
+        self.recency: OrderedDict = OrderedDict()
+        # LFU: per frequency an ordered dict from least to most recently used
+        self.frequency: Dict[Tuple[str, str], int] = {}
+        self.frequency_keys: Dict[int, OrderedDict] = defaultdict(OrderedDict)
+        self.min_frequency = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, key: Tuple[str, str]):
+        return key in self.entries
+
+    def __iter__(self) -> Iterator[Tuple[str, str]]:
+        return iter(list(self.entries.keys()))
+
+    def __repr__(self):
+        return f"KnownCandidateCache(policy={self.policy}, entries={len(self)}, bytes={self.num_bytes}, " \
+               f"hits={self.hits}, misses={self.misses}, evictions={self.evictions})"
+
+    def stats(self) -> Dict[str, Union[int, float]]:
+        """Return the counters and size of the cache."""
+        lookups = self.hits + self.misses
+        return {
+            'entries': len(self.entries),
+            'bytes': self.num_bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_ratio': self.hits / lookups if lookups > 0 else 0.0,
+        }
+
+    def _touch(self, key: Tuple[str, str]) -> None:
+        if self.policy == 'lru':
+            self.recency.move_to_end(key)
+        else:
+            freq = self.frequency[key]
+            del self.frequency_keys[freq][key]
+            if len(self.frequency_keys[freq]) == 0:
+                del self.frequency_keys[freq]
+                if self.min_frequency == freq:
+                    self.min_frequency = freq + 1
+            self.frequency[key] = freq + 1
+            self.frequency_keys[freq + 1][key] = None
+
+    def _set_frequency(self, key: Tuple[str, str], freq: int) -> None:
+        old_freq = self.frequency[key]
+        del self.frequency_keys[old_freq][key]
+        if len(self.frequency_keys[old_freq]) == 0:
+            del self.frequency_keys[old_freq]
+        self.frequency[key] = freq
+        self.frequency_keys[freq][key] = None
+
+    def _remove(self, key: Tuple[str, str]) -> None:
+        del self.entries[key]
+        self.num_bytes -= self.entry_size.pop(key)
+        if self.policy == 'lru':
+            del self.recency[key]
+        else:
+            freq = self.frequency.pop(key)
+            del self.frequency_keys[freq][key]
+            if len(self.frequency_keys[freq]) == 0:
+                del self.frequency_keys[freq]
+
+    def _evict(self, keep: Tuple[str, str]) -> None:
+        if self.policy == 'lru':
+            key = next(iter(self.recency))
+        else:
+            if self.min_frequency not in self.frequency_keys:
+                self.min_frequency = min(self.frequency_keys.keys())
+            key = next(iter(self.frequency_keys[self.min_frequency]))
+            if key == keep:
+                # never evict the entry that was just added
+                key = next(key for freq in sorted(self.frequency_keys)
+                           for key in self.frequency_keys[freq] if key != keep)
+        self._remove(key)
+        self.evictions += 1
+
+    def _is_full(self) -> bool:
+        if self.max_entries is not None and len(self.entries) > self.max_entries:
+            return True
+        if self.max_bytes is not None and self.num_bytes > self.max_bytes:
+            return True
+        return False
+
+    def get(self, key: Tuple[str, str]) -> Union[None, Dict[str, Union[str, float]]]:
+        """Return the info of a (match_string, match_term) key, or None if the key is not in
+        the cache. Lookups are counted as hits or misses."""
+        if key not in self.entries:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._touch(key)
+        return self.entries[key]
+
+    def peek(self, key: Tuple[str, str]) -> Union[None, Dict[str, Union[str, float]]]:
+        """Return the info of a (match_string, match_term) key, or None if the key is not in
+        the cache, without counting the lookup or affecting its recency or frequency."""
+        return self.entries.get(key)
+
+    def update_status(self, key: Tuple[str, str], status: str) -> None:
+        """Change the status of a (match_string, match_term) key that is in the cache,
+        updating its recency or frequency and the size estimate of the cache."""
+        if key not in self.entries:
+            raise KeyError(f"unknown candidate {key}")
+        info = self.entries[key]
+        info['status'] = status
+        self.num_bytes -= self.entry_size[key]
+        self.entry_size[key] = estimate_entry_size(key[0], key[1], info)
+        self.num_bytes += self.entry_size[key]
+        self._touch(key)
+
+    def set(self, key: Tuple[str, str], info: Dict[str, Union[str, float]]) -> None:
+        """Add or replace the info of a (match_string, match_term) key, evicting other
+        entries if the cache is full."""
+        if key in self.entries:
+            self.num_bytes -= self.entry_size[key]
+            self._touch(key)
+        elif self.policy == 'lru':
+            self.recency[key] = None
+        else:
+            self.frequency[key] = 1
+            self.frequency_keys[1][key] = None
+            self.min_frequency = 1
+        self.entries[key] = info
+        self.entry_size[key] = estimate_entry_size(key[0], key[1], info)
+        self.num_bytes += self.entry_size[key]
+        while self._is_full() and len(self.entries) > 1:
+            self._evict(key)
+
+    def items(self) -> Iterator[Tuple[Tuple[str, str], Dict[str, Union[str, float]]]]:
+        """Iterate over all entries without affecting their recency or frequency."""
+        for key, info in list(self.entries.items()):
+            yield key, info
+
+    def clear(self) -> None:
+        """Remove all entries. The counters are kept."""
+        self.entries = {}
+        self.entry_size = {}
+        self.num_bytes = 0
+        self.recency = OrderedDict()
+        self.frequency = {}
+        self.frequency_keys = defaultdict(OrderedDict)
+        self.min_frequency = 0
+
+    def save(self, cache_file: str) -> None:
+        """Write the cache entries to a JSON lines file, from least to most recently
+        or frequently used, so that loading the file restores the eviction order.
+
+        :param cache_file: the file to write the cache entries to
+        :type cache_file: str
+        """
+        if self.policy == 'lru':
+            keys = list(self.recency.keys())
+        else:
+            keys = [key for freq in sorted(self.frequency_keys) for key in self.frequency_keys[freq]]
+        # a unique temporary file, as several processes can save to the same file
+        fd, temp_file = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(cache_file)), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wt') as fh:
+                for key in keys:
+                    entry = {'match_string': key[0], 'match_term': key[1], 'info': self.entries[key]}
+                    if self.policy == 'lfu':
+                        entry['frequency'] = self.frequency[key]
+                    fh.write(json.dumps(entry) + '\n')
+            # replace the old cache file only when the new one is complete
+            os.replace(temp_file, cache_file)
+        except BaseException:
+            if os.path.exists(temp_file):
+                os.remove(temp_file)
+            raise
+
+    def load(self, cache_file: str) -> int:
+        """Warm-load the cache with the entries of a JSON lines file written by save.
+        Returns the number of loaded entries.
+
+        :param cache_file: the file to read the cache entries from
+        :type cache_file: str
+        :return: the number of loaded entries
+        :rtype: int
+        """
+        num_loaded = 0
+        with open(cache_file, 'rt') as fh:
+            for line in fh:
+                entry = json.loads(line)
+                key = (entry['match_string'], entry['match_term'])
+                self.set(key, entry['info'])
+                if self.policy == 'lfu' and entry.get('frequency', 1) > 1 and key in self.entries:
+                    self._set_frequency(key, entry['frequency'])
+                num_loaded += 1
+        return num_loaded
+
+
+def make_known_candidate_cache(config: Union[None, dict] = None) -> KnownCandidateCache:
+    """Return a known candidate cache using the 'known_candidates_*' settings of a searcher
+    config, and warm-load it from 'known_candidates_file' if that file exists."""
+    cache_config = {key: value for key, value in default_cache_config.items()}
+    if config:
+        for key in default_cache_config:
+            if f'known_candidates_{key}' in config:
+                cache_config[key] = config[f'known_candidates_{key}']
+    cache = KnownCandidateCache(**cache_config)
+    if config and config.get('known_candidates_file') and os.path.isfile(config['known_candidates_file']):
+        cache.load(config['known_candidates_file'])
+    return cache
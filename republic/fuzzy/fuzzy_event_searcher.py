@@ -1,5 +1,5 @@
-from typing import Dict, List, Union
-from collections import defaultdict
+from typing import Deque, Dict, List, Union
+from collections import defaultdict, deque
 
 from fuzzy_search.fuzzy_phrase_model import PhraseModel
 from fuzzy_search.fuzzy_phrase_searcher import FuzzyPhraseSearcher, PhraseMatch
@@ -13,7 +13,7 @@ class EventSearcher:
     def __init__(self, window_size: int = 10):
         self.window_size = window_size
         # Initialize the sliding window with None elements, so first documents are appended at the end.
-        self.sliding_window: List[Union[None, Dict[str, any]]] = [None] * self.window_size
+        self.sliding_window: Deque[Union[None, Dict[str, any]]] = deque([None] * self.window_size)
         self.phrases = {}
         self.variants = {}
         self.labels = {}
@@ -31,7 +31,12 @@ class EventSearcher:
             for line_index in range(0, first_lines):
                 self.sliding_window[line_index] = None
         else:
-            self.sliding_window: List[Union[None, Dict[str, Union[str, int, list]]]] = [None] * self.window_size
+            self.sliding_window: Deque[Union[None, Dict[str, Union[str, int, list]]]] = deque([None] * self.window_size)
+
+    def trim_sliding_window(self, max_size: int) -> None:
+        """Remove the earliest documents until the sliding window has at most max_size documents."""
+        while len(self.sliding_window) > max_size:
+            self.sliding_window.popleft()
 
     def add_searcher(self, searcher_config: dict, searcher_name: str,
                      phrase_model: PhraseModel):
@@ -105,9 +110,8 @@ class EventSearcher:
     def add_empty_document(self):
         """Append an empty placeholder document to the sliding window."""
         # if the window is too long, remove earliest docs to make room for the new doc
-        if len(self.sliding_window) >= self.window_size:
-            self.sliding_window = self.sliding_window[-self.window_size:]
-        self.sliding_window += [None]
+        self.trim_sliding_window(self.window_size)
+        self.sliding_window.append(None)
 
     def add_document(self, doc_id: Union[str, int], doc_text: str, text_object: any = None):
         """Add a text with identifier to the sliding window and run registered fuzzy searchers."""
@@ -120,10 +124,9 @@ class EventSearcher:
             # add the matches to the document
             doc['matches'] += self.search_document(doc, searcher_name)
         # add the document to the sliding window,
-        self.sliding_window += [doc]
+        self.sliding_window.append(doc)
         # if the window is too long, remove earliest docs to make room for the new doc
-        if len(self.sliding_window) >= self.window_size:
-            self.sliding_window = self.sliding_window[-self.window_size:]
+        self.trim_sliding_window(self.window_size)
 
     def set_keyword_match_offsets(self, keyword_offsets: List[Dict[str, Union[str, int]]]):
         """Add a minimum and/or maximum document text offset threshold for a list keywords.
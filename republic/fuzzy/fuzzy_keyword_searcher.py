@@ -3,6 +3,7 @@ import re
 from collections import defaultdict, Counter
 from republic.fuzzy.fuzzy_keyword import Keyword, text2skipgrams
 from republic.fuzzy.fuzzy_phrase_model import PhraseModel
+from republic.fuzzy.fuzzy_candidate_cache import KnownCandidateCache, make_known_candidate_cache
 
 
 #################################
@@ -93,6 +94,98 @@ def score_char_overlap(term1: str, term2: str) -> int:
     return num_char_matches
 
 
+###########################
+# Scoring backend classes #
+###########################
+
+try:
+    # optional compiled Levenshtein implementation
+    from rapidfuzz.distance import Levenshtein as compiled_levenshtein
+except ImportError:
+    compiled_levenshtein = None
+
+
+class ScoringBackend(object):
+
+    name = "python"
+
+    def __init__(self):
+        """The default scoring backend that uses the pure Python scoring functions above.
+        Other backends can override the score_* methods with faster implementations,
+        as long as they return the same scores."""
+        pass
+
+    def score_char_overlap(self, term1: str, term2: str) -> int:
+        return score_char_overlap(term1, term2)
+
+    def score_ngram_overlap(self, term1: str, term2: str, ngram_size: int) -> int:
+        return score_ngram_overlap(term1, term2, ngram_size)
+
+    def score_levenshtein_distance(self, s1: str, s2: str, use_confuse: bool = False) -> Union[int, float]:
+        return score_levenshtein_distance(s1, s2, use_confuse=use_confuse)
+
+    def score_char_overlap_ratio(self, term1: str, term2: str) -> float:
+        return self.score_char_overlap(term1, term2) / len(term1)
+
+    def score_ngram_overlap_ratio(self, term1: str, term2: str, ngram_size: int) -> float:
+        max_overlap = len(make_ngrams(term1, ngram_size))
+        return self.score_ngram_overlap(term1, term2, ngram_size) / max_overlap
+
+    def score_levenshtein_distance_ratio(self, term1: str, term2: str) -> float:
+        max_distance = max(len(term1), len(term2))
+        return 1 - self.score_levenshtein_distance(term1, term2) / max_distance
+
+
+class AcceleratedScoringBackend(ScoringBackend):
+
+    name = "accelerated"
+
+    def __init__(self):
+        """A scoring backend that counts char and ngram overlap with Counter intersections
+        and uses the compiled Levenshtein implementation of rapidfuzz when it is installed.
+        The compiled implementation only supports unit costs, so distances using the
+        confusion pairs are computed with the pure Python implementation."""
+        super().__init__()
+        self.use_compiled_levenshtein = compiled_levenshtein is not None
+
+    def score_char_overlap(self, term1: str, term2: str) -> int:
+        # the number of chars that can be removed one by one from term1
+        # is the size of the multiset intersection of both terms
+        return sum((Counter(term1) & Counter(term2)).values())
+
+    def score_ngram_overlap(self, term1: str, term2: str, ngram_size: int) -> int:
+        term1_ngrams = Counter(make_ngrams(term1, ngram_size))
+        term2_ngrams = Counter(make_ngrams(term2, ngram_size))
+        return sum((term1_ngrams & term2_ngrams).values())
+
+    def score_levenshtein_distance(self, s1: str, s2: str, use_confuse: bool = False) -> Union[int, float]:
+        if use_confuse or not self.use_compiled_levenshtein:
+            return score_levenshtein_distance(s1, s2, use_confuse=use_confuse)
+        return compiled_levenshtein.distance(s1, s2)
+
+
+scoring_backends = {
+    ScoringBackend.name: ScoringBackend,
+    AcceleratedScoringBackend.name: AcceleratedScoringBackend,
+}
+
+
+def make_scoring_backend(backend: Union[str, ScoringBackend] = "accelerated") -> ScoringBackend:
+    """Return a scoring backend instance for the given backend name. Backend instances
+    are returned as is, so custom backends can be passed in via the searcher config.
+
+    :param backend: the name of a registered scoring backend or a scoring backend instance
+    :type backend: Union[str, ScoringBackend]
+    :return: the scoring backend
+    :rtype: ScoringBackend
+    """
+    if isinstance(backend, ScoringBackend):
+        return backend
+    if backend not in scoring_backends:
+        raise ValueError(f"unknown scoring backend {backend}, must be one of {list(scoring_backends.keys())}")
+    return scoring_backends[backend]()
+
+
 #################################
 # Helper functions #
 #################################
@@ -173,11 +266,12 @@ class FuzzyKeywordSearcher(object):
         self.track_candidates = False
         self.use_confuse = False
         self.tracking_level = 4
-        self.known_candidates = defaultdict(dict)
+        self.known_candidates: KnownCandidateCache = make_known_candidate_cache(config)
         self.distractor_terms = defaultdict(list)
         self.ngram_size = 2
         self.skip_size = 2
         self.allow_overlapping_matches = True
+        self.scoring_backend = make_scoring_backend("accelerated")
         # non-default configuration
         self.configure(config)
         self.variant_map = defaultdict(dict)
@@ -220,6 +314,8 @@ class FuzzyKeywordSearcher(object):
             self.skip_size = config["skip_size"]
         if "include_variants" in config:
             self.include_variants = config["include_variants"]
+        if "scoring_backend" in config:
+            self.scoring_backend = make_scoring_backend(config["scoring_backend"])
 
     def enable_strip_suffix(self):
         self.perform_strip_suffix = True
@@ -308,13 +404,12 @@ class FuzzyKeywordSearcher(object):
         return keyword in self.label
 
     def update_known_candidates(self, distractor_terms):
-        for match_string in self.known_candidates:
-            for match_term in self.known_candidates[match_string]:
-                self.update_known_candidate(match_string, match_term, distractor_terms)
+        for (match_string, match_term), info in self.known_candidates.items():
+            self.update_known_candidate(match_string, match_term, distractor_terms)
 
     def update_known_candidate(self, match_string, match_term, distractor_terms):
         # if status is already reject, skip test
-        if self.known_candidates[match_string][match_term]["status"] == "reject":
+        if self.known_candidates.peek((match_string, match_term))["status"] == "reject":
             return False
         # if status is accept, test match_string against distractors
         if match_term in distractor_terms:
@@ -327,11 +422,11 @@ class FuzzyKeywordSearcher(object):
             self.test_known_candidate_status(match_string, match_term, distractor_terms[keyword])
 
     def test_known_candidate_status(self, match_string, match_term, distractors):
-        accept_distance = score_levenshtein_distance(match_string, match_term)
+        accept_distance = self.scoring_backend.score_levenshtein_distance(match_string, match_term)
         for distractor in distractors:
-            reject_distance = score_levenshtein_distance(match_string, distractor)
+            reject_distance = self.scoring_backend.score_levenshtein_distance(match_string, distractor)
             if reject_distance < accept_distance:
-                self.known_candidates[match_string][match_term]["status"] = "reject"
+                self.known_candidates.update_status((match_string, match_term), "reject")
                 return True
         return False
 
@@ -354,12 +449,11 @@ class FuzzyKeywordSearcher(object):
     def add_known_candidate(self, candidate, status):
         if not self.track_candidates:
             return None
-        match_string = candidate["match_string"]
-        match_term = candidate["match_term"]
-        self.known_candidates[match_string][match_term] = {
+        info = {
             "status": status,
         }
-        add_candidate_scores(self.known_candidates[match_string][match_term], candidate)
+        add_candidate_scores(info, candidate)
+        self.known_candidates.set((candidate["match_string"], candidate["match_term"]), info)
 
     def score_char_overlap(self, keyword: str, candidate: str) -> int:
         candidate_index = Counter(candidate)
@@ -378,11 +472,11 @@ class FuzzyKeywordSearcher(object):
         match_term_string, candidate_string = get_match_terms(match_term, candidate)
         if filter_type == "char_match":
             # return self.score_char_overlap_ratio(match_term_string, candidate_string)
-            return score_char_overlap_ratio(match_term_string, candidate_string)
+            return self.scoring_backend.score_char_overlap_ratio(match_term_string, candidate_string)
         if filter_type == "ngram_match":
-            return score_ngram_overlap_ratio(match_term_string, candidate_string, ngram_size)
+            return self.scoring_backend.score_ngram_overlap_ratio(match_term_string, candidate_string, ngram_size)
         if filter_type == "levenshtein_distance":
-            return score_levenshtein_distance_ratio(match_term_string, candidate_string)
+            return self.scoring_backend.score_levenshtein_distance_ratio(match_term_string, candidate_string)
 
     def above_threshold(self, score, filter_type):
         if filter_type == "char_match":
@@ -400,9 +494,11 @@ class FuzzyKeywordSearcher(object):
         # if keyword has no distractor_terms, candidate is not distractor term
         if keyword not in self.distractor_terms:
             return False
-        keyword_distance = score_levenshtein_distance(candidate["match_term"], candidate["match_string"])
+        keyword_distance = self.scoring_backend.score_levenshtein_distance(candidate["match_term"],
+                                                                           candidate["match_string"])
         for distractor_term in self.distractor_terms[keyword]:
-            distractor_distance = score_levenshtein_distance(distractor_term, candidate["match_string"])
+            distractor_distance = self.scoring_backend.score_levenshtein_distance(distractor_term,
+                                                                                  candidate["match_string"])
             if distractor_distance < keyword_distance:
                 return True
         return False
@@ -476,45 +572,43 @@ class FuzzyKeywordSearcher(object):
         return match
 
     def get_known_candidate(self, candidate):
-        if self.is_known_candidate(candidate):
-            return self.known_candidates[candidate["match_string"]][candidate["match_term"]]
-        elif not self.track_candidates or not self.is_known_candidate(candidate):
-            return None
-        else:
-            return self.known_candidates[candidate["match_string"]][candidate["match_term"]]
+        return self.known_candidates.get((candidate["match_string"], candidate["match_term"]))
 
     def is_rejected_candidate(self, candidate):
-        if not self.track_candidates or not self.is_known_candidate(candidate):
+        if not self.track_candidates:
             return False
-        else:
-            return self.get_known_candidate_status(candidate) == "reject"
+        info = self.get_known_candidate(candidate)
+        return info is not None and info["status"] == "reject"
 
     def set_known_candidate_status(self):
         for status in self.candidates:
             for candidate in self.candidates[status]:
-                match_string = candidate["match_string"]
-                keyword = candidate["match_term"]
-                if self.is_known_candidate(candidate):
-                    self.known_candidates[match_string][keyword]["status"] = status
+                key = (candidate["match_string"], candidate["match_term"])
+                if key in self.known_candidates:
+                    self.known_candidates.update_status(key, status)
                     continue
                 info = {
                     "status": status,
                 }
                 add_candidate_scores(info, candidate)
-                self.known_candidates[match_string][keyword] = info
+                self.known_candidates.set(key, info)
 
     def is_known_candidate(self, candidate):
-        if candidate["match_string"] not in self.known_candidates:
-            return False
-        elif candidate["match_term"] not in self.known_candidates[candidate["match_string"]]:
-            return False
-        else:
-            return True
+        return (candidate["match_string"], candidate["match_term"]) in self.known_candidates
 
     def get_known_candidate_status(self, candidate):
         """Determines whether a combination of match string and
         match term has been seen before and has a known status."""
-        return self.known_candidates[candidate["match_string"]][candidate["match_term"]]["status"]
+        return self.known_candidates.peek((candidate["match_string"], candidate["match_term"]))["status"]
+
+    def save_known_candidates(self, cache_file: str):
+        """Write the known candidates to file, so they can be warm-loaded in a later
+        run by configuring the searcher with 'known_candidates_file'."""
+        self.known_candidates.save(cache_file)
+
+    def known_candidate_stats(self):
+        """Return the hit, miss and eviction counters and the size of the known candidate cache."""
+        return self.known_candidates.stats()
 
     #################################
     # Candidate filtering functions #
@@ -553,8 +647,8 @@ class FuzzyKeywordSearcher(object):
         best_distance = {}
         for candidate in self.candidates["filter"]:
             if "levenshtein_distance" not in candidate:
-                levenshtein_distance = score_levenshtein_distance_ratio(candidate["match_term"],
-                                                                        candidate["match_string"])
+                levenshtein_distance = self.scoring_backend.score_levenshtein_distance_ratio(
+                    candidate["match_term"], candidate["match_string"])
                 candidate["levenshtein_distance"] = levenshtein_distance
             offset = candidate["match_offset"]
             if candidate["match_term"] in self.keyword_index:
@@ -739,8 +833,10 @@ class FuzzyKeywordSearcher(object):
             if abs(len(match['match_term']) - len(match['match_string'])) > self.max_length_variance:
                 # Check if candidate is within maximum length variance of match term
                 continue
-            if self.is_known_candidate(match):
-                known_candidate = self.get_known_candidate(match)
+            # the lookup is counted once per candidate, by is_rejected_candidate
+            known_candidate = self.known_candidates.peek((match["match_string"], match["match_term"])) \
+                if self.track_candidates else None
+            if known_candidate is not None:
                 match["status"] = known_candidate["status"]
                 add_candidate_scores(match, known_candidate)
             # print("\t", match)
@@ -803,10 +899,10 @@ class FuzzyKeywordSearcher(object):
                 # - keywords are very different in length
                 if abs(len(string1) - len(string2)) > max_length_difference: continue
                 # - keywords have low overlap in characters
-                char_overlap = score_char_overlap(string1, string2)
+                char_overlap = self.scoring_backend.score_char_overlap(string1, string2)
                 # print(string1, string2, char_overlap, char_overlap/len(string1))
                 if char_overlap / len(string1) < min_char_overlap: continue
-                distance = score_levenshtein_distance(string1, string2)
+                distance = self.scoring_backend.score_levenshtein_distance(string1, string2)
                 # print(string1, string2, distance, distance / len(string1), distance/len(string2))
                 if distance < max_distance and (
                         distance / len(string1) < max_distance_ratio or distance / len(string2) < max_distance_ratio):
@@ -816,11 +912,11 @@ class FuzzyKeywordSearcher(object):
 
     def find_closer_terms(self, candidate, keyword, close_terms):
         closer_terms = {}
-        keyword_distance = score_levenshtein_distance(keyword, candidate)
+        keyword_distance = self.scoring_backend.score_levenshtein_distance(keyword, candidate)
         # print("candidate:", candidate, "\tkeyword:", keyword)
         # print("keyword_distance", keyword_distance)
         for close_term in close_terms:
-            close_term_distance = score_levenshtein_distance(close_term, candidate)
+            close_term_distance = self.scoring_backend.score_levenshtein_distance(close_term, candidate)
             # print("close_term:", close_term, "\tdistance:", close_term_distance)
             if close_term_distance < keyword_distance:
                 closer_terms[close_term] = close_term_distance
@@ -0,0 +1,326 @@
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, Union
+import datetime
+import json
+import os
+import platform
+import resource
+import threading
+import time
+
+
+def get_max_rss_bytes() -> int:
+    """Return the high-water mark of the resident set size of this process in bytes."""
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS reports bytes
+    return max_rss if platform.system() == 'Darwin' else max_rss * 1024
+
+
+class ESRequestCounter:
+
+    def __init__(self):
+        """Counts the number of requests to Elasticsearch, the time spent waiting for
+        them and the number of bytes sent and received, by wrapping the perform_request
+        method of the connections of Elasticsearch clients. The counters are updated
+        under a lock, as requests can be made from several threads, e.g. sliced scrolls."""
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.failed_requests = 0
+        self.seconds = 0.0
+        self.request_bytes = 0
+        self.response_bytes = 0
+        self.clients = set()
+
+    def attach(self, es) -> None:
+        """Count the requests of the given Elasticsearch client. Attaching the same
+        client more than once has no effect.
+
+        :param es: the elasticsearch instance to count the requests of
+        :type es: Elasticsearch
+        """
+        if id(es) in self.clients:
+            return None
+        for connection in es.transport.connection_pool.connections:
+            connection.perform_request = self.wrap_perform_request(connection.perform_request)
+        self.clients.add(id(es))
+
+    def wrap_perform_request(self, perform_request):
+        def counting_perform_request(method, url, params=None, body=None, *args, **kwargs):
+            start = time.perf_counter()
+            request_bytes = 0
+            if body is not None:
+                request_bytes = len(body) if isinstance(body, bytes) else len(body.encode('utf-8'))
+            with self.lock:
+                self.requests += 1
+                self.request_bytes += request_bytes
+            try:
+                status, headers, data = perform_request(method, url, params, body, *args, **kwargs)
+            except Exception:
+                with self.lock:
+                    self.failed_requests += 1
+                raise
+            finally:
+                with self.lock:
+                    self.seconds += time.perf_counter() - start
+            if data:
+                response_bytes = len(data.encode('utf-8')) if isinstance(data, str) else len(data)
+                with self.lock:
+                    self.response_bytes += response_bytes
+            return status, headers, data
+        return counting_perform_request
+
+    def snapshot(self) -> Dict[str, Union[int, float]]:
+        with self.lock:
+            return {
+                'es_requests': self.requests,
+                'es_failed_requests': self.failed_requests,
+                'es_seconds': self.seconds,
+                'es_request_bytes': self.request_bytes,
+                'es_response_bytes': self.response_bytes,
+            }
+
+
+class StageRecord:
+
+    def __init__(self, name: str, path: List[str], context: Dict[str, any], es_start: Dict[str, any]):
+        self.name = name
+        self.path = path
+        self.context = context
+        self.start_time = datetime.datetime.now()
+        self.start = time.perf_counter()
+        self.duration = None
+        self.status = 'running'
+        self.es_start = es_start
+        self.es_stats = {}
+        self.max_rss_start = get_max_rss_bytes()
+        self.max_rss_end = None
+        self.counts = defaultdict(int)
+        self.substage_seconds = defaultdict(float)
+
+    def json(self) -> Dict[str, any]:
+        return {
+            'stage': '/'.join(self.path),
+            **self.context,
+            'status': self.status,
+            'start_time': self.start_time.isoformat(),
+            'duration': round(self.duration, 6),
+            'substage_seconds': {name: round(seconds, 6) for name, seconds in self.substage_seconds.items()},
+            'counts': dict(self.counts),
+            **self.es_stats,
+            'max_rss_bytes': self.max_rss_end,
+            'max_rss_increase_bytes': self.max_rss_end - self.max_rss_start,
+            'pid': os.getpid(),
+        }
+
+
+class IndexingMonitor:
+
+    def __init__(self, metrics_file: Union[None, str] = None, print_summary: bool = True):
+        """Collects per-stage durations, document counts, Elasticsearch request counts
+        and bytes and the resident set size high-water mark of indexing runs.
+
+        Stages are nested, e.g. an inventory, an indexing step of that inventory and the
+        substages of the indexing function, and each finished stage is written as a JSON
+        line to the metrics file. Substages that are interleaved in a loop, like
+        retrieving, parsing and indexing documents, are timed cumulatively per stage.
+
+        :param metrics_file: the JSON lines file to append the stage records to
+        :type metrics_file: Union[None, str]
+        :param print_summary: whether to print a summary table when an outer stage ends
+        :type print_summary: bool
+        """
+        self.metrics_file = metrics_file
+        self.print_summary = print_summary
+        self.es_counter = ESRequestCounter()
+        self.stack: List[StageRecord] = []
+        self.records: List[Dict[str, any]] = []
+
+    def attach_es(self, *es_clients) -> None:
+        """Count the requests of the given Elasticsearch clients."""
+        for es in es_clients:
+            self.es_counter.attach(es)
+
+    @contextmanager
+    def stage(self, name: str, **context):
+        """Time a (nested) stage and record the document counts and Elasticsearch
+        requests made during the stage. Keyword arguments, e.g. the inventory number
+        and indexing step, are added to the record of the stage and its nested stages.
+
+        A stage that ends without an error is done, unless the block marked the yielded
+        record as failed, e.g. when it handles the error of a nested stage itself.
+
+        :param name: the name of the stage
+        :type name: str
+        """
+        parent = self.stack[-1] if len(self.stack) > 0 else None
+        path = parent.path + [name] if parent else [name]
+        context = {**parent.context, **context} if parent else context
+        record = StageRecord(name, path, context, self.es_counter.snapshot())
+        self.stack.append(record)
+        try:
+            yield record
+            if record.status == 'running':
+                record.status = 'done'
+        except BaseException:
+            record.status = 'failed'
+            raise
+        finally:
+            self.stack.pop()
+            self.end_stage(record, parent)
+
+    def end_stage(self, record: StageRecord, parent: Union[None, StageRecord]) -> None:
+        record.duration = time.perf_counter() - record.start
+        record.max_rss_end = get_max_rss_bytes()
+        es_end = self.es_counter.snapshot()
+        record.es_stats = {key: es_end[key] - record.es_start[key] for key in es_end}
+        record.es_stats['es_seconds'] = round(record.es_stats['es_seconds'], 6)
+        if parent:
+            for count_name, count in record.counts.items():
+                parent.counts[count_name] += count
+        record_json = record.json()
+        self.records.append(record_json)
+        self.write_record(record_json)
+        if parent is None:
+            if self.print_summary:
+                self.print_stage_summary(record.path[0])
+            # all nested stages are done, so their records are no longer needed for the summary
+            self.records = []
+
+    @contextmanager
+    def substage(self, name: str):
+        """Add the duration of the block to the cumulative time of the substage in
+        the current stage."""
+        start = time.perf_counter()
+        try:
+            yield None
+        finally:
+            if len(self.stack) > 0:
+                self.stack[-1].substage_seconds[name] += time.perf_counter() - start
+
+    def iterate(self, name: str, iterable: Iterable) -> Iterable:
+        """Iterate over an iterable, adding the time spent waiting for each next item,
+        e.g. for a page of scroll results, to the cumulative time of the substage."""
+        iterator = iter(iterable)
+        while True:
+            with self.substage(name):
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return None
+            yield item
+
+    def count(self, name: str, number: int = 1) -> None:
+        """Add number to the count of name in the current stage."""
+        if len(self.stack) > 0:
+            self.stack[-1].counts[name] += number
+
+    def write_record(self, record_json: Dict[str, any]) -> None:
+        if not self.metrics_file:
+            return None
+        # metrics are only informative, so failing to write them must not fail the indexing
+        try:
+            metrics_dir = os.path.dirname(self.metrics_file)
+            if metrics_dir:
+                os.makedirs(metrics_dir, exist_ok=True)
+            # a single write per line, so records of parallel worker processes don't interleave
+            with open(self.metrics_file, 'at') as fh:
+                fh.write(json.dumps(record_json) + '\n')
+        except OSError as err:
+            print(f"Warning: could not write indexing metrics to {self.metrics_file}: {err}")
+
+    def print_stage_summary(self, stage_name: str) -> None:
+        """Print a table of the records of the stage stage_name and its nested stages."""
+        records = [record for record in self.records
+                   if record['stage'] == stage_name or record['stage'].startswith(stage_name + '/')]
+        records.sort(key=lambda record: record['start_time'])
+        print(f"{'stage': <50}{'status': >8}{'seconds': >10}{'es (s)': >9}{'es reqs': >9}"
+              f"{'es sent': >10}{'es recv': >10}{'max rss': >10}  counts")
+        for record in records:
+            counts = ', '.join(f"{name}: {count}" for name, count in record['counts'].items())
+            print(f"{record['stage']: <50}{record['status']: >8}{record['duration']: >10.2f}"
+                  f"{record['es_seconds']: >9.2f}{record['es_requests']: >9}"
+                  f"{format_bytes(record['es_request_bytes']): >10}{format_bytes(record['es_response_bytes']): >10}"
+                  f"{format_bytes(record['max_rss_bytes']): >10}  {counts}")
+            for name, seconds in record['substage_seconds'].items():
+                print(f"{'    ' + record['stage'] + ':' + name: <50}{'': >8}{seconds: >10.2f}")
+
+
+def format_bytes(num_bytes: int) -> str:
+    for unit in ['B', 'KB', 'MB', 'GB']:
+        if num_bytes < 1024:
+            return f"{num_bytes:.0f}{unit}" if unit == 'B' else f"{num_bytes:.1f}{unit}"
+        num_bytes /= 1024
+    return f"{num_bytes:.1f}TB"
+
+
+def read_metrics(metrics_file: str, run_id: Union[None, str] = None) -> List[Dict[str, any]]:
+    """Return the stage records in a metrics file, optionally only those of a single run."""
+    records = []
+    with open(metrics_file, 'rt') as fh:
+        for line in fh:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                # a partially written last line after a crash
+                continue
+            if run_id is None or record.get('run_id') == run_id:
+                records.append(record)
+    return records
+
+
+def summarize_metrics(records: List[Dict[str, any]]) -> Dict[str, Dict[str, any]]:
+    """Aggregate stage records per stage, ignoring the inventory, e.g. to see which
+    indexing step or substage takes most of the time across all inventories of a run.
+    Stages are grouped on their path without the first element."""
+    summary = {}
+    # outer stages start before their nested stages, so they come first in the summary
+    for record in sorted(records, key=lambda record: record['start_time']):
+        stage = '/'.join(record['stage'].split('/')[1:]) or record['stage']
+        if stage not in summary:
+            summary[stage] = {'stage': stage, 'num_records': 0, 'num_failed': 0, 'duration': 0.0,
+                              'substage_seconds': defaultdict(float), 'counts': defaultdict(int),
+                              'es_requests': 0, 'es_seconds': 0.0, 'es_request_bytes': 0,
+                              'es_response_bytes': 0, 'max_rss_bytes': 0}
+        stage_summary = summary[stage]
+        stage_summary['num_records'] += 1
+        if record['status'] == 'failed':
+            stage_summary['num_failed'] += 1
+        for field in ['duration', 'es_requests', 'es_seconds', 'es_request_bytes', 'es_response_bytes']:
+            stage_summary[field] += record[field]
+        for name, seconds in record['substage_seconds'].items():
+            stage_summary['substage_seconds'][name] += seconds
+        for name, count in record['counts'].items():
+            stage_summary['counts'][name] += count
+        stage_summary['max_rss_bytes'] = max(stage_summary['max_rss_bytes'], record['max_rss_bytes'])
+    return summary
+
+
+def print_metrics_summary(records: List[Dict[str, any]]) -> None:
+    """Print a table with the total duration, Elasticsearch time and requests and
+    document counts per stage, and the share of the duration spent in each substage."""
+    summary = summarize_metrics(records)
+    print(f"{'stage': <40}{'num': >6}{'failed': >7}{'seconds': >10}{'es (s)': >9}{'es reqs': >9}"
+          f"{'es sent': >10}{'es recv': >10}{'max rss': >10}  counts")
+    for stage, stage_summary in summary.items():
+        counts = ', '.join(f"{name}: {count}" for name, count in stage_summary['counts'].items())
+        print(f"{stage: <40}{stage_summary['num_records']: >6}{stage_summary['num_failed']: >7}"
+              f"{stage_summary['duration']: >10.2f}{stage_summary['es_seconds']: >9.2f}"
+              f"{stage_summary['es_requests']: >9}{format_bytes(stage_summary['es_request_bytes']): >10}"
+              f"{format_bytes(stage_summary['es_response_bytes']): >10}"
+              f"{format_bytes(stage_summary['max_rss_bytes']): >10}  {counts}")
+        for name, seconds in stage_summary['substage_seconds'].items():
+            share = seconds / stage_summary['duration'] if stage_summary['duration'] > 0 else 0.0
+            print(f"{'    ' + name: <40}{'': >13}{seconds: >10.2f}  ({share:.0%})")
+
+
+# the monitor used by the indexing functions. It only writes records to a
+# file when a metrics file is set, e.g. by do_indexing.py
+monitor = IndexingMonitor(print_summary=False)
+
+
+def set_metrics_file(metrics_file: Union[None, str], print_summary: bool = True) -> IndexingMonitor:
+    """Configure the shared indexing monitor to append stage records to metrics_file."""
+    monitor.metrics_file = metrics_file
+    monitor.print_summary = print_summary
+    return monitor
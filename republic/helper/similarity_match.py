@@ -3,6 +3,7 @@ import re
 from collections import defaultdict, Counter
 import networkx as nx
 from ..fuzzy.fuzzy_keyword import Keyword
+from ..fuzzy.fuzzy_keyword_searcher import make_scoring_backend
 
 pairs = {('s', 'f'): 0.2,
          ('s', ''): 0.2,
@@ -123,15 +124,73 @@ def confuse_distance(c1, c2):
     else:
         return 1
 
+
+class BKTree(object):
+
+    def __init__(self, distance_function):
+        """A Burkhard-Keller tree for finding all strings within a maximum edit distance of
+        a query string, without comparing the query to every string in the tree. The distance
+        function must be a metric, such as the Levenshtein distance with unit costs.
+
+        Each node is a list of a string, the indexes of the items with that string and
+        a dictionary of child nodes keyed by their distance to the node string."""
+        self.distance_function = distance_function
+        self.root = None
+
+    def add(self, string: str, index: int) -> None:
+        """Add a string with the index of the item it belongs to."""
+        if self.root is None:
+            self.root = [string, [index], {}]
+            return None
+        node = self.root
+        while True:
+            distance = self.distance_function(string, node[0])
+            if distance == 0:
+                node[1].append(index)
+                return None
+            if distance not in node[2]:
+                node[2][distance] = [string, [index], {}]
+                return None
+            node = node[2][distance]
+
+    def find(self, string: str, max_distance: int) -> List[tuple]:
+        """Return (string, indexes, distance) tuples for all strings within max_distance of the given string."""
+        if self.root is None:
+            return []
+        found = []
+        nodes = [self.root]
+        while nodes:
+            node = nodes.pop()
+            distance = self.distance_function(string, node[0])
+            if distance <= max_distance:
+                found.append((node[0], node[1], distance))
+            # by the triangle inequality, only children at a distance within
+            # max_distance of the query distance can contain matches
+            for child_distance, child in node[2].items():
+                if distance - max_distance <= child_distance <= distance + max_distance:
+                    nodes.append(child)
+        return found
+
+
 class FuzzyKeywordGrouper(object):
     def __init__(self, keyword_list: List[str]):
         self.keyword_list = keyword_list
+        self.scoring_backend = make_scoring_backend("accelerated")
         self.distance_list = self.find_close_distance_keywords()
 
     def find_close_distance_keywords(self, max_distance_ratio: float = 0.3,
                                      max_length_difference: int = 3, min_char_overlap: float = 0.5,
-                                     max_distance: int = 10) -> Dict[str, List[str]]:
-        """TODO: should we make the arguments into a config?"""
+                                     max_distance: int = 10, use_index: bool = True) -> Dict[str, List[str]]:
+        """Find for each keyword the other keywords that are close in Levenshtein distance. With
+        use_index, candidate pairs are found with a BK-tree search instead of comparing all pairs.
+        Both give the same result, in the same order.
+
+        TODO: should we make the arguments into a config?"""
+        if use_index:
+            return self.find_close_distance_keywords_indexed(max_distance_ratio=max_distance_ratio,
+                                                             max_length_difference=max_length_difference,
+                                                             min_char_overlap=min_char_overlap,
+                                                             max_distance=max_distance)
         close_distance_keywords = defaultdict(list)
         for index, keyword1 in enumerate(self.keyword_list):
             string1 = get_keyword_string(keyword1).lower()
@@ -148,6 +207,40 @@ class FuzzyKeywordGrouper(object):
                     close_distance_keywords[keyword2].append(keyword1)
         return close_distance_keywords
 
+    def find_close_distance_keywords_indexed(self, max_distance_ratio: float = 0.3,
+                                             max_length_difference: int = 3, min_char_overlap: float = 0.5,
+                                             max_distance: int = 10) -> Dict[str, List[str]]:
+        strings = [get_keyword_string(keyword).lower() for keyword in self.keyword_list]
+        tree = BKTree(self.scoring_backend.score_levenshtein_distance)
+        for index, string in enumerate(strings):
+            tree.add(string, index)
+        close_pairs = []
+        for index1, string1 in enumerate(strings):
+            # a close keyword has a distance below max_distance_ratio times the length
+            # of the longest of the two, which is at most max_length_difference longer
+            search_distance = min(max_distance - 1,
+                                  int(max_distance_ratio * (len(string1) + max_length_difference)) + 1)
+            for string2, indexes, distance in tree.find(string1, search_distance):
+                if abs(len(string1) - len(string2)) > max_length_difference:
+                    continue
+                # the char overlap is relative to the earlier keyword in the list,
+                # so check it only once per pair, from the side of the earlier keyword
+                later_indexes = [index2 for index2 in indexes if index2 > index1]
+                if len(later_indexes) == 0:
+                    continue
+                char_overlap = self.scoring_backend.score_char_overlap(string1, string2)
+                if char_overlap / len(string1) < min_char_overlap:
+                    continue
+                if distance < max_distance and (
+                        distance / len(string1) < max_distance_ratio or distance / len(string2) < max_distance_ratio):
+                    close_pairs += [(index1, index2) for index2 in later_indexes]
+        # add the pairs in the order in which the pairwise comparison finds them
+        close_distance_keywords = defaultdict(list)
+        for index1, index2 in sorted(close_pairs):
+            keyword1, keyword2 = self.keyword_list[index1], self.keyword_list[index2]
+            close_distance_keywords[keyword1].append(keyword2)
+            close_distance_keywords[keyword2].append(keyword1)
+        return close_distance_keywords
 
     def find_closer_terms(self, candidate, keyword, close_terms):
         closer_terms = {}
@@ -1,34 +1,63 @@
 from typing import List, Union
-from republic.model.republic_date import RepublicDate, make_republic_date
+from collections import defaultdict
+import datetime
+
+from republic.model.republic_date import RepublicDate, make_republic_date, is_date_string
 
 
 def get_inventory_by_num(inventory_num: int) -> dict:
-    for inv_map in inventory_mapping:
-        if inv_map["inventory_num"] == inventory_num:
-            return inv_map
+    return inventory_num_index.get(inventory_num)
 
 
 def get_inventories_by_year(inventory_years: Union[int, List[int]]) -> list:
     if isinstance(inventory_years, int):
-        inventory_years = [inventory_years]
-    return [inv_map for inv_map in inventory_mapping if inv_map["year"] in inventory_years]
+        return list(inventory_year_index.get(inventory_years, []))
+    inventories = [inv_map for year in set(inventory_years) for inv_map in inventory_year_index.get(year, [])]
+    # return inventories in the order of the mapping, regardless of the order of the years
+    return sorted(inventories, key=lambda inv_map: inventory_position_index[inv_map["inventory_num"]])
+
+
+def get_inventories_by_series(series_name: str) -> list:
+    return list(inventory_series_index.get(series_name, []))
 
 
 def get_inventory_by_date(date: Union[str, RepublicDate]) -> dict:
     if isinstance(date, str):
         date = make_republic_date(date)
-    inventories = get_inventories_by_year(date.year)
+    inventories = inventory_year_index.get(date.year, [])
     if len(inventories) == 1:
         return inventories[0]
     else:
-        for inventory in inventories:
-            inv_start = make_republic_date(inventory["period"][0])
-            inv_end = make_republic_date(inventory["period"][1])
-            if inv_start <= date <= inv_end:
+        # periods of inventories can overlap, so return the first inventory
+        # in the order of the mapping whose period contains the date
+        for inv_start, inv_end, inventory in inventory_period_index.get(date.year, []):
+            if inv_start <= date.date <= inv_end:
                 return inventory
     raise ValueError(f"Cannot find inventory for date {date}")
 
 
+def make_inventory_indexes(inventories: List[dict]) -> tuple:
+    """Index a list of inventory mappings by inventory number, year, series and period. Lists
+    of inventories in the indexes are in the same order as in the mapping list."""
+    num_index = {}
+    position_index = {}
+    year_index = defaultdict(list)
+    series_index = defaultdict(list)
+    period_index = defaultdict(list)
+    for position, inventory in enumerate(inventories):
+        if inventory["inventory_num"] not in num_index:
+            num_index[inventory["inventory_num"]] = inventory
+            position_index[inventory["inventory_num"]] = position
+        year_index[inventory["year"]].append(inventory)
+        if "series_name" in inventory:
+            series_index[inventory["series_name"]].append(inventory)
+        if "period" in inventory and all(is_date_string(date_string) for date_string in inventory["period"]):
+            inv_start = datetime.date.fromisoformat(inventory["period"][0])
+            inv_end = datetime.date.fromisoformat(inventory["period"][1])
+            period_index[inventory["year"]].append((inv_start, inv_end, inventory))
+    return dict(num_index), position_index, dict(year_index), dict(series_index), dict(period_index)
+
+
 inventory_mapping_no_uuid = [
     {"inventory_num": 3174, "year": 1615},
     {"inventory_num": 3175, "year": 1616},
@@ -1917,3 +1946,8 @@ inventory_mapping = [
      'series_uuid': '6e8998f6-cc66-43b9-92ae-85423ed66958',
      'year': 1796}
 ]
+
+
+# indexes for fast lookups of inventories, built once at import
+inventory_num_index, inventory_position_index, inventory_year_index, \
+    inventory_series_index, inventory_period_index = make_inventory_indexes(inventory_mapping)
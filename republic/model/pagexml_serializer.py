@@ -0,0 +1,526 @@
+from __future__ import annotations
+from array import array
+from itertools import chain
+from typing import Dict, Iterator, List, Tuple, Union
+import datetime
+import json
+import struct
+import sys
+
+from republic.model.physical_document_model import Coords, Baseline, PageXMLDoc, PageXMLWord
+from republic.model.physical_document_model import PageXMLTextLine, PageXMLTextRegion, PageXMLColumn
+from republic.model.physical_document_model import PageXMLPage, PageXMLScan
+
+
+# the kinds of documents, the order of the isinstance checks matters
+# as pages, columns and scans are also text regions
+doc_kinds = ['scan', 'page', 'column', 'text_region', 'line', 'word']
+doc_kind_classes = [PageXMLScan, PageXMLPage, PageXMLColumn, PageXMLTextRegion, PageXMLTextLine, PageXMLWord]
+# the lists of a parent document that a child document can be in
+child_fields = ['pages', 'columns', 'text_regions', 'lines', 'extra', 'words']
+kind_classes = dict(zip(doc_kinds, doc_kind_classes))
+
+
+def get_doc_kind(doc: PageXMLDoc) -> int:
+    for kind, doc_class in enumerate(doc_kind_classes):
+        if isinstance(doc, doc_class):
+            return kind
+    raise TypeError(f'unknown document type: {doc.__class__.__name__}')
+
+
+def json_default(value):
+    # metadata can contain timestamps, which are serialised like the elasticsearch client does
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return value.isoformat()
+    raise TypeError(f'Object of type {value.__class__.__name__} is not JSON serializable')
+
+
+# the same compact, non-ASCII escaping JSON as the elasticsearch serializer
+json_encoder = json.JSONEncoder(ensure_ascii=False, separators=(',', ':'), default=json_default)
+encode = json_encoder.encode
+
+
+def make_pagexml_doc(kind: str, doc_id: Union[None, str], doc_type: Union[str, List[str]],
+                     metadata: Dict[str, any], coords: Union[None, Coords] = None,
+                     children: Dict[str, List[PageXMLDoc]] = None, text: Union[None, str] = None,
+                     baseline: Union[None, Baseline] = None, conf: Union[None, float] = None,
+                     xheight: Union[None, int] = None, orientation: Union[None, float] = None,
+                     reading_order: Dict[int, str] = None) -> PageXMLDoc:
+    """Create a PageXML document of the given kind with already created children, so that
+    a serialised document tree can be reconstructed bottom-up.
+
+    The attributes that the constructors set are assigned directly instead of calling the
+    constructors, as those add the ids of the parent to the metadata of the children and
+    re-sort the text regions by their reading order. The document is restored as it was
+    serialised, with the metadata and order of children it had, at a fraction of the cost.
+
+    :param kind: the kind of document, one of doc_kinds
+    :type kind: str
+    :param children: the child documents per child field, e.g. 'lines' or 'text_regions'
+    :type children: Dict[str, List[PageXMLDoc]]
+    :return: the PageXML document
+    :rtype: PageXMLDoc
+    """
+    doc_class = kind_classes[kind]
+    doc = doc_class.__new__(doc_class)
+    doc.id = doc_id
+    doc.type = doc_type
+    doc.main_type = kind
+    doc.metadata = metadata if metadata else {}
+    doc.reading_order = reading_order if reading_order else {}
+    doc.parent = None
+    doc.coords = coords
+    doc._counts = None
+    children = children if children else {}
+    if kind == 'word':
+        doc.conf = conf
+        doc.text = text
+    elif kind == 'line':
+        doc.text = text
+        doc.xheight = xheight
+        doc.baseline = baseline
+        doc.words = children.get('words') or []
+    else:
+        doc.text_regions = children.get('text_regions') or []
+        doc.lines = children.get('lines') or []
+        doc.orientation = orientation
+        if kind == 'page':
+            doc.columns = children.get('columns') or []
+            doc.extra = children.get('extra') or []
+        elif kind == 'scan':
+            doc.pages = children.get('pages') or []
+            doc.columns = children.get('columns') or []
+    for field_children in children.values():
+        for child in field_children:
+            child.parent = doc
+    return doc
+
+
+##################################
+# Serialising documents to JSON #
+##################################
+
+
+def get_coords_json(coords: Coords) -> str:
+    # the point string 'x1,y1 x2,y2' is cached by the coords
+    return '[[' + coords.point_string.replace(' ', '],[') + ']]'
+
+
+def write_doc_json(doc: PageXMLDoc, parts: List[str]) -> Tuple[int, int]:
+    """Append the JSON of a document to parts, in the same structure and key order as the
+    json property of the document. The line and word counts of the stats are computed
+    bottom-up while writing the children, instead of once per ancestor of each line.
+
+    :return: the number of lines and words of the document as counted by its stats
+    :rtype: Tuple[int, int]
+    """
+    doc_class = doc.__class__
+    if doc_class not in json_writers:
+        # a subclass with its own json property
+        parts.append(encode(doc.json))
+        return doc_counts(doc)
+    parts.append('{"id":')
+    parts.append(encode(doc.id))
+    parts.append(',"type":')
+    parts.append(encode(doc.type))
+    parts.append(',"metadata":')
+    parts.append(encode(doc.metadata))
+    if doc.reading_order:
+        parts.append(',"reading_order":')
+        parts.append(encode(doc.reading_order))
+    if doc.coords:
+        parts.append(',"coords":')
+        parts.append(get_coords_json(doc.coords))
+    counts = json_writers[doc_class](doc, parts)
+    parts.append('}')
+    return counts
+
+
+def doc_counts(doc: PageXMLDoc) -> Tuple[int, int]:
+    if isinstance(doc, PageXMLTextLine):
+        return 1, doc.num_words
+    elif isinstance(doc, PageXMLTextRegion):
+        return doc.num_lines, doc.num_words
+    return 0, 0
+
+
+def write_list_json(docs: List[PageXMLDoc], parts: List[str]) -> Tuple[int, int]:
+    num_lines, num_words = 0, 0
+    parts.append('[')
+    for di, doc in enumerate(docs):
+        if di > 0:
+            parts.append(',')
+        doc_lines, doc_words = write_doc_json(doc, parts)
+        num_lines += doc_lines
+        num_words += doc_words
+    parts.append(']')
+    return num_lines, num_words
+
+
+def write_word_json(word: PageXMLWord, parts: List[str]) -> Tuple[int, int]:
+    parts.append(',"text":')
+    parts.append(encode(word.text))
+    if word.conf:
+        parts.append(',"conf":')
+        parts.append(encode(word.conf))
+    return 0, 0
+
+
+def write_line_json(line: PageXMLTextLine, parts: List[str]) -> Tuple[int, int]:
+    parts.append(',"text":')
+    parts.append(encode(line.text))
+    if line.baseline:
+        parts.append(',"baseline":')
+        parts.append(get_coords_json(line.baseline))
+    if line.words:
+        parts.append(',"words":')
+        write_list_json(line.words, parts)
+        num_words = len(line.words)
+    else:
+        num_words = len(line.text.split(' ')) if line.text else 0
+    if line.xheight:
+        parts.append(',"xheight":')
+        parts.append(encode(line.xheight))
+    return 1, num_words
+
+
+def write_text_region_fields_json(text_region: PageXMLTextRegion, parts: List[str]) -> Dict[str, int]:
+    """Write the lines, text regions and orientation of a text region, and return
+    the stats that a text region has."""
+    num_lines, num_words = 0, 0
+    if text_region.lines:
+        parts.append(',"lines":')
+        num_lines, num_words = write_list_json(text_region.lines, parts)
+    if text_region.text_regions:
+        parts.append(',"text_regions":')
+        tr_lines, tr_words = write_list_json(text_region.text_regions, parts)
+        num_lines += tr_lines
+        num_words += tr_words
+    if text_region.orientation:
+        parts.append(',"orientation":')
+        parts.append(encode(text_region.orientation))
+    return {'lines': num_lines, 'words': num_words, 'text_regions': len(text_region.text_regions)}
+
+
+def write_text_region_json(text_region: PageXMLTextRegion, parts: List[str]) -> Tuple[int, int]:
+    stats = write_text_region_fields_json(text_region, parts)
+    parts.append(',"stats":')
+    parts.append(encode(stats))
+    return stats['lines'], stats['words']
+
+
+def write_page_json(page: PageXMLPage, parts: List[str]) -> Tuple[int, int]:
+    stats = write_text_region_fields_json(page, parts)
+    # the stats come before the columns and extra, but include the counts of the columns
+    parts.append(',"stats":')
+    stats_index = len(parts)
+    parts.append('')
+    num_lines, num_words = stats['lines'], stats['words']
+    if page.columns:
+        parts.append(',"columns":')
+        column_lines, column_words = write_list_json(page.columns, parts)
+        stats['lines'] += column_lines
+        stats['words'] += column_words
+    if page.extra:
+        parts.append(',"extra":')
+        write_list_json(page.extra, parts)
+    stats['columns'] = len(page.columns)
+    stats['extra'] = len(page.extra)
+    parts[stats_index] = encode(stats)
+    # as a child of a text region, only the lines outside the columns are counted
+    return num_lines, num_words
+
+
+def write_scan_json(scan: PageXMLScan, parts: List[str]) -> Tuple[int, int]:
+    stats = write_text_region_fields_json(scan, parts)
+    stats['columns'] = sum(len(page.columns) for page in scan.pages)
+    stats['extra'] = sum(len(page.extra) for page in scan.pages)
+    stats['pages'] = len(scan.pages)
+    parts.append(',"stats":')
+    parts.append(encode(stats))
+    if scan.columns:
+        parts.append(',"columns":')
+        write_list_json(scan.columns, parts)
+    if scan.pages:
+        parts.append(',"pages":')
+        write_list_json(scan.pages, parts)
+    return stats['lines'], stats['words']
+
+
+json_writers = {
+    PageXMLWord: write_word_json,
+    PageXMLTextLine: write_line_json,
+    PageXMLTextRegion: write_text_region_json,
+    PageXMLColumn: write_text_region_json,
+    PageXMLPage: write_page_json,
+    PageXMLScan: write_scan_json,
+}
+
+
+def pagexml_to_json_string(doc: PageXMLDoc) -> str:
+    """Serialise a PageXML document to a JSON string in a single traversal of the document
+    tree. The JSON is the same as the json property of the document serialised by the
+    elasticsearch client, so it can be indexed directly, but no intermediate dictionaries
+    are created and the stats are not recomputed at every level of the tree.
+
+    :param doc: a PageXML scan, page, column, text region, line or word
+    :type doc: PageXMLDoc
+    :return: the JSON string of the document
+    :rtype: str
+    """
+    parts = []
+    write_doc_json(doc, parts)
+    return ''.join(parts)
+
+
+def pagexml_to_json_bytes(doc: PageXMLDoc) -> bytes:
+    """Serialise a PageXML document to UTF-8 encoded JSON, see pagexml_to_json_string."""
+    return pagexml_to_json_string(doc).encode('utf-8')
+
+
+#####################################
+# Reading documents from their JSON #
+#####################################
+
+
+def get_json_doc_kind(doc_type: Union[str, List[str]]) -> str:
+    # the same precedence of types as json_to_pagexml_doc
+    for kind in doc_kinds:
+        if kind in doc_type:
+            return kind
+    raise TypeError(f'json_doc is not a PageXML document of a known type: {doc_type}')
+
+
+def get_json_coords(points: Union[None, List[List[int]]], coords_class=Coords) -> Union[None, Coords]:
+    if not points:
+        return None
+    return coords_class(array('i', chain.from_iterable(points)))
+
+
+def get_json_reading_order(json_doc: dict) -> Union[None, Dict[int, str]]:
+    if 'reading_order' not in json_doc:
+        return None
+    # JSON object keys are strings, the reading order indexes are integers
+    return {int(index): region_id for index, region_id in json_doc['reading_order'].items()}
+
+
+def fast_json_to_pagexml_doc(json_doc: dict) -> PageXMLDoc:
+    """Reconstruct a PageXML document from its JSON, e.g. the source of a scan or page
+    document in Elasticsearch. This is a faster alternative to json_to_pagexml_doc, as
+    coordinates are read directly into their arrays and documents are created bottom-up
+    with make_pagexml_doc. Unlike json_to_pagexml_doc, the metadata, order of text regions
+    and the coordinates and confidence of words are kept as they were serialised.
+
+    :param json_doc: the JSON of a PageXML document
+    :type json_doc: dict
+    :return: the PageXML document
+    :rtype: PageXMLDoc
+    """
+    if 'pagexml_doc' not in json_doc['type']:
+        raise TypeError('json_doc is not of type "pagexml_doc".')
+    kind = get_json_doc_kind(json_doc['type'])
+    children = {}
+    for field in child_fields:
+        if field in json_doc:
+            children[field] = [fast_json_to_pagexml_doc(child) for child in json_doc[field]]
+    return make_pagexml_doc(kind, json_doc['id'], json_doc['type'], json_doc['metadata'],
+                            coords=get_json_coords(json_doc.get('coords')), children=children,
+                            text=json_doc.get('text'), baseline=get_json_coords(json_doc.get('baseline'), Baseline),
+                            conf=json_doc.get('conf'), xheight=json_doc.get('xheight'),
+                            orientation=json_doc.get('orientation'), reading_order=get_json_reading_order(json_doc))
+
+
+def fast_json_to_pagexml_scan(json_doc: dict) -> PageXMLScan:
+    """Reconstruct a PageXML scan from its JSON, see fast_json_to_pagexml_doc."""
+    if 'scan' not in json_doc['type']:
+        raise TypeError('json_doc is not of type "scan".')
+    return fast_json_to_pagexml_doc(json_doc)
+
+
+def json_string_to_pagexml(json_string: Union[str, bytes]) -> PageXMLDoc:
+    """Reconstruct a PageXML document from a JSON string or bytes."""
+    return fast_json_to_pagexml_doc(json.loads(json_string))
+
+
+##########################################
+# Serialising documents to binary format #
+##########################################
+
+# A document is serialised depth-first, as a node header with the kind, the flags of
+# which optional fields are present and the number of child lists, followed by the
+# length-prefixed id, the optional fields and the child lists, each as its child field
+# and number of children, followed by the children. The type, metadata and reading order
+# of all nodes are written after the nodes as a single JSON list, so they are decoded
+# at once, followed by the length of that list in bytes.
+
+binary_magic = b'PXB'
+binary_format_version = 1
+
+HAS_ID = 1
+HAS_TEXT = 2
+HAS_COORDS = 4
+HAS_BASELINE = 8
+HAS_CONF = 16
+HAS_XHEIGHT = 32
+HAS_ORIENTATION = 64
+
+node_header = struct.Struct('<BBB')
+length_prefix = struct.Struct('<I')
+child_list_header = struct.Struct('<BI')
+meta_length = struct.Struct('<Q')
+float_value = struct.Struct('<d')
+int_value = struct.Struct('<i')
+
+# coordinate values are written in little-endian byte order
+swap_bytes = sys.byteorder == 'big'
+
+
+def write_binary_string(value: str, out: bytearray) -> None:
+    data = value.encode('utf-8')
+    out += length_prefix.pack(len(data))
+    out += data
+
+
+def write_binary_coords(coords: Coords, out: bytearray) -> None:
+    values = coords._values
+    if swap_bytes:
+        values = array('i', values)
+        values.byteswap()
+    out += length_prefix.pack(len(values))
+    out += values.tobytes()
+
+
+def write_doc_binary(doc: PageXMLDoc, out: bytearray, metas: List[str]) -> None:
+    kind = get_doc_kind(doc)
+    text = getattr(doc, 'text', None)
+    baseline = getattr(doc, 'baseline', None)
+    conf = getattr(doc, 'conf', None)
+    xheight = getattr(doc, 'xheight', None)
+    orientation = getattr(doc, 'orientation', None)
+    flags = (HAS_ID if doc.id is not None else 0) | (HAS_TEXT if text is not None else 0) \
+        | (HAS_COORDS if doc.coords is not None else 0) | (HAS_BASELINE if baseline is not None else 0) \
+        | (HAS_CONF if conf is not None else 0) | (HAS_XHEIGHT if xheight is not None else 0) \
+        | (HAS_ORIENTATION if orientation is not None else 0)
+    child_lists = [(field_index, getattr(doc, field)) for field_index, field in enumerate(child_fields)
+                   if getattr(doc, field, None)]
+    out += node_header.pack(kind, flags, len(child_lists))
+    if flags & HAS_ID:
+        write_binary_string(doc.id, out)
+    meta = {'type': doc.type, 'metadata': doc.metadata}
+    if doc.reading_order:
+        # a list of pairs keeps the integer keys of the reading order
+        meta['reading_order'] = list(doc.reading_order.items())
+    metas.append(encode(meta))
+    if flags & HAS_TEXT:
+        write_binary_string(text, out)
+    if flags & HAS_COORDS:
+        write_binary_coords(doc.coords, out)
+    if flags & HAS_BASELINE:
+        write_binary_coords(baseline, out)
+    if flags & HAS_CONF:
+        out += float_value.pack(conf)
+    if flags & HAS_XHEIGHT:
+        out += int_value.pack(xheight)
+    if flags & HAS_ORIENTATION:
+        out += float_value.pack(orientation)
+    for field_index, children in child_lists:
+        out += child_list_header.pack(field_index, len(children))
+        for child in children:
+            write_doc_binary(child, out, metas)
+
+
+def pagexml_to_binary(doc: PageXMLDoc) -> bytes:
+    """Serialise a PageXML document and its descendants to a compact binary format in a
+    single traversal of the document tree. Coordinates are written as arrays of integers
+    and the stats are not stored, as they are derived from the document.
+
+    :param doc: a PageXML scan, page, column, text region, line or word
+    :type doc: PageXMLDoc
+    :return: the binary serialisation of the document
+    :rtype: bytes
+    """
+    out = bytearray(binary_magic)
+    out.append(binary_format_version)
+    metas = []
+    write_doc_binary(doc, out, metas)
+    meta_data = ('[' + ','.join(metas) + ']').encode('utf-8')
+    out += meta_data
+    out += meta_length.pack(len(meta_data))
+    return bytes(out)
+
+
+def read_binary_string(data: memoryview, offset: int) -> Tuple[str, int]:
+    length, = length_prefix.unpack_from(data, offset)
+    offset += length_prefix.size
+    return str(data[offset:offset + length], 'utf-8'), offset + length
+
+
+def read_binary_coords(data: memoryview, offset: int, coords_class=Coords) -> Tuple[Coords, int]:
+    length, = length_prefix.unpack_from(data, offset)
+    offset += length_prefix.size
+    values = array('i')
+    values.frombytes(data[offset:offset + length * values.itemsize])
+    if swap_bytes:
+        values.byteswap()
+    return coords_class(values), offset + length * values.itemsize
+
+
+def read_doc_binary(data: memoryview, offset: int, metas: Iterator[dict]) -> Tuple[PageXMLDoc, int]:
+    kind, flags, num_child_lists = node_header.unpack_from(data, offset)
+    offset += node_header.size
+    doc_id, text, coords, baseline, conf, xheight, orientation = None, None, None, None, None, None, None
+    if flags & HAS_ID:
+        doc_id, offset = read_binary_string(data, offset)
+    # the nodes are read in the same order as they were written
+    meta = next(metas)
+    if flags & HAS_TEXT:
+        text, offset = read_binary_string(data, offset)
+    if flags & HAS_COORDS:
+        coords, offset = read_binary_coords(data, offset)
+    if flags & HAS_BASELINE:
+        baseline, offset = read_binary_coords(data, offset, Baseline)
+    if flags & HAS_CONF:
+        conf, = float_value.unpack_from(data, offset)
+        offset += float_value.size
+    if flags & HAS_XHEIGHT:
+        xheight, = int_value.unpack_from(data, offset)
+        offset += int_value.size
+    if flags & HAS_ORIENTATION:
+        orientation, = float_value.unpack_from(data, offset)
+        offset += float_value.size
+    children = {}
+    for _ in range(num_child_lists):
+        field_index, num_children = child_list_header.unpack_from(data, offset)
+        offset += child_list_header.size
+        field_children = []
+        for _ in range(num_children):
+            child, offset = read_doc_binary(data, offset, metas)
+            field_children.append(child)
+        children[child_fields[field_index]] = field_children
+    reading_order = {index: region_id for index, region_id in meta['reading_order']} \
+        if 'reading_order' in meta else None
+    doc = make_pagexml_doc(doc_kinds[kind], doc_id, meta['type'], meta['metadata'], coords=coords,
+                           children=children, text=text, baseline=baseline, conf=conf, xheight=xheight,
+                           orientation=orientation, reading_order=reading_order)
+    return doc, offset
+
+
+def binary_to_pagexml(data: bytes) -> PageXMLDoc:
+    """Reconstruct a PageXML document serialised with pagexml_to_binary.
+
+    :param data: the binary serialisation of the document
+    :type data: bytes
+    :return: the PageXML document
+    :rtype: PageXMLDoc
+    """
+    if data[:len(binary_magic)] != binary_magic:
+        raise ValueError('data is not a binary serialised PageXML document')
+    if data[len(binary_magic)] != binary_format_version:
+        raise ValueError(f'unsupported binary format version {data[len(binary_magic)]}')
+    meta_data_length, = meta_length.unpack_from(data, len(data) - meta_length.size)
+    meta_start = len(data) - meta_length.size - meta_data_length
+    metas = iter(json.loads(data[meta_start:len(data) - meta_length.size]))
+    doc, offset = read_doc_binary(memoryview(data), len(binary_magic) + 1, metas)
+    if offset != meta_start:
+        raise ValueError(f'unexpected data after the document at byte {offset}')
+    return doc
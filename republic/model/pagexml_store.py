@@ -0,0 +1,466 @@
+from __future__ import annotations
+from array import array
+from typing import Dict, Iterable, List, Union
+import datetime
+import json
+import os
+import shutil
+
+import numpy as np
+
+from republic.model.physical_document_model import Coords, Baseline, PageXMLDoc, PageXMLPage
+from republic.model.pagexml_serializer import doc_kinds, child_fields, get_doc_kind, json_default
+from republic.model.pagexml_serializer import make_pagexml_doc
+
+
+store_format_version = 1
+
+TEXT_IS_NONE = 1
+XHEIGHT_IS_NONE = 2
+
+
+class StringColumn:
+
+    def __init__(self):
+        """A column of strings, stored as the concatenated UTF-8 bytes and the offsets of each string."""
+        self.data = bytearray()
+        self.offsets = array('q', [0])
+
+    def append(self, value: Union[None, str]) -> None:
+        if value:
+            self.data += value.encode('utf-8')
+        self.offsets.append(len(self.data))
+
+    def save(self, store_path: str, name: str) -> None:
+        np.save(os.path.join(store_path, f'{name}_data.npy'), np.frombuffer(bytes(self.data), dtype=np.uint8))
+        np.save(os.path.join(store_path, f'{name}_offsets.npy'), np.frombuffer(self.offsets, dtype=np.int64))
+
+
+class PointsColumn:
+
+    def __init__(self):
+        """A column of coordinates, stored as the concatenated x and y values of
+        the points of each document and the offsets of each document's points."""
+        self.values = array('i')
+        self.offsets = array('q', [0])
+
+    def append(self, coords: Union[None, Coords]) -> None:
+        if coords is not None:
+            # the flat array of x and y values of the coordinates
+            self.values.extend(coords._values)
+        self.offsets.append(len(self.values))
+
+    def save(self, store_path: str, name: str) -> None:
+        np.save(os.path.join(store_path, f'{name}_values.npy'), np.frombuffer(self.values, dtype=np.int32))
+        np.save(os.path.join(store_path, f'{name}_offsets.npy'), np.frombuffer(self.offsets, dtype=np.int64))
+
+
+class PageXMLStoreWriter:
+
+    def __init__(self):
+        """Collects PageXML documents (scans, pages or any other PageXML document) in columns,
+        with one row per document in the tree of each stored document, in depth-first order."""
+        self.kinds = array('b')
+        self.parents = array('i')
+        self.fields = array('b')
+        self.children: List[List[int]] = []
+        self.flags = array('B')
+        self.confs = array('d')
+        self.xheights = array('i')
+        self.orientations = array('d')
+        self.ids = StringColumn()
+        self.texts = StringColumn()
+        self.meta = StringColumn()
+        self.coords = PointsColumn()
+        self.baselines = PointsColumn()
+        self.roots: List[Dict[str, any]] = []
+        # the latest index timestamp of the stored documents, to check that the
+        # store matches the documents in Elasticsearch when it is read
+        self.max_index_timestamp: Union[None, datetime.datetime] = None
+
+    def add_doc(self, doc: PageXMLDoc) -> None:
+        """Add a document and all its descendants to the store."""
+        node = self.add_node(doc, -1, -1)
+        self.roots.append({'id': doc.id, 'kind': doc_kinds[self.kinds[node]], 'node': node})
+        index_timestamp = parse_index_timestamp(doc.metadata.get('index_timestamp') if doc.metadata else None)
+        if index_timestamp and (self.max_index_timestamp is None or index_timestamp > self.max_index_timestamp):
+            self.max_index_timestamp = index_timestamp
+
+    def add_node(self, doc: PageXMLDoc, parent: int, field: int) -> int:
+        node = len(self.kinds)
+        kind = get_doc_kind(doc)
+        self.kinds.append(kind)
+        self.parents.append(parent)
+        self.fields.append(field)
+        self.children.append([])
+        text = getattr(doc, 'text', None)
+        xheight = getattr(doc, 'xheight', None)
+        flags = (TEXT_IS_NONE if text is None else 0) | (XHEIGHT_IS_NONE if xheight is None else 0)
+        self.flags.append(flags)
+        conf = getattr(doc, 'conf', None)
+        self.confs.append(np.nan if conf is None else conf)
+        self.xheights.append(0 if xheight is None else xheight)
+        orientation = getattr(doc, 'orientation', None)
+        self.orientations.append(np.nan if orientation is None else orientation)
+        self.ids.append(doc.id)
+        self.texts.append(text)
+        meta = {'type': doc.type, 'metadata': doc.metadata}
+        if doc.reading_order:
+            # a list of pairs keeps the integer keys of the reading order
+            meta['reading_order'] = list(doc.reading_order.items())
+        self.meta.append(json.dumps(meta, default=json_default))
+        self.coords.append(doc.coords)
+        self.baselines.append(getattr(doc, 'baseline', None))
+        for field_index, field_name in enumerate(child_fields):
+            for child in getattr(doc, field_name, None) or []:
+                self.children[node].append(self.add_node(child, node, field_index))
+        return node
+
+    def save(self, store_path: str) -> None:
+        """Write the store to store_path, replacing an existing store only when
+        all columns are written."""
+        temp_path = f'{store_path}.{os.getpid()}.tmp'
+        if os.path.isdir(temp_path):
+            shutil.rmtree(temp_path)
+        os.makedirs(temp_path)
+        child_offsets = np.cumsum([0] + [len(children) for children in self.children], dtype=np.int64)
+        child_nodes = np.array([child for children in self.children for child in children], dtype=np.int32)
+        columns = {
+            'kinds': np.frombuffer(self.kinds, dtype=np.int8),
+            'parents': np.frombuffer(self.parents, dtype=np.int32),
+            'fields': np.frombuffer(self.fields, dtype=np.int8),
+            'child_offsets': child_offsets,
+            'child_nodes': child_nodes,
+            'flags': np.frombuffer(self.flags, dtype=np.uint8),
+            'confs': np.frombuffer(self.confs, dtype=np.float64),
+            'xheights': np.frombuffer(self.xheights, dtype=np.int32),
+            'orientations': np.frombuffer(self.orientations, dtype=np.float64),
+        }
+        for name, column in columns.items():
+            np.save(os.path.join(temp_path, f'{name}.npy'), column)
+        for name in ['ids', 'texts', 'meta']:
+            getattr(self, name).save(temp_path, name)
+        for name in ['coords', 'baselines']:
+            getattr(self, name).save(temp_path, name)
+        manifest = {
+            'format_version': store_format_version,
+            'num_nodes': len(self.kinds),
+            'roots': self.roots,
+            'created': datetime.datetime.now().isoformat(),
+            'max_index_timestamp': self.max_index_timestamp.isoformat() if self.max_index_timestamp else None,
+        }
+        with open(os.path.join(temp_path, 'manifest.json'), 'wt') as fh:
+            json.dump(manifest, fh)
+        if os.path.isdir(store_path):
+            shutil.rmtree(store_path)
+        os.replace(temp_path, store_path)
+
+
+def parse_index_timestamp(value: Union[None, str, datetime.datetime]) -> Union[None, datetime.datetime]:
+    """Return an index timestamp as a naive UTC datetime, as Elasticsearch interprets
+    timestamps without a timezone as UTC."""
+    if value is None:
+        return None
+    timestamp = datetime.datetime.fromisoformat(value) if isinstance(value, str) else value
+    if timestamp.tzinfo is not None:
+        timestamp = timestamp.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+    return timestamp
+
+
+def get_timestamp_millis(timestamp: datetime.datetime) -> int:
+    """Return a naive UTC datetime in milliseconds since the epoch, the precision of
+    Elasticsearch dates."""
+    return (timestamp - datetime.datetime(1970, 1, 1)) // datetime.timedelta(milliseconds=1)
+
+
+def store_matches_source(store: PageXMLStore, source_max_index_millis: Union[None, int]) -> bool:
+    """Check if a store holds the latest version of its documents, by comparing the latest
+    index timestamp of the stored documents with that of the documents in Elasticsearch.
+    A store without an index timestamp (e.g. written before it was recorded) never matches.
+
+    :param store: the store to check
+    :type store: PageXMLStore
+    :param source_max_index_millis: the latest index timestamp in Elasticsearch, in milliseconds
+    :type source_max_index_millis: Union[None, int]
+    :return: whether the store matches the documents in Elasticsearch
+    :rtype: bool
+    """
+    store_timestamp = parse_index_timestamp(store.manifest.get('max_index_timestamp'))
+    if store_timestamp is None or source_max_index_millis is None:
+        return False
+    return get_timestamp_millis(store_timestamp) == source_max_index_millis
+
+
+def write_pagexml_store(docs: Iterable[PageXMLDoc], store_path: str) -> int:
+    """Write PageXML documents to a columnar store in directory store_path.
+
+    :param docs: the PageXML documents to store, e.g. the scans or pages of an inventory
+    :type docs: Iterable[PageXMLDoc]
+    :param store_path: the directory to write the store to
+    :type store_path: str
+    :return: the number of stored documents
+    :rtype: int
+    """
+    writer = PageXMLStoreWriter()
+    for doc in docs:
+        writer.add_doc(doc)
+    writer.save(store_path)
+    return len(writer.roots)
+
+
+class StoredDoc:
+
+    __slots__ = ['store', 'node']
+
+    def __init__(self, store: PageXMLStore, node: int):
+        """A lightweight view of a document in a store, that reads its fields
+        from the store columns on demand."""
+        self.store = store
+        self.node = node
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}(kind="{self.kind}", id="{self.id}")'
+
+    @property
+    def kind(self) -> str:
+        return doc_kinds[self.store.kinds[self.node]]
+
+    @property
+    def id(self) -> Union[None, str]:
+        return self.store.get_string('ids', self.node) or None
+
+    @property
+    def text(self) -> Union[None, str]:
+        if self.store.flags[self.node] & TEXT_IS_NONE:
+            return None
+        return self.store.get_string('texts', self.node)
+
+    @property
+    def type(self) -> Union[str, List[str]]:
+        return self.store.get_meta(self.node)['type']
+
+    @property
+    def metadata(self) -> Dict[str, any]:
+        return self.store.get_meta(self.node)['metadata']
+
+    @property
+    def coords(self) -> Union[None, Coords]:
+        return self.store.get_coords('coords', self.node)
+
+    @property
+    def baseline(self) -> Union[None, Baseline]:
+        return self.store.get_coords('baselines', self.node)
+
+    @property
+    def children(self) -> List[StoredDoc]:
+        return [StoredDoc(self.store, child) for child in self.store.get_child_nodes(self.node)]
+
+    def iter_lines(self) -> Iterable[StoredDoc]:
+        """Iterate over the lines of this document and its descendants, in document order."""
+        for node in self.store.iter_descendant_nodes(self.node):
+            if self.store.kinds[node] == doc_kinds.index('line'):
+                yield StoredDoc(self.store, node)
+
+    def to_doc(self) -> PageXMLDoc:
+        """Reconstruct the full PageXML document object."""
+        return self.store.make_doc(self.node)
+
+
+class PageXMLStore:
+
+    def __init__(self, store_path: str, mmap: bool = True):
+        """Read a columnar store of PageXML documents written by write_pagexml_store. The
+        columns are memory-mapped, so opening a store is cheap and only the documents that
+        are accessed are read from disk.
+
+        :param store_path: the directory of the store
+        :type store_path: str
+        :param mmap: whether to memory-map the columns or read them into memory
+        :type mmap: bool
+        """
+        self.store_path = store_path
+        with open(os.path.join(store_path, 'manifest.json'), 'rt') as fh:
+            self.manifest = json.load(fh)
+        if self.manifest['format_version'] != store_format_version:
+            raise ValueError(f"unsupported store format version {self.manifest['format_version']}")
+        mmap_mode = 'r' if mmap else None
+        column_names = ['kinds', 'parents', 'fields', 'child_offsets', 'child_nodes', 'flags', 'confs',
+                        'xheights', 'orientations', 'ids_data', 'ids_offsets', 'texts_data', 'texts_offsets',
+                        'meta_data', 'meta_offsets', 'coords_values', 'coords_offsets', 'baselines_values',
+                        'baselines_offsets']
+        self.columns = {name: np.load(os.path.join(store_path, f'{name}.npy'), mmap_mode=mmap_mode)
+                        for name in column_names}
+        # small columns that are accessed per node are converted to lists for fast scalar access
+        self.kinds = self.columns['kinds'].tolist()
+        self.flags = self.columns['flags'].tolist()
+        self.roots = self.manifest['roots']
+        self.root_index = {root['id']: root['node'] for root in self.roots}
+        # the documents are stored depth-first, so the tree of a root ends where the next root starts
+        root_nodes = [root['node'] for root in self.roots]
+        self.root_ends = dict(zip(root_nodes, root_nodes[1:] + [self.manifest['num_nodes']]))
+
+    def __len__(self):
+        return len(self.roots)
+
+    @property
+    def doc_ids(self) -> List[str]:
+        return [root['id'] for root in self.roots]
+
+    def get_string(self, column: str, node: int) -> str:
+        offsets = self.columns[f'{column}_offsets']
+        start, end = offsets[node], offsets[node + 1]
+        return self.columns[f'{column}_data'][start:end].tobytes().decode('utf-8')
+
+    def get_strings(self, column: str, start: int, end: int) -> List[str]:
+        """Return the strings of nodes start to end, reading the bytes of all nodes at once."""
+        offsets = self.columns[f'{column}_offsets'][start:end + 1].tolist()
+        data = self.columns[f'{column}_data'][offsets[0]:offsets[-1]].tobytes()
+        base = offsets[0]
+        return [data[offsets[i] - base:offsets[i + 1] - base].decode('utf-8') for i in range(end - start)]
+
+    def get_meta(self, node: int) -> Dict[str, any]:
+        return json.loads(self.get_string('meta', node))
+
+    def get_coords(self, column: str, node: int) -> Union[None, Coords]:
+        offsets = self.columns[f'{column}_offsets']
+        start, end = offsets[node], offsets[node + 1]
+        if start == end:
+            return None
+        values = array('i', self.columns[f'{column}_values'][start:end].tobytes())
+        return Baseline(values) if column == 'baselines' else Coords(values)
+
+    def get_coords_list(self, column: str, start: int, end: int) -> List[Union[None, Coords]]:
+        """Return the coordinates of nodes start to end, reading the values of all nodes at once."""
+        offsets = self.columns[f'{column}_offsets'][start:end + 1].tolist()
+        values = array('i', self.columns[f'{column}_values'][offsets[0]:offsets[-1]].tobytes())
+        base = offsets[0]
+        coords_class = Baseline if column == 'baselines' else Coords
+        return [coords_class(values[offsets[i] - base:offsets[i + 1] - base])
+                if offsets[i + 1] > offsets[i] else None for i in range(end - start)]
+
+    def get_child_nodes(self, node: int) -> List[int]:
+        offsets = self.columns['child_offsets']
+        return self.columns['child_nodes'][offsets[node]:offsets[node + 1]].tolist()
+
+    def get_subtree_end(self, node: int) -> int:
+        if node in self.root_ends:
+            return self.root_ends[node]
+        subtree_end = node + 1
+        for descendant in self.iter_descendant_nodes(node):
+            subtree_end = descendant + 1
+        return subtree_end
+
+    def iter_descendant_nodes(self, node: int) -> Iterable[int]:
+        # nodes are stored depth-first, so the descendants of a node follow it, up to the
+        # next node that is not a descendant, and can be iterated without recursion
+        parents = self.columns['parents']
+        ancestors = {node}
+        for descendant in range(node + 1, self.manifest['num_nodes']):
+            if int(parents[descendant]) not in ancestors:
+                break
+            ancestors.add(descendant)
+            yield descendant
+
+    def get_view(self, doc_id: str) -> StoredDoc:
+        return StoredDoc(self, self.root_index[doc_id])
+
+    def iter_views(self) -> Iterable[StoredDoc]:
+        for root in self.roots:
+            yield StoredDoc(self, root['node'])
+
+    def get_doc(self, doc_id: str) -> PageXMLDoc:
+        """Return the full PageXML document with the given id."""
+        return self.make_doc(self.root_index[doc_id])
+
+    def iter_docs(self) -> Iterable[PageXMLDoc]:
+        """Iterate over the full PageXML documents in the order in which they were stored."""
+        for root in self.roots:
+            yield self.make_doc(root['node'])
+
+    def make_doc(self, node: int) -> PageXMLDoc:
+        """Reconstruct the full PageXML document of a node and its descendants. The
+        columns of all nodes in the tree are read at once and the documents are
+        constructed bottom-up, so that each document is constructed with its children."""
+        start, end = node, self.get_subtree_end(node)
+        ids = self.get_strings('ids', start, end)
+        texts = self.get_strings('texts', start, end)
+        metas = json.loads('[' + ','.join(self.get_strings('meta', start, end)) + ']')
+        coords_list = self.get_coords_list('coords', start, end)
+        baselines = self.get_coords_list('baselines', start, end)
+        fields = self.columns['fields'][start:end].tolist()
+        confs = self.columns['confs'][start:end].tolist()
+        xheights = self.columns['xheights'][start:end].tolist()
+        orientations = self.columns['orientations'][start:end].tolist()
+        child_offsets = self.columns['child_offsets'][start:end + 1].tolist()
+        child_nodes = self.columns['child_nodes'][child_offsets[0]:child_offsets[-1]].tolist()
+        docs: List[Union[None, PageXMLDoc]] = [None] * (end - start)
+        # children are stored after their parents, so in reverse order they are constructed first
+        for i in range(end - start - 1, -1, -1):
+            kind = doc_kinds[self.kinds[start + i]]
+            flags = self.flags[start + i]
+            meta = metas[i]
+            doc_id = ids[i] or None
+            text = None if flags & TEXT_IS_NONE else texts[i]
+            children = {field: [] for field in child_fields}
+            for child in child_nodes[child_offsets[i] - child_offsets[0]:child_offsets[i + 1] - child_offsets[0]]:
+                children[child_fields[fields[child - start]]].append(docs[child - start])
+            reading_order = {index: region_id for index, region_id in meta['reading_order']} \
+                if 'reading_order' in meta else None
+            doc = make_pagexml_doc(kind, doc_id, meta['type'], meta['metadata'], coords=coords_list[i],
+                                   children=children, text=text, baseline=baselines[i],
+                                   conf=None if np.isnan(confs[i]) else confs[i],
+                                   xheight=None if flags & XHEIGHT_IS_NONE else xheights[i],
+                                   orientation=None if np.isnan(orientations[i]) else orientations[i],
+                                   reading_order=reading_order)
+            docs[i] = doc
+        return docs[0]
+
+
+def has_page_type(metadata: Dict[str, any], page_type: str) -> bool:
+    """Check if the type or page_type metadata of a page includes page_type."""
+    for field in ['type', 'page_type']:
+        field_types = metadata.get(field)
+        if field_types == page_type or (isinstance(field_types, list) and page_type in field_types):
+            return True
+    return False
+
+
+def get_inventory_store_path(config: dict, doc_kind: str) -> Union[None, str]:
+    """Return the path of the store with the scans or pages of the inventory in the config,
+    or None if no store directory is configured with 'pagexml_store_dir'."""
+    if not config.get('pagexml_store_dir'):
+        return None
+    return os.path.join(config['pagexml_store_dir'], f"{config['inventory_num']}-{doc_kind}s")
+
+
+def read_inventory_store(config: dict, doc_kind: str) -> Union[None, PageXMLStore]:
+    """Return the store with the scans or pages of the inventory in the config,
+    or None if there is no such store."""
+    store_path = get_inventory_store_path(config, doc_kind)
+    if store_path is None or not os.path.isfile(os.path.join(store_path, 'manifest.json')):
+        return None
+    return PageXMLStore(store_path)
+
+
+def make_inventory_store_writer(config: dict) -> Union[None, PageXMLStoreWriter]:
+    """Return a store writer if a store directory is configured, otherwise None."""
+    return PageXMLStoreWriter() if config.get('pagexml_store_dir') else None
+
+
+def save_inventory_store(writer: Union[None, PageXMLStoreWriter], config: dict, doc_kind: str) -> Union[None, str]:
+    """Save the scans or pages of the inventory in the config that were added to
+    the writer, and return the path of the store."""
+    if writer is None:
+        return None
+    store_path = get_inventory_store_path(config, doc_kind)
+    os.makedirs(config['pagexml_store_dir'], exist_ok=True)
+    writer.save(store_path)
+    print(f"Stored {len(writer.roots)} {doc_kind}s of inventory {config['inventory_num']} in {store_path}")
+    return store_path
+
+
+def get_store_pages_by_type(store: PageXMLStore, page_type: str) -> List[PageXMLPage]:
+    """Return the pages of a store with the given page type, sorted by page number. Only
+    the metadata is read for pages of other types."""
+    pages = [view.to_doc() for view in store.iter_views() if has_page_type(view.metadata, page_type)]
+    return sorted(pages, key=lambda page: page.metadata['page_num'])
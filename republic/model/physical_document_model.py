@@ -1,12 +1,11 @@
 from __future__ import annotations
 from typing import Dict, Generator, List, Set, Tuple, Union
-from collections import defaultdict
 from collections import Counter
+from array import array
 import string
 import re
 
 import numpy as np
-from scipy.spatial import ConvexHull
 
 
 def parse_points(points: Union[str, List[Tuple[int, int]]]) -> List[Tuple[int, int]]:
@@ -155,14 +154,15 @@ def average_baseline_height(baseline: Baseline) -> int:
     :rtype: int
     """
     total_avg = 0
+    points = baseline.points
     # iterate over each subsequent pair of baseline points
-    for ci, curr_point in enumerate(baseline.points[:-1]):
-        next_point = baseline.points[ci + 1]
+    for ci, curr_point in enumerate(points[:-1]):
+        next_point = points[ci + 1]
         segment_avg = (curr_point[1] + next_point[1]) / 2
         # segment contributes its average height times its width
         total_avg += segment_avg * (next_point[0] - curr_point[0])
     # average is total of average heights divided by total width
-    return int(total_avg / (baseline.points[-1][0] - baseline.points[0][0]))
+    return int(total_avg / (points[-1][0] - points[0][0]))
 
 
 def get_textregion_line_distances(text_region: PageXMLTextRegion) -> List[np.ndarray]:
@@ -334,13 +334,28 @@ def pretty_print_textregion(text_region: PageXMLTextRegion, print_stats: bool =
 
 class Coords:
 
-    def __init__(self, points: Union[str, List[Tuple[int, int]]]):
-        self.points: List[Tuple[int, int]] = parse_points(points)
-        self.point_string = " ".join([",".join([str(point[0]), str(point[1])]) for point in self.points])
-        self.x = min([point[0] for point in self.points])
-        self.y = min([point[1] for point in self.points])
-        self.w = max([point[0] for point in self.points]) - self.x
-        self.h = max([point[1] for point in self.points]) - self.y
+    __slots__ = ['_values', '_point_string', 'x', 'y', 'w', 'h', 'type']
+
+    def __init__(self, points: Union[str, List[Tuple[int, int]], array]):
+        """The points are stored in a flat array of integers, alternating x and y, and the
+        bounding box is computed once. The point string and the list of point tuples are
+        derived on demand. Points can also be given as such a flat array."""
+        if isinstance(points, str):
+            values = points.replace(' ', ',').split(',')
+            if len(values) % 2 != 0:
+                raise ValueError(f"invalid point string: {points}")
+            self._values = array('i', [int(value) for value in values])
+        elif isinstance(points, array):
+            self._values = points
+        else:
+            self._values = array('i', [value for point in parse_points(points) for value in point[:2]])
+        xs = self._values[0::2]
+        ys = self._values[1::2]
+        self.x = min(xs)
+        self.y = min(ys)
+        self.w = max(xs) - self.x
+        self.h = max(ys) - self.y
+        self._point_string: Union[None, str] = None
         self.type = "coords"
 
     def __repr__(self):
@@ -349,6 +364,16 @@ class Coords:
     def __str__(self):
         return self.__repr__()
 
+    @property
+    def points(self) -> List[Tuple[int, int]]:
+        return list(zip(self._values[0::2], self._values[1::2]))
+
+    @property
+    def point_string(self) -> str:
+        if self._point_string is None:
+            self._point_string = " ".join([f"{x},{y}" for x, y in zip(self._values[0::2], self._values[1::2])])
+        return self._point_string
+
     @property
     def json(self):
         return {
@@ -387,7 +412,9 @@ class Coords:
 
 class Baseline(Coords):
 
-    def __init__(self, points: Union[str, List[Tuple[int, int]]]):
+    __slots__ = []
+
+    def __init__(self, points: Union[str, List[Tuple[int, int]], array]):
         super().__init__(points)
         self.type = "baseline"
 
@@ -396,13 +423,14 @@ def find_baseline_overlap_start_indexes(baseline1: Baseline, baseline2: Baseline
     """Find the first point in each baseline where the two start to horizontally overlap."""
     baseline1_start_index = 0
     baseline2_start_index = 0
-    for bi1, p1 in enumerate(baseline1.points):
-        if bi1 < len(baseline1.points) - 1 and baseline1.points[bi1 + 1][0] < baseline2.points[0][0]:
+    points1, points2 = baseline1.points, baseline2.points
+    for bi1, p1 in enumerate(points1):
+        if bi1 < len(points1) - 1 and points1[bi1 + 1][0] < points2[0][0]:
             continue
         baseline1_start_index = bi1
         break
-    for bi2, p2 in enumerate(baseline2.points):
-        if bi2 < len(baseline2.points) - 1 and baseline2.points[bi2 + 1][0] < baseline1.points[0][0]:
+    for bi2, p2 in enumerate(points2):
+        if bi2 < len(points2) - 1 and points2[bi2 + 1][0] < points1[0][0]:
             continue
         baseline2_start_index = bi2
         break
@@ -415,20 +443,21 @@ def baseline_is_below(baseline1: Baseline, baseline2: Baseline) -> bool:
     num_overlap = 0
     # find the indexes of the first baseline points where the two lines horizontally overlap
     index1, index2 = find_baseline_overlap_start_indexes(baseline1, baseline2)
+    points1, points2 = baseline1.points, baseline2.points
     while True:
         # check if the current baseline point of line 1 is below that of the one of line 2
-        if baseline1.points[index1][1] > baseline2.points[index2][1]:
+        if points1[index1][1] > points2[index2][1]:
             num_below += 1
         num_overlap += 1
         # Check which baseline index to move forward for the next test
-        if baseline1.points[index1][0] <= baseline2.points[index2][0]:
+        if points1[index1][0] <= points2[index2][0]:
             # if current point of baseline 1 is to the left of the current point of baseline 2
             # move to the next point of baseline 1
             index1 += 1
         else:
             # otherwise, move to the next points of baseline 2
             index2 += 1
-        if len(baseline1.points) == index1 or len(baseline2.points) == index2:
+        if len(points1) == index1 or len(points2) == index2:
             # if the end of one of the baselines is reached, counting is done
             break
     # baseline 1 is below baseline 2 if the majority of
@@ -460,41 +489,95 @@ def same_column(line1: PageXMLDoc, line2: PageXMLDoc) -> bool:
         return horizontal_overlap(line1.coords, line2.coords) > (line1.coords.w / 2)
 
 
-def parse_derived_coords(document_list: list) -> Coords:
+def parse_derived_coords(document_list: list, hull_type: str = 'convex') -> Coords:
     """Derive scan coordinates for a composite document based on the list of documents it contains.
-    A convex hull is drawn around all points of all contained documents."""
-    return coords_list_to_hull_coords([document.coords for document in document_list])
-
-
-def coords_list_to_hull_coords(coords_list):
-    points = np.array([point for coords in coords_list for point in coords.points])
-    edges = points_to_hull_edges(points)
-    hull_points = edges_to_hull_points(edges)
-    return Coords(hull_points)
-
-
-def points_to_hull_edges(points):
-    hull = ConvexHull(points)
-    edges = defaultdict(dict)
-    for simplex in hull.simplices:
-        p1 = (int(points[simplex, 0][0]), int(points[simplex, 1][0]))
-        p2 = (int(points[simplex, 0][1]), int(points[simplex, 1][1]))
-        edges[p2][p1] = 1
-        edges[p1][p2] = 1
-    return edges
-
-
-def edges_to_hull_points(edges):
-    nodes = list(edges.keys())
-    curr_point = sorted(nodes)[0]
-    sorted_nodes = [curr_point]
-    while len(sorted_nodes) < len(nodes):
-        for next_point in edges[curr_point]:
-            if next_point not in sorted_nodes:
-                sorted_nodes.append(next_point)
-                curr_point = next_point
+    A convex hull is drawn around all points of all contained documents, or with hull_type 'bbox',
+    the bounding box around all contained documents is used, which is cheaper if the exact hull
+    is not needed."""
+    return coords_list_to_hull_coords([document.coords for document in document_list], hull_type=hull_type)
+
+
+def coords_list_to_hull_coords(coords_list: List[Coords], hull_type: str = 'convex') -> Coords:
+    """Derive coordinates that enclose all the given coordinates, either as a convex hull
+    of all their points (hull_type 'convex') or as the bounding box around them (hull_type 'bbox')."""
+    if hull_type == 'bbox':
+        return Coords(coords_list_to_bounding_box_points(coords_list))
+    elif hull_type == 'convex':
+        return Coords(points_to_hull_points(coords_list_to_point_array(coords_list)))
+    else:
+        raise ValueError(f"unknown hull_type {hull_type}, must be 'convex' or 'bbox'")
+
+
+def coords_list_to_point_array(coords_list: List[Coords]) -> np.ndarray:
+    """Return an (n, 2) array of all the points of a list of coordinates."""
+    values = np.concatenate([np.frombuffer(coords._values, dtype=np.int32) for coords in coords_list])
+    return values.astype(np.int64).reshape(-1, 2)
+
+
+def coords_list_to_bounding_box_points(coords_list: List[Coords]) -> List[Tuple[int, int]]:
+    """Return the corner points of the bounding box around a list of coordinates, using
+    the precomputed bounding box of each coordinates object instead of all their points."""
+    left = min(coords.left for coords in coords_list)
+    right = max(coords.right for coords in coords_list)
+    top = min(coords.top for coords in coords_list)
+    bottom = max(coords.bottom for coords in coords_list)
+    return [(left, top), (right, top), (right, bottom), (left, bottom)]
+
+
+def half_hull(points: List[Tuple[int, int]]) -> List[Tuple[int, int]]:
+    """Return the chain of points that only makes counter-clockwise turns when walking
+    through the points in the given order."""
+    chain = []
+    for point in points:
+        px, py = point
+        while len(chain) >= 2:
+            (ox, oy), (ax, ay) = chain[-2], chain[-1]
+            if (ax - ox) * (py - oy) - (ay - oy) * (px - ox) > 0:
                 break
-    return sorted_nodes
+            chain.pop()
+        chain.append(point)
+    return chain
+
+
+def monotone_chain(points: List[Tuple[int, int]]) -> List[Tuple[int, int]]:
+    """Return the convex hull of a sorted list of unique points, starting at the first point."""
+    if len(points) <= 2:
+        return points
+    lower = half_hull(points)
+    upper = half_hull(reversed(points))
+    # the last point of each chain is the first point of the other chain
+    return lower[:-1] + upper[:-1]
+
+
+def points_to_hull_points(points: Union[np.ndarray, List[Tuple[int, int]]]) -> List[Tuple[int, int]]:
+    """Return the points of the convex hull of a list or (n, 2) array of integer points.
+    The hull starts at the point with the lowest x (and lowest y for ties) and collinear
+    points on the hull edges are left out.
+
+    Points that lie strictly inside the polygon spanned by the extreme points in eight
+    directions cannot be on the hull, so they are discarded with a vectorised test before
+    the remaining points are passed to the monotone chain algorithm."""
+    if len(points) == 0:
+        return []
+    points = np.asarray(points, dtype=np.int64).reshape(-1, 2)
+    xs, ys = points[:, 0], points[:, 1]
+    extremes = [xs.argmin(), (xs + ys).argmin(), ys.argmin(), (xs - ys).argmax(),
+                xs.argmax(), (xs + ys).argmax(), ys.argmax(), (xs - ys).argmin()]
+    polygon = monotone_chain(sorted(set(tuple(point) for point in points[extremes].tolist())))
+    if len(polygon) >= 3:
+        inside = np.ones(len(points), dtype=bool)
+        for (ax, ay), (bx, by) in zip(polygon, polygon[1:] + polygon[:1]):
+            inside &= (bx - ax) * (ys - ay) - (by - ay) * (xs - ax) > 0
+        points = points[~inside]
+    # sort by x and then y. Of the points with the same x, only the lowest and highest
+    # can be on the hull, the points in between are on a vertical segment.
+    points = points[np.lexsort((points[:, 1], points[:, 0]))]
+    new_x = points[1:, 0] != points[:-1, 0]
+    keep = np.concatenate(([True], new_x)) | np.concatenate((new_x, [True]))
+    points = points[keep]
+    # remove duplicate points
+    points = points[np.concatenate(([True], (points[1:] != points[:-1]).any(axis=1)))]
+    return monotone_chain(list(map(tuple, points.tolist())))
 
 
 class StructureDoc:
@@ -630,6 +713,17 @@ class PageXMLDoc(PhysicalStructureDoc):
         self.coords: Union[None, Coords] = coords
         self.add_type(doc_type)
         self.main_type = 'pagexml_doc'
+        # the cached line and word counts of the stats
+        self._counts: Union[None, Tuple[int, int]] = None
+
+    def invalidate_counts(self) -> None:
+        """Clear the cached line and word counts of this document and its ancestors. This
+        is done by add_child, but must be done explicitly after changing the lines, text
+        regions, columns or words of a document in any other way, once its stats are used."""
+        doc = self
+        while doc is not None:
+            doc._counts = None
+            doc = doc.parent
 
 
 class PageXMLWord(PageXMLDoc):
@@ -692,9 +786,18 @@ class PageXMLTextLine(PageXMLDoc):
         else:
             return []
 
+    def get_counts(self) -> Tuple[int, int]:
+        """Return the number of lines and words of the line, as counted by the stats
+        of text regions. The counts are cached until they are invalidated."""
+        counts = self._counts
+        if counts is None:
+            counts = (1, len(self.get_words()))
+            self._counts = counts
+        return counts
+
     @property
     def num_words(self):
-        return len(self.get_words())
+        return self.get_counts()[1]
 
     def is_below(self, other: PageXMLTextLine) -> bool:
         """Test if the baseline of this line is directly below the baseline of the other line."""
@@ -763,6 +866,7 @@ class PageXMLTextRegion(PageXMLDoc):
             self.text_regions.append(child)
         else:
             raise TypeError(f'unknown child type: {child.__class__.__name__}')
+        self.invalidate_counts()
 
     @property
     def json(self) -> Dict[str, any]:
@@ -824,13 +928,32 @@ class PageXMLTextRegion(PageXMLDoc):
                     words += line.text.split(' ')
         return words
 
+    def get_counts(self) -> Tuple[int, int]:
+        """Return the number of lines and words of the text region and its nested text
+        regions, the same as the lengths of get_lines and get_words. The counts are
+        computed from the cached counts of the children, so computing the stats of all
+        documents in a tree is linear in its size, and cached until they are invalidated."""
+        counts = self._counts
+        if counts is None:
+            num_lines, num_words = 0, 0
+            for text_region in self.text_regions:
+                region_lines, region_words = text_region.get_counts()
+                num_lines += region_lines
+                num_words += region_words
+            for line in self.lines:
+                num_lines += 1
+                num_words += line.get_counts()[1]
+            counts = (num_lines, num_words)
+            self._counts = counts
+        return counts
+
     @property
     def num_lines(self):
-        return len(self.get_lines())
+        return self.get_counts()[0]
 
     @property
     def num_words(self):
-        return len(self.get_words())
+        return self.get_counts()[1]
 
     @property
     def num_text_regions(self):
@@ -838,9 +961,10 @@ class PageXMLTextRegion(PageXMLDoc):
 
     @property
     def stats(self):
+        num_lines, num_words = self.get_counts()
         return {
-            'lines': self.num_lines,
-            'words': self.num_words,
+            'lines': num_lines,
+            'words': num_words,
             'text_regions': self.num_text_regions
         }
 
@@ -858,16 +982,6 @@ class PageXMLColumn(PageXMLTextRegion):
         if doc_type:
             self.add_type(doc_type)
 
-    @property
-    def json(self) -> Dict[str, any]:
-        doc_json = super().json
-        if self.lines:
-            doc_json['lines'] = [line.json for line in self.lines]
-        if self.text_regions:
-            doc_json['text_regions'] = [text_region.json for text_region in self.text_regions]
-        doc_json['stats'] = self.stats
-        return doc_json
-
     @property
     def stats(self):
         stats = super().stats
@@ -905,14 +1019,12 @@ class PageXMLPage(PageXMLTextRegion):
                 self.text_regions.append(child)
         else:
             raise TypeError(f'unknown child type: {child.__class__.__name__}')
+        self.invalidate_counts()
 
     @property
     def json(self) -> Dict[str, any]:
+        # the json of text regions includes the lines, text regions and stats
         doc_json = super().json
-        if self.lines:
-            doc_json['lines'] = [line.json for line in self.lines]
-        if self.text_regions:
-            doc_json['text_regions'] = [text_region.json for text_region in self.text_regions]
         if self.columns:
             doc_json['columns'] = [column.json for column in self.columns]
         if self.extra:
@@ -924,9 +1036,9 @@ class PageXMLPage(PageXMLTextRegion):
     def stats(self):
         stats = super().stats
         for column in self.columns:
-            column_stats = column.stats
-            for field in ['lines', 'words']:
-                stats[field] += column_stats[field]
+            column_lines, column_words = column.get_counts()
+            stats['lines'] += column_lines
+            stats['words'] += column_words
         stats['columns'] = len(self.columns)
         stats['extra'] = len(self.extra)
         return stats
@@ -960,14 +1072,12 @@ class PageXMLScan(PageXMLTextRegion):
             self.text_regions.append(child)
         elif isinstance(child, PageXMLTextLine):
             self.lines.append(child)
+        self.invalidate_counts()
 
     @property
     def json(self) -> Dict[str, any]:
+        # the json of text regions includes the lines, text regions and stats
         doc_json = super().json
-        if self.lines:
-            doc_json['lines'] = [line.json for line in self.lines]
-        if self.text_regions:
-            doc_json['text_regions'] = [text_region.json for text_region in self.text_regions]
         if self.columns:
             doc_json['columns'] = [line.json for line in self.columns]
         if self.pages:
@@ -987,8 +1097,10 @@ class PageXMLScan(PageXMLTextRegion):
 def sort_regions_in_reading_order(doc: PageXMLDoc) -> List[PageXMLTextRegion]:
     doc_text_regions: List[PageXMLTextRegion] = []
     if doc.reading_order and hasattr(doc, 'text_regions'):
-        text_region_ids = [region for _index, region in sorted(doc.reading_order.items(), key=lambda x: x[0])]
-        return [tr for tr in sorted(doc.text_regions, key=lambda x: text_region_ids.index(x))]
+        # the rank of each text region id, text regions that are not in the reading order go last
+        region_rank = {region_id: rank for rank, (_index, region_id)
+                       in enumerate(sorted(doc.reading_order.items(), key=lambda x: x[0]))}
+        return sorted(doc.text_regions, key=lambda x: region_rank.get(x.id, len(region_rank)))
     if hasattr(doc, 'columns') and doc.columns:
         doc_text_regions = doc.columns
     elif hasattr(doc, 'text_regions') and doc.text_regions:
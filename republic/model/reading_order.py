@@ -0,0 +1,176 @@
+from __future__ import annotations
+from typing import Dict, Generator, List
+
+from republic.model.physical_document_model import PageXMLDoc, PageXMLTextLine, PageXMLTextRegion
+from republic.model.physical_document_model import baseline_is_below, sort_regions_in_reading_order
+
+
+class LineBox:
+
+    __slots__ = ['line', 'index', 'top', 'bottom', 'left', 'right',
+                 'baseline_top', 'baseline_bottom', 'baseline_left', 'baseline_right']
+
+    def __init__(self, line: PageXMLTextLine, index: int):
+        """The bounding boxes of the coordinates and baseline of a line, computed once, so
+        that lines can be compared without going through their coordinate objects. Lines
+        without a baseline use their coordinates instead."""
+        self.line = line
+        self.index = index
+        self.top = line.coords.top
+        self.bottom = line.coords.bottom
+        self.left = line.coords.left
+        self.right = line.coords.right
+        baseline = line.baseline if line.baseline else line.coords
+        self.baseline_top = baseline.top
+        self.baseline_bottom = baseline.bottom
+        self.baseline_left = baseline.left
+        self.baseline_right = baseline.right
+
+    def is_below(self, other: LineBox) -> bool:
+        """Test if this line is directly below the other line, like PageXMLTextLine.is_below."""
+        if min(self.baseline_right, other.baseline_right) <= max(self.baseline_left, other.baseline_left):
+            # no horizontal overlap
+            return False
+        if self.baseline_bottom < other.baseline_top:
+            return False
+        if self.baseline_top > other.baseline_bottom:
+            # all points of this baseline are below all points of the other,
+            # so there is no need to compare the baseline points
+            return True
+        if self.line.baseline and other.line.baseline:
+            return baseline_is_below(self.line.baseline, other.line.baseline)
+        return self.top + self.bottom > other.top + other.bottom
+
+    def is_next_to(self, other: LineBox) -> bool:
+        """Test if this line is vertically aligned with the other line, like PageXMLTextLine.is_next_to."""
+        if min(self.bottom, other.bottom) <= max(self.top, other.top):
+            # no vertical overlap
+            return False
+        if min(self.right, other.right) - max(self.left, other.left) > 40:
+            # too much horizontal overlap
+            return False
+        if self.baseline_top > other.baseline_bottom + 10:
+            return False
+        if self.baseline_bottom < other.baseline_top - 10:
+            return False
+        return True
+
+
+def split_column_bands(boxes: List[LineBox], min_band_lines: int = 3) -> List[List[LineBox]]:
+    """Split the lines of a text region into column bands, left to right. A band is a group of
+    lines whose horizontal extents overlap, directly or through other lines, so bands are
+    separated by vertical gutters that no line crosses. The bands are found in a single sweep
+    over the lines sorted by their left side. If any band has fewer than min_band_lines lines,
+    e.g. a line that is split in two parts or a short note in the margin, the region is treated
+    as a single column. A line that spans several columns, like a heading, joins them into one band.
+
+    :param boxes: the line boxes of a text region
+    :type boxes: List[LineBox]
+    :param min_band_lines: the minimum number of lines of each band
+    :type min_band_lines: int
+    :return: the column bands, each a list of line boxes
+    :rtype: List[List[LineBox]]
+    """
+    bands: List[List[LineBox]] = []
+    band_right = None
+    for box in sorted(boxes, key=lambda x: (x.left, x.index)):
+        if band_right is None or box.left >= band_right:
+            bands.append([box])
+            band_right = box.right
+        else:
+            bands[-1].append(box)
+            band_right = max(band_right, box.right)
+    if len(bands) > 1 and min(len(band) for band in bands) < min_band_lines:
+        return [boxes]
+    return bands
+
+
+def stack_band_lines(band: List[LineBox]) -> List[List[LineBox]]:
+    """Group the lines of a column band into rows from top to bottom. Each line is compared
+    only to the last line of the current row: a line that is below it starts a new row, a
+    line that is next to it is added to the row."""
+    # the index breaks ties, so lines with the same top keep their document order
+    boxes = sorted(band, key=lambda x: (x.top, x.index))
+    rows = [[boxes[0]]]
+    for box in boxes[1:]:
+        prev_box = rows[-1][-1]
+        if box.is_below(prev_box):
+            rows.append([box])
+        elif box.is_next_to(prev_box):
+            rows[-1].append(box)
+        else:
+            rows.append([box])
+    return rows
+
+
+def set_region_column_ids(text_region: PageXMLTextRegion) -> None:
+    if text_region.main_type == 'column':
+        text_region.metadata['column_id'] = text_region.id
+    if 'column_id' not in text_region.metadata:
+        raise KeyError(f'missing column id: {text_region.metadata}')
+    for line in text_region.lines:
+        if line.metadata is None:
+            line.metadata = {'id': line.id}
+        if 'column_id' not in line.metadata:
+            line.metadata['column_id'] = text_region.metadata['column_id']
+
+
+class ReadingOrderIndex:
+
+    def __init__(self, doc: PageXMLDoc, min_band_lines: int = 3):
+        """A spatial index of the text regions and lines of a document, usually a page, that
+        is built once and from which the lines are read in reading order.
+
+        Reading order is: columns from left to right (or the text regions in the order of
+        the reading order of the document), and per text region the column bands from left
+        to right, lines in each band from top to bottom, and when (roughly) adjacent, from
+        left to right. Building the index takes O(n log n) time for n lines, as lines are only
+        compared to their neighbours after sorting. For ordinary single column text regions,
+        the order is the same as that of sort_lines_in_reading_order. Dense text regions with
+        several columns, like those of index and register pages, are read column by column.
+
+        :param doc: the document of which to order the lines, e.g. a page
+        :type doc: PageXMLDoc
+        :param min_band_lines: the minimum number of lines of each column band of a text region
+        :type min_band_lines: int
+        """
+        self.doc = doc
+        self.text_regions: List[PageXMLTextRegion] = []
+        # per text region the column bands, and per band the rows of lines
+        self.region_rows: List[List[List[List[LineBox]]]] = []
+        for text_region in sort_regions_in_reading_order(doc):
+            if not text_region.lines:
+                continue
+            set_region_column_ids(text_region)
+            boxes = [LineBox(line, index) for index, line in enumerate(text_region.lines)]
+            bands = split_column_bands(boxes, min_band_lines=min_band_lines)
+            self.text_regions.append(text_region)
+            self.region_rows.append([stack_band_lines(band) for band in bands])
+
+    def iter_lines(self) -> Generator[PageXMLTextLine, None, None]:
+        """Iterate over the lines of the document in reading order."""
+        for bands in self.region_rows:
+            for rows in bands:
+                for row in rows:
+                    for box in sorted(row, key=lambda x: x.left):
+                        yield box.line
+
+    def get_lines(self) -> List[PageXMLTextLine]:
+        return list(self.iter_lines())
+
+    def get_line_order(self) -> Dict[str, int]:
+        """Return the position in reading order of each line, by line id."""
+        return {line.id: position for position, line in enumerate(self.iter_lines())}
+
+
+def get_lines_in_reading_order(doc: PageXMLDoc, min_band_lines: int = 3) -> Generator[PageXMLTextLine, None, None]:
+    """Iterate over the lines of a PageXML document in reading order, see ReadingOrderIndex.
+
+    :param doc: the document of which to order the lines, e.g. a page
+    :type doc: PageXMLDoc
+    :param min_band_lines: the minimum number of lines of each column band of a text region
+    :type min_band_lines: int
+    :return: a generator of the lines in reading order
+    :rtype: Generator[PageXMLTextLine, None, None]
+    """
+    yield from ReadingOrderIndex(doc, min_band_lines=min_band_lines).iter_lines()
@@ -1,3 +1,4 @@
+from bisect import bisect_right
 from collections import Counter, defaultdict
 from typing import Dict, Generator, List, Set, Union
 import copy
@@ -16,6 +17,9 @@ from republic.helper.metadata_helper import make_scan_urls, make_iiif_region_url
 import republic.model.resolution_phrase_model as rpm
 
 
+line_end_non_word_pattern = re.compile(r"\W+$")
+
+
 class RepublicDoc(LogicalStructureDoc):
 
     def __init__(self, doc_id: str = None, doc_type: str = None, metadata: Union[None, Dict] = None,
@@ -93,6 +97,8 @@ class RepublicParagraph(RepublicDoc):
         if not self.id and 'id' in self.metadata:
             self.id = self.metadata['id']
         self.line_ranges = line_ranges if line_ranges else []
+        # the start offsets and lines of the line ranges, to look up lines by text offset
+        self.line_range_lookup: Union[None, Dict[str, list]] = None
         self.text = text if text else ""
         self.text_region_ids: Set[str] = set()
         if doc_type:
@@ -126,7 +132,12 @@ class RepublicParagraph(RepublicDoc):
         return json_data
 
     def set_text(self, word_freq_counter: Counter = None):
+        """Add the text of the lines to the paragraph text, removing line break hyphens, and
+        record the range of each line in the paragraph text. The line texts are collected
+        and joined once, so the text is assembled in time linear in its length."""
         self.line_ranges = []
+        line_texts = [self.text]
+        offset = len(self.text)
         for li, line in enumerate(self.lines):
             if line.text is None:
                 continue
@@ -140,24 +151,69 @@ class RepublicParagraph(RepublicDoc):
             elif line.text[-1] == "-":
                 line_text = line.text[:-1]
             elif line_ends_with_word_break(line, next_line, word_freq_counter):
-                line_text = re.split(r"\W+$", line.text)[0]
+                line_text = line_end_non_word_pattern.split(line.text)[0]
             elif (li + 1) == len(self.lines):
                 line_text = line.text
             else:
                 line_text = line.text + " "
             line_range = {
-                "start": len(self.text), "end": len(self.text + line_text),
+                "start": offset, "end": offset + len(line_text),
                 "line_id": line.id
             }
-            self.text += line_text
+            offset += len(line_text)
+            line_texts.append(line_text)
             self.line_ranges.append(line_range)
+        self.text = "".join(line_texts)
+        self.line_range_lookup = None
+
+    def get_line_range_lookup(self) -> Dict[str, list]:
+        """Return the start offsets of the line ranges and the corresponding lines. The
+        lookup is rebuilt when the line ranges are replaced or their number changes."""
+        lookup = self.line_range_lookup
+        if lookup is None or lookup["line_ranges"] is not self.line_ranges \
+                or len(lookup["starts"]) != len(self.line_ranges):
+            line_index = {line.id: line for line in self.lines}
+            lookup = {
+                "line_ranges": self.line_ranges,
+                "starts": [line_range["start"] for line_range in self.line_ranges],
+                "lines": [line_index.get(line_range["line_id"]) for line_range in self.line_ranges]
+            }
+            self.line_range_lookup = lookup
+        return lookup
+
+    def get_line_range_index(self, offset: int) -> Union[None, int]:
+        """Return the index of the line range that contains the character offset of the
+        paragraph text, or None if the offset is not part of any line.
+
+        :param offset: a character offset in the paragraph text
+        :type offset: int
+        :return: the index of the line range in line_ranges
+        :rtype: Union[None, int]
+        """
+        starts = self.get_line_range_lookup()["starts"]
+        # the line ranges are in text order, so the last range starting at or before the offset
+        index = bisect_right(starts, offset) - 1
+        if index < 0 or offset >= self.line_ranges[index]["end"]:
+            return None
+        return index
 
     def get_match_lines(self, match: PhraseMatch) -> List[PageXMLTextLine]:
-        # part_of_match = False
+        """Return the lines that the text of a phrase match in the paragraph text is part of.
+        The first line is found by bisection on the start offsets of the line ranges.
+
+        :param match: a phrase match in the paragraph text
+        :type match: PhraseMatch
+        :return: the lines that the match overlaps with
+        :rtype: List[PageXMLTextLine]
+        """
+        lookup = self.get_line_range_lookup()
         match_lines = []
-        for line_range in self.line_ranges:
-            if line_range["start"] <= match.offset < line_range["end"]:
-                match_lines.append(self.lines[line_range["line_index"]])
+        index = max(bisect_right(lookup["starts"], match.offset) - 1, 0)
+        for line_range, line in zip(self.line_ranges[index:], lookup["lines"][index:]):
+            if line_range["start"] >= match.end:
+                break
+            if line_range["end"] > match.offset and line is not None:
+                match_lines.append(line)
         return match_lines
 
 
@@ -165,20 +221,22 @@ def lines_to_paragraph_text(lines: List[dict], line_break_chars: str = '-',
                             term_freq: Counter = None):
     if term_freq:
         raise ValueError('term frequency handling is not yet implemented!')
-    paragraph_text = ''
+    line_texts = []
     line_ranges = []
+    offset = 0
     for line in lines:
         if line['text'][-1] in line_break_chars:
             line_text = line['text'][:-1]
         else:
             line_text = line['text'] + ' '
         line_range = {
-            "start": len(paragraph_text), "end": len(paragraph_text + line_text),
+            "start": offset, "end": offset + len(line_text),
             'line_id': line['metadata']['id']
         }
         line_ranges.append(line_range)
-        paragraph_text += line_text
-    return {'paragraph_text': paragraph_text, 'line_ranges': line_ranges}
+        line_texts.append(line_text)
+        offset += len(line_text)
+    return {'paragraph_text': ''.join(line_texts), 'line_ranges': line_ranges}
 
 
 class ResolutionElementDoc(RepublicDoc):
@@ -820,7 +878,8 @@ def make_resolution_annotation(resolution: Resolution, doc_text_offset: int, par
     return resolution_anno
 
 
-def make_session_text_version(session: Session):
+def make_session_text_version(session: Session, opening_searcher: Union[None, FuzzyPhraseSearcher] = None,
+                              verb_searcher: Union[None, FuzzyPhraseSearcher] = None):
     session.scan_versions = get_session_scans_version(session)
     annotations = []
     line_index = {
@@ -828,7 +887,8 @@ def make_session_text_version(session: Session):
     }
     session_text_offset = 0
     session_text = ''
-    opening_searcher, verb_searcher = configure_resolution_searchers()
+    if opening_searcher is None or verb_searcher is None:
+        opening_searcher, verb_searcher = get_resolution_searchers()
     resolutions = get_session_resolutions(session, opening_searcher, verb_searcher)
     for resolution in resolutions:
         resolution_anno = make_resolution_annotation(resolution, session_text_offset,
@@ -889,29 +949,57 @@ def sort_annotations(annotations: List[Dict[str, any]]) -> List[Dict[str, any]]:
     return sorted(annotations, key=lambda x: (x['start_offset'], order[x['type']]))
 
 
-def configure_resolution_searchers():
-    opening_searcher_config = {
-        "char_match_threshold": 0.7,
-        "ngram_threshold": 0.6,
-        "levenshtein_threshold": 0.7,
-        'filter_distractors': True,
-        'include_variants': True,
-        'ngram_size': 3,
-        'skip_size': 1,
-        'max_length_variance': 3
-    }
-    opening_searcher = FuzzyPhraseSearcher(opening_searcher_config)
-    opening_phrase_model = PhraseModel(model=rpm.proposition_opening_phrases, config=opening_searcher_config)
+opening_searcher_config = {
+    "char_match_threshold": 0.7,
+    "ngram_threshold": 0.6,
+    "levenshtein_threshold": 0.7,
+    'filter_distractors': True,
+    'include_variants': True,
+    'ngram_size': 3,
+    'skip_size': 1,
+    'max_length_variance': 3
+}
+
+verb_searcher_config = {
+    "char_match_threshold": 0.7,
+    "ngram_threshold": 0.6,
+    "levenshtein_threshold": 0.7,
+    'ngram_size': 3,
+    'skip_size': 1,
+    'max_length_variance': 1
+}
+
+# Resolution searchers are built once per process for each combination of configs. The cache
+# is a plain module-level dictionary, so worker processes that are forked after the searchers
+# are built inherit them, and the searchers themselves can be pickled to other processes.
+resolution_searchers: Dict[str, tuple] = {}
+
+
+def configure_resolution_searchers(opening_config: Union[None, dict] = None,
+                                   verb_config: Union[None, dict] = None):
+    """Build a new opening searcher and verb searcher for identifying resolutions in sessions."""
+    if opening_config is None:
+        opening_config = opening_searcher_config
+    if verb_config is None:
+        verb_config = verb_searcher_config
+    opening_searcher = FuzzyPhraseSearcher(opening_config)
+    opening_phrase_model = PhraseModel(model=rpm.proposition_opening_phrases, config=opening_config)
     opening_searcher.index_phrase_model(opening_phrase_model)
-    verb_searcher_config = {
-        "char_match_threshold": 0.7,
-        "ngram_threshold": 0.6,
-        "levenshtein_threshold": 0.7,
-        'ngram_size': 3,
-        'skip_size': 1,
-        'max_length_variance': 1
-    }
-    verb_searcher = FuzzyPhraseSearcher(verb_searcher_config)
-    verb_phrase_model = PhraseModel(model=rpm.proposition_verbs, config=verb_searcher_config)
+    verb_searcher = FuzzyPhraseSearcher(verb_config)
+    verb_phrase_model = PhraseModel(model=rpm.proposition_verbs, config=verb_config)
     verb_searcher.index_phrase_model(verb_phrase_model)
     return opening_searcher, verb_searcher
+
+
+def get_resolution_searchers(opening_config: Union[None, dict] = None,
+                             verb_config: Union[None, dict] = None):
+    """Return the opening searcher and verb searcher for the given configs, building
+    them only the first time they are requested in this process."""
+    if opening_config is None:
+        opening_config = opening_searcher_config
+    if verb_config is None:
+        verb_config = verb_searcher_config
+    config_key = json.dumps([opening_config, verb_config], sort_keys=True)
+    if config_key not in resolution_searchers:
+        resolution_searchers[config_key] = configure_resolution_searchers(opening_config, verb_config)
+    return resolution_searchers[config_key]
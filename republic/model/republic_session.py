@@ -1,9 +1,10 @@
-from typing import Dict, List, Union
+from typing import Dict, List, Tuple, Union
 from collections import defaultdict
 import copy
 import datetime
 
-from fuzzy_search.fuzzy_phrase_searcher import PhraseModel
+from fuzzy_search.fuzzy_phrase import Phrase
+from fuzzy_search.fuzzy_phrase_searcher import PhraseModel, FuzzyPhraseSearcher
 from fuzzy_search.fuzzy_match import PhraseMatch
 
 from republic.fuzzy.fuzzy_event_searcher import EventSearcher
@@ -52,6 +53,39 @@ session_opening_element_order = [
 ]
 
 
+# Session date phrases are shared between session searchers, so that the phrase for each
+# date string, with its skipgram index, is built only once per year and process. Building
+# these phrases is by far the largest part of building a session date searcher. Only the
+# phrases for one year are kept.
+session_date_phrases: Dict[int, Dict[str, Phrase]] = {}
+
+
+def get_session_date_phrase(year: int, phrase_string: str, label: str) -> Phrase:
+    """Return the phrase for a session date string or session year, building it only if
+    it is not yet in the shared session date phrase cache."""
+    if year not in session_date_phrases:
+        session_date_phrases.clear()
+        session_date_phrases[year] = {}
+    if phrase_string not in session_date_phrases[year]:
+        session_date_phrases[year][phrase_string] = Phrase({'phrase': phrase_string, 'label': label},
+                                                           ngram_size=sessiondate_config['ngram_size'],
+                                                           skip_size=sessiondate_config['skip_size'])
+    return session_date_phrases[year][phrase_string]
+
+
+def make_session_date_searcher(year: int, date_strings: List[str]) -> Tuple[PhraseModel, FuzzyPhraseSearcher]:
+    """Return a phrase model and fuzzy searcher for a list of session date strings and the session year.
+    The phrases are taken from the shared cache, so only the (small) searcher index is built."""
+    date_phrases = [get_session_date_phrase(year, date_string, 'session_date') for date_string in date_strings]
+    date_phrases += [get_session_date_phrase(year, str(year), 'session_year')]
+    phrase_model = PhraseModel(phrases=date_phrases, phrase_labels=date_phrases, config=sessiondate_config)
+    searcher = FuzzyPhraseSearcher(sessiondate_config)
+    searcher.index_phrase_model(phrase_model)
+    # when multiple date string match, only use the best matching one.
+    searcher.allow_overlapping_matches = False
+    return phrase_model, searcher
+
+
 def session_from_json(json_doc: dict) -> Session:
     """Turn a session JSON representation into a Session object."""
     return Session(metadata=json_doc['metadata'], columns=json_doc['columns'], evidence=json_doc['evidence'])
@@ -94,7 +128,9 @@ class SessionSearcher(EventSearcher):
                  phrase_model_list: List[Dict[str, Union[str, int, List[str]]]],
                  window_size: int = 30):
         """SessionSearcher extends the generic event searcher to specifically search for the lines
-        that express the opening of a new session in the resolutions."""
+        that express the opening of a new session in the resolutions. Session date searchers are
+        built from phrases that are shared per year, so advancing the session date doesn't
+        rebuild the phrases of the dates that were already in the previous date searcher."""
         super(self.__class__, self).__init__(window_size=window_size)
         # store the inventory number to add it to meeting metadata
         self.inventory_num = inventory_num
@@ -130,13 +166,10 @@ class SessionSearcher(EventSearcher):
         """Add a fuzzy searcher configured with a session date phrase model"""
         # generate session date strings for the current day and next six days
         self.date_strings = get_next_date_strings(self.current_date, num_dates=num_dates, include_year=False)
-        # generate session date phrases for the first week covered in this inventory
-        date_phrases = [{'phrase': date_string, 'label': 'session_date'} for date_string in self.date_strings]
-        date_phrases += [{'phrase': str(self.year), 'label': 'session_year'}]
-        self.phrase_models['date_searcher'] = PhraseModel(model=date_phrases, config=sessiondate_config)
-        self.add_searcher(sessiondate_config, 'date_searcher', self.phrase_models['date_searcher'])
-        # when multiple date string match, only use the best matching one.
-        self.searchers['date_searcher'].allow_overlapping_matches = False
+        # index the (shared) phrases of these session dates in a new date searcher
+        phrase_model, searcher = make_session_date_searcher(self.year, self.date_strings)
+        self.phrase_models['date_searcher'] = phrase_model
+        self.searchers['date_searcher'] = searcher
 
     def update_session_date_searcher(self,
                                      current_date: Union[None, RepublicDate] = None,
@@ -2,7 +2,9 @@
 # Created on: 2018-08-13
 # Context: parsing digitized charter books to extract geographic attestations and dates
 from bs4 import BeautifulSoup as bsoup
-from typing import Union
+from lxml import etree
+from typing import Dict, List, Union
+import re
 
 
 def set_carea(hocr_doc_soup):
@@ -36,12 +38,8 @@ class HOCRDoc(object):
         length of recognised words in OHZ charter books.
 
         """
-        self.tag = hocr_doc_soup.name
         self.doc_id = doc_id
-        self.class_ = hocr_doc_soup['class']
-        self.attributes = get_hocr_title_attributes(hocr_doc_soup)
-        self.box = get_hocr_box(hocr_doc_soup)
-        self.carea = set_carea(hocr_doc_soup)
+        self.set_element_properties(hocr_doc_soup)
         self.lines = []
         self.paragraphs = []
         self.minimum_paragraph_gap = 10
@@ -57,6 +55,13 @@ class HOCRDoc(object):
         if "tiny_word_width" in config:
             self.tiny_word_width = config["tiny_word_width"]
 
+    def set_element_properties(self, hocr_doc_soup):
+        self.tag = hocr_doc_soup.name
+        self.class_ = hocr_doc_soup['class']
+        self.attributes = get_hocr_title_attributes(hocr_doc_soup)
+        self.box = get_hocr_box(hocr_doc_soup)
+        self.carea = set_carea(hocr_doc_soup)
+
     def set_paragraphs(self, hocr_soup):
         line_count = 0
         for hocr_paragraph_soup in get_hocr_pars(hocr_soup):
@@ -296,7 +301,12 @@ def make_hocr_doc(filepath: str, hocr_data: Union[str, None] = None,
     """
     make_hocr_doc takes as input a filepath to a hOCR file and generates various textual representations of
     the hOCR data. For explanation of the optional arguments, see the HOCRPAGE class above.
+
+    By default, the hOCR data is parsed with lxml (see make_lxml_hocr_doc), set the config
+    property 'hocr_parser' to 'bs4' to parse it with Beautiful Soup.
     """
+    if config.get("hocr_parser", "lxml") == "lxml":
+        return make_lxml_hocr_doc(filepath, hocr_data=hocr_data, doc_id=doc_id, config=config)
     if hocr_data:
         hocr_soup = bsoup(hocr_data, "lxml")
     else:
@@ -313,3 +323,154 @@ def make_hocr_doc(filepath: str, hocr_data: Union[str, None] = None,
     hocr_doc.set_paragraphs(hocr_doc_soup)
     hocr_doc.merge_paragraph_lines()
     return hocr_doc
+
+
+##############################################################
+# Parsing hOCR with lxml, without building a Beautiful Soup. #
+##############################################################
+
+# The lxml HTML parser is the parser that Beautiful Soup uses with the 'lxml' feature,
+# so the element tree has the same structure as the soup.
+hocr_html_parser = etree.HTMLParser(encoding="utf-8")
+
+hocr_bbox_pattern = re.compile(r"\bbbox (-?\d+) (-?\d+) (-?\d+) (-?\d+)")
+hocr_wconf_pattern = re.compile(r"\bx_wconf (-?\d+)")
+
+
+def make_hocr_class_xpath(tag: str, class_name: str) -> etree.XPath:
+    # select descendants with class_name as one of their classes, like Beautiful Soup's class_ search
+    return etree.XPath(f'.//{tag}[contains(concat(" ", normalize-space(@class), " "), " {class_name} ")]')
+
+
+find_lxml_hocr_page = make_hocr_class_xpath("div", "ocr_page")
+find_lxml_hocr_carea = make_hocr_class_xpath("div", "ocr_carea")
+find_lxml_hocr_pars = make_hocr_class_xpath("p", "ocr_par")
+find_lxml_hocr_lines = make_hocr_class_xpath("span", "ocr_line")
+find_lxml_hocr_words = make_hocr_class_xpath("span", "ocrx_word")
+
+
+def get_lxml_hocr_content(hocr_file: str) -> etree._Element:
+    with open(hocr_file, 'rt') as fh:
+        return parse_lxml_hocr_data(fh.read())
+
+
+def parse_lxml_hocr_data(hocr_data: Union[str, bytes]) -> etree._Element:
+    if isinstance(hocr_data, str):
+        hocr_data = hocr_data.encode("utf-8")
+    return etree.fromstring(hocr_data, hocr_html_parser)
+
+
+def get_lxml_hocr_bbox(hocr_element: etree._Element) -> List[int]:
+    """Return the bounding box in the title attribute of a hOCR element,
+    with a precompiled pattern instead of splitting all title attributes."""
+    match = hocr_bbox_pattern.search(hocr_element.get("title"))
+    return [int(coord) for coord in match.groups()]
+
+
+def get_lxml_hocr_box(hocr_element: etree._Element) -> Dict[str, Union[int, List[int]]]:
+    left, top, right, bottom = get_lxml_hocr_bbox(hocr_element)
+    return {
+        "bbox": [left, top, right, bottom],
+        "width": right - left,
+        "height": bottom - top,
+        "left": left,
+        "right": right,
+        "top": top,
+        "bottom": bottom
+    }
+
+
+def get_lxml_hocr_title_attributes(hocr_element: etree._Element) -> Dict[str, str]:
+    return {part.split(" ", 1)[0]: part.split(" ", 1)[1] for part in hocr_element.get("title").split("; ")}
+
+
+def get_lxml_word_conf(hocr_word: etree._Element) -> Union[int, None]:
+    match = hocr_wconf_pattern.search(hocr_word.get("title"))
+    return int(match.group(1)) if match else None
+
+
+def get_lxml_word(hocr_word: etree._Element) -> Dict[str, any]:
+    word = get_lxml_hocr_box(hocr_word)
+    word["word_text"] = "".join(hocr_word.itertext())
+    word["word_conf"] = get_lxml_word_conf(hocr_word)
+    return word
+
+
+def get_lxml_words(hocr_line: etree._Element) -> List[Dict[str, any]]:
+    return [get_lxml_word(hocr_word) for hocr_word in find_lxml_hocr_words(hocr_line)]
+
+
+class LxmlHOCRDoc(HOCRDoc):
+
+    def __init__(self, hocr_doc_element: etree._Element, doc_id=None, config={}):
+        """A HOCRDoc parsed from an lxml element tree instead of a Beautiful Soup. It has
+        the same properties and the lines, words and paragraphs have the same structure."""
+        super().__init__(hocr_doc_element, doc_id=doc_id, config=config)
+
+    def set_element_properties(self, hocr_doc_element):
+        self.tag = hocr_doc_element.tag
+        self.class_ = hocr_doc_element.get("class").split()
+        self.attributes = get_lxml_hocr_title_attributes(hocr_doc_element)
+        self.box = get_lxml_hocr_box(hocr_doc_element)
+        careas = find_lxml_hocr_carea(hocr_doc_element)
+        self.carea = get_lxml_hocr_box(careas[0]) if len(careas) > 0 else None
+
+    def set_paragraphs(self, hocr_doc_element):
+        line_count = 0
+        for hocr_paragraph in find_lxml_hocr_pars(hocr_doc_element):
+            paragraph = get_lxml_hocr_box(hocr_paragraph)
+            paragraph["type"] = None
+            num_lines = len(find_lxml_hocr_lines(hocr_paragraph))
+            paragraph["line_numbers"] = list(range(line_count + 1, line_count + num_lines + 1))
+            paragraph["line_texts"] = []
+            if hocr_paragraph.get("lang") is not None:
+                paragraph["lang"] = hocr_paragraph.get("lang")
+            line_count += num_lines
+            self.paragraphs.append(paragraph)
+
+    def set_lines(self, hocr_doc_element):
+        for hocr_line in find_lxml_hocr_lines(hocr_doc_element):
+            line = get_lxml_hocr_box(hocr_line)
+            line["words"] = get_lxml_words(hocr_line)
+            line["line_text"] = " ".join([word["word_text"] for word in line["words"]])
+            line["spaced_line_text"] = self.get_spaced_line_text(line["words"])
+            # occasionally, lines only contain a pipe char based on edge shading in scan
+            # skip those lines.
+            if line["line_text"].strip() == "|" or len(line["line_text"]) == 1:
+                continue
+            self.lines.append(line)
+
+
+def make_lxml_hocr_doc(filepath: str, hocr_data: Union[str, bytes, None] = None,
+                       doc_id: Union[str, None] = None, config: dict = {}) -> Union[LxmlHOCRDoc, None]:
+    """Parse a hOCR file or string with lxml and return a HOCRDoc with the same
+    lines, words and paragraphs as make_hocr_doc with Beautiful Soup, or None if
+    the document has no page or content area.
+
+    :param filepath: the path to the hOCR file, used if no hOCR data is given
+    :type filepath: str
+    :param hocr_data: the content of the hOCR file
+    :type hocr_data: Union[str, bytes, None]
+    :param doc_id: the id of the document
+    :type doc_id: Union[str, None]
+    :param config: the configuration with layout settings, see HOCRDoc
+    :type config: dict
+    :return: the parsed hOCR document
+    :rtype: Union[LxmlHOCRDoc, None]
+    """
+    if hocr_data:
+        hocr_root = parse_lxml_hocr_data(hocr_data)
+    else:
+        hocr_root = get_lxml_hocr_content(filepath)
+    if hocr_root is None:
+        return None
+    hocr_pages = find_lxml_hocr_page(hocr_root)
+    if len(hocr_pages) == 0:
+        return None
+    hocr_doc = LxmlHOCRDoc(hocr_pages[0], doc_id=doc_id, config=config)
+    if not hocr_doc.carea:
+        return None
+    hocr_doc.set_lines(hocr_pages[0])
+    hocr_doc.set_paragraphs(hocr_pages[0])
+    hocr_doc.merge_paragraph_lines()
+    return hocr_doc
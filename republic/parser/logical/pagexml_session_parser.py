@@ -1,5 +1,5 @@
-from typing import List, Dict, Generator, Union, Iterator
-from collections import defaultdict
+from typing import Deque, List, Dict, Generator, Union, Iterator
+from collections import defaultdict, deque
 import copy
 
 from republic.model.physical_document_model import PageXMLPage, PageXMLTextLine, PageXMLTextRegion
@@ -9,7 +9,7 @@ from republic.model.republic_date import RepublicDate, derive_date_from_string
 from republic.model.republic_session import SessionSearcher, calculate_work_day_shift
 from republic.model.republic_session import session_opening_element_order
 from republic.model.republic_document_model import Session
-from republic.model.physical_document_model import sort_lines_in_reading_order
+from republic.model.reading_order import get_lines_in_reading_order
 
 
 def initialize_inventory_date(inv_metadata: dict) -> RepublicDate:
@@ -25,7 +25,7 @@ def stream_resolution_page_lines(pages: List[PageXMLPage]) -> Generator[PageXMLT
     for page in pages:
         if not page.columns:
             continue
-        for line in sort_lines_in_reading_order(page):
+        for line in get_lines_in_reading_order(page):
             yield line
 
 
@@ -127,26 +127,31 @@ class GatedWindow:
         self.window_size = window_size
         self.middle_doc = int(window_size/2)
         # fill the sliding window with empty elements, so that first documents are appended at the end.
-        self.sliding_window: List[Union[None, PageXMLTextLine]] = [None] * window_size
+        # The deques drop the earliest element when a new element is appended to a full window.
+        self.sliding_window: Deque[Union[None, PageXMLTextLine]] = deque([None] * window_size, maxlen=window_size)
         self.open_threshold = open_threshold
         self.shut_threshold = shut_threshold
         self.gate_open = False
+        # running count of the characters in the sliding window
         self.num_chars = 0
-        self.let_through: List[bool] = [False] * window_size
+        self.let_through: Deque[bool] = deque([False] * window_size, maxlen=window_size)
 
     def add_line(self, line: PageXMLTextLine):
         """Add a document to the sliding window. doc should be a dictionary with
         the 'text' property containing the document text."""
-        if len(self.sliding_window) >= self.window_size:
-            self.sliding_window = self.sliding_window[-self.window_size+1:]
-            self.let_through = self.let_through[-self.window_size+1:]
-        self.let_through += [False]
-        self.sliding_window += [line]
+        if len(self.sliding_window) == self.window_size:
+            first_line = self.sliding_window[0]
+            if first_line:
+                self.num_chars -= len(first_line.text)
+        self.let_through.append(False)
+        self.sliding_window.append(line)
+        if line:
+            self.num_chars += len(line.text)
         self.check_treshold()
 
     def num_chars_in_window(self) -> int:
         """Return the number of characters in the sliding window documents."""
-        return sum([len(line.text) for line in self.sliding_window if line])
+        return self.num_chars
 
     def check_treshold(self) -> None:
         """Check whether the number of characters in the sliding window crosses
@@ -196,6 +201,7 @@ def get_sessions(sorted_pages: List[PageXMLPage], inv_config: dict,
         # before modifying, make sure we're working on a copy
         # remove all word-level objects, as we only need the text
         line.words = []
+        line.invalidate_counts()
         # list all lines belonging to the same session date
         session_lines += [line]
         if line.text is None or line.text == '':
@@ -1,12 +1,14 @@
-from typing import List, Dict, Union
+from typing import Dict, Generator, List, Tuple, Union
 from datetime import datetime
 from dateutil.parser import parse as date_parse
 import re
+import xml.etree.ElementTree as ET
 
 import xmltodict
 
 from republic.model.physical_document_model import Baseline, Coords, parse_derived_coords
 from republic.model.physical_document_model import PageXMLScan, PageXMLTextLine, PageXMLTextRegion, PageXMLWord
+from republic.model.physical_document_model import PageXMLDoc
 
 
 def parse_coords(coords: dict) -> Union[Coords, None]:
@@ -183,9 +185,13 @@ def read_pagexml_file(pagexml_file: str) -> str:
         return fh.read()
 
 
-def parse_pagexml_file(pagexml_file: str, pagexml_data: Union[str, None] = None) -> PageXMLScan:
+def parse_pagexml_file(pagexml_file: str, pagexml_data: Union[str, None] = None,
+                       streaming: bool = False) -> PageXMLScan:
     """Read PageXML from file (or passed separately if read from elsewhere, e.g. tarball)
-    and return a PageXMLScan object."""
+    and return a PageXMLScan object. If streaming is True, the PageXMLScan is built directly
+    from incremental parse events, see stream_parse_pagexml_file."""
+    if streaming:
+        return stream_parse_pagexml_file(pagexml_file, pagexml_data=pagexml_data)
     if not pagexml_data:
         pagexml_data = read_pagexml_file(pagexml_file)
     scan_json = xmltodict.parse(pagexml_data)
@@ -216,3 +222,205 @@ def parse_pagexml_json(scan_json: dict) -> PageXMLScan:
         reading_order = {}
     scan_doc = PageXMLScan(metadata=metadata, coords=coords, text_regions=text_regions, reading_order=reading_order)
     return scan_doc
+
+
+##########################################################
+# Streaming parser: builds the PageXMLScan directly from #
+# incremental parse events instead of an xmltodict tree. #
+##########################################################
+
+def split_tag(tag: str) -> Tuple[str, str]:
+    """Split an ElementTree tag in its namespace prefix and local name."""
+    if tag[0] == '{':
+        namespace, name = tag[1:].split('}', 1)
+        return '{' + namespace + '}', name
+    return '', tag
+
+
+def element_text(element: ET.Element) -> Union[None, str]:
+    """Return the stripped character data of an element, like xmltodict does."""
+    data = ''.join([element.text or ''] + [child.tail or '' for child in element])
+    return data.strip() or None
+
+
+def element_to_dict(element: ET.Element) -> Union[None, str, dict]:
+    """Convert a (small) element into the same representation as xmltodict. This is
+    only used for leaf-like elements such as Metadata, ReadingOrder and Unicode."""
+    value = {'@' + split_tag(key)[1]: attr for key, attr in element.attrib.items()}
+    for child in element:
+        child_tag = split_tag(child.tag)[1]
+        child_value = element_to_dict(child)
+        if child_tag not in value:
+            value[child_tag] = child_value
+        elif isinstance(value[child_tag], list):
+            value[child_tag].append(child_value)
+        else:
+            value[child_tag] = [value[child_tag], child_value]
+    text = element_text(element)
+    if not value:
+        return text
+    if text:
+        value['#text'] = text
+    return value
+
+
+def find_children(element: ET.Element, tag: str) -> List[ET.Element]:
+    return [child for child in element if child.tag == tag]
+
+
+def parse_coords_element(coords_element: Union[None, ET.Element]) -> Union[Coords, None]:
+    if coords_element is None or 'points' not in coords_element.attrib:
+        return None
+    return Coords(points=coords_element.attrib['points'])
+
+
+def parse_element_custom_metadata(element: ET.Element) -> Union[None, Dict[str, any]]:
+    if 'custom' not in element.attrib:
+        return None
+    return parse_custom_metadata({'@custom': element.attrib['custom']})
+
+
+def parse_text_equiv_element(text_equivs: List[ET.Element], ns: str = '') -> Union[None, str]:
+    if len(text_equivs) != 1:
+        return None
+    text_equiv = text_equivs[0]
+    if len(text_equiv) == 0 and not text_equiv.attrib:
+        return element_text(text_equiv)
+    for child_tag in ['Unicode', 'PlainText']:
+        children = find_children(text_equiv, ns + child_tag)
+        if len(children) > 0:
+            return element_to_dict(children[0]) if len(children) == 1 \
+                else [element_to_dict(child) for child in children]
+    return None
+
+
+def find_first_child(element: ET.Element, tag: str, ns: str = '') -> ET.Element:
+    """Return the first child element with the given tag, raising a KeyError like the
+    dictionary based parser does when it is missing."""
+    for child in element:
+        if child.tag == ns + tag:
+            return child
+    raise KeyError(tag)
+
+
+def parse_word_element(word_element: ET.Element, ns: str = '') -> PageXMLWord:
+    text_equiv = find_first_child(word_element, 'TextEquiv', ns=ns)
+    unicode_value = element_to_dict(find_first_child(text_equiv, 'Unicode', ns=ns))
+    try:
+        unicode_string = unicode_value if isinstance(unicode_value, str) else unicode_value['#text']
+        return PageXMLWord(text=unicode_string,
+                           doc_id=word_element.attrib.get('id'),
+                           metadata=parse_element_custom_metadata(word_element),
+                           coords=parse_coords_element(find_first_child(word_element, 'Coords', ns=ns)),
+                           conf=text_equiv.attrib.get('conf'))
+    except TypeError:
+        print('Unexpected format for Word Unicode representation:', element_to_dict(word_element))
+        raise
+
+
+def parse_textline_element(textline_element: ET.Element, ns: str = '') -> PageXMLTextLine:
+    # like the dictionary based parser, a line without coords is an error
+    coords_element = find_first_child(textline_element, 'Coords', ns=ns)
+    baseline_elements = find_children(textline_element, ns + 'Baseline')
+    if len(baseline_elements) == 0:
+        raise KeyError('Baseline')
+    return PageXMLTextLine(xheight=int(textline_element.attrib['xheight'])
+                           if 'xheight' in textline_element.attrib else None,
+                           doc_id=textline_element.attrib.get('id'),
+                           metadata=parse_element_custom_metadata(textline_element),
+                           coords=parse_coords_element(coords_element),
+                           baseline=Baseline(points=baseline_elements[0].attrib['points']),
+                           text=parse_text_equiv_element(find_children(textline_element, ns + 'TextEquiv'), ns),
+                           words=[parse_word_element(word_element, ns) for word_element in
+                                  find_children(textline_element, ns + 'Word')])
+
+
+def parse_textregion_element(text_region_element: ET.Element, parsed: Dict[ET.Element, PageXMLDoc],
+                             ns: str = '') -> PageXMLTextRegion:
+    """Make a PageXMLTextRegion from a TextRegion element, taking its child lines and
+    text regions from the already parsed elements. As with parse_textregion, the type of
+    child element that occurs first determines from which children the coords are
+    derived if the region has none."""
+    coords_elements = find_children(text_region_element, ns + 'Coords')
+    text_region = PageXMLTextRegion(
+        doc_id=text_region_element.attrib.get('id'),
+        orientation=float(text_region_element.attrib['orientation'])
+        if 'orientation' in text_region_element.attrib else None,
+        coords=parse_coords_element(coords_elements[0]) if len(coords_elements) == 1 else None,
+        metadata=parse_element_custom_metadata(text_region_element),
+    )
+    if text_region.metadata and 'type' in text_region.metadata:
+        text_region.add_type(text_region.metadata['type'])
+    children = {}
+    for child in text_region_element:
+        if child.tag == ns + 'TextLine' or child.tag == ns + 'TextRegion':
+            children.setdefault(child.tag, []).append(parsed.pop(child))
+    for child_tag in children:
+        if child_tag == ns + 'TextLine':
+            text_region.lines = children[child_tag]
+            if not text_region.coords:
+                text_region.coords = parse_derived_coords(text_region.lines)
+        if child_tag == ns + 'TextRegion':
+            text_region.text_regions = children[child_tag]
+            if not text_region.coords:
+                text_region.coords = parse_derived_coords(text_region.text_regions)
+    return text_region
+
+
+def iter_pagexml_end_events(pagexml_file: str, pagexml_data: Union[str, None] = None,
+                            chunk_size: int = 64 * 1024) -> Generator[Tuple[str, ET.Element], None, None]:
+    """Feed the PageXML data to a pull parser in chunks and yield the element end events."""
+    if not pagexml_data:
+        yield from ET.iterparse(pagexml_file, events=('end',))
+        return None
+    parser = ET.XMLPullParser(events=('end',))
+    for start in range(0, len(pagexml_data), chunk_size):
+        parser.feed(pagexml_data[start:start + chunk_size])
+        yield from parser.read_events()
+    parser.close()
+    yield from parser.read_events()
+
+
+def stream_parse_pagexml_file(pagexml_file: str, pagexml_data: Union[str, None] = None) -> PageXMLScan:
+    """Read PageXML from file (or passed separately if read from elsewhere, e.g. tarball)
+    and return a PageXMLScan object. Instead of converting the whole document to nested
+    dictionaries first, lines and text regions are turned into objects as soon as their
+    closing tag is parsed, after which their elements are discarded. The resulting
+    PageXMLScan is the same as that of parse_pagexml_file."""
+    metadata = {}
+    coords, text_regions, reading_order = None, None, {}
+    # parsed lines and text regions by element, until they are collected by their parent
+    parsed: Dict[ET.Element, PageXMLDoc] = {}
+    ns = None
+    for event, element in iter_pagexml_end_events(pagexml_file, pagexml_data=pagexml_data):
+        if ns is None:
+            # all PageXML elements share the namespace of the first element
+            ns = split_tag(element.tag)[0]
+        if element.tag == ns + 'TextLine':
+            parsed[element] = parse_textline_element(element, ns)
+        elif element.tag == ns + 'TextRegion':
+            parsed[element] = parse_textregion_element(element, parsed, ns)
+        elif element.tag == ns + 'Page':
+            if element.attrib['imageWidth'] != '0' and element.attrib['imageHeight'] != '0':
+                coords = parse_page_image_size({'@imageWidth': element.attrib['imageWidth'],
+                                                '@imageHeight': element.attrib['imageHeight']})
+            page_text_regions = [parsed.pop(child) for child in element if child.tag == ns + 'TextRegion']
+            if len(page_text_regions) > 0:
+                text_regions = page_text_regions
+            reading_order_elements = find_children(element, ns + 'ReadingOrder')
+            if len(reading_order_elements) == 1:
+                reading_order_value = element_to_dict(reading_order_elements[0])
+                if reading_order_value:
+                    reading_order = parse_page_reading_order({'ReadingOrder': reading_order_value})
+        elif element.tag == ns + 'Metadata':
+            metadata_value = element_to_dict(element)
+            if metadata_value:
+                metadata = parse_page_metadata(metadata_value)
+        else:
+            continue
+        # the element is fully processed, so discard its content. The (empty)
+        # element itself is still needed to look up its parsed object.
+        element.clear()
+    scan_doc = PageXMLScan(metadata=metadata, coords=coords, text_regions=text_regions, reading_order=reading_order)
+    scan_doc.metadata['filename'] = pagexml_file
+    return scan_doc
@@ -31,7 +31,8 @@ def get_scan_pagexml(pagexml_file: str, inventory_config: dict,
                      pagexml_data: Union[str, None] = None) -> PageXMLScan:
     # print('Parsing file', pagexml_file)
     try:
-        scan_doc = pagexml_parser.parse_pagexml_file(pagexml_file, pagexml_data=pagexml_data)
+        scan_doc = pagexml_parser.parse_pagexml_file(pagexml_file, pagexml_data=pagexml_data,
+                                                     streaming=inventory_config.get('streaming_pagexml_parser', False))
         scan_doc.reading_order = {}
     except (AssertionError, KeyError, TypeError):
         print('Error parsing file', pagexml_file)
@@ -336,6 +337,7 @@ def split_column_regions(page_doc: PageXMLPage) -> PageXMLPage:
         # if there is an overlapping column, add this text region
         if overlapping_column:
             overlapping_column.text_regions += [text_region]
+            overlapping_column.invalidate_counts()
             overlapping_column.coords = parse_derived_coords(overlapping_column.text_regions)
         # if no, create a new column for this text region
         else:
@@ -449,6 +451,7 @@ def split_pagexml_scan(scan_doc: PageXMLScan) -> List[PageXMLPage]:
                                                                                column.coords)
                     page.add_child(column)
             page.text_regions = []
+            page.invalidate_counts()
     for page in pages:
         for text_region in page.columns + page.extra:
             text_region.set_derived_id(scan_doc.id)
@@ -3,7 +3,7 @@ import glob
 import xmltodict
 from typing import Union, List, Dict
 from collections import defaultdict
-from republic.model.inventory_mapping import inventory_mapping, get_inventory_by_num
+from republic.model.inventory_mapping import get_inventory_by_num
 from republic.helper.metadata_helper import format_scan_number, make_scan_urls
 from republic.parser.hocr.generic_hocr_parser import make_hocr_doc
 from republic.parser.hocr.republic_index_page_parser import count_page_ref_lines
@@ -127,21 +127,13 @@ def get_inventory_num(fname: str) -> int:
 
 
 def get_inventory_period(fname: str) -> Union[str, None]:
-    inventory_num = get_inventory_num(fname)
-    for inventory_map in inventory_mapping:
-        if inventory_num == inventory_map["inventory_num"]:
-            return inventory_map["period"]
-    else:
-        return None
+    inventory_map = get_inventory_by_num(get_inventory_num(fname))
+    return inventory_map["period"] if inventory_map else None
 
 
 def get_inventory_year(fname: str) -> Union[int, None]:
-    inventory_num = get_inventory_num(fname)
-    for inventory in inventory_mapping:
-        if inventory_num == inventory["inventory_num"]:
-            return inventory["year"]
-    else:
-        return None
+    inventory = get_inventory_by_num(get_inventory_num(fname))
+    return inventory["year"] if inventory else None
 
 
 def get_column_num(fname: str) -> int:
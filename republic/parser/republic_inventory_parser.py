@@ -1,3 +1,7 @@
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Union
+import multiprocessing
 import os
 import zipfile
 
@@ -6,32 +10,117 @@ import republic.parser.hocr.republic_page_parser as hocr_page_parser
 import republic.parser.pagexml.republic_pagexml_parser as pagexml_parser
 
 
-def parse_inventory_from_zip(inventory_num: int, inventory_config: dict) -> iter:
+default_zip_parsing_config = {
+    # number of worker processes that parse the scans of an inventory zip,
+    # 1 means parsing sequentially in the current process
+    'num_workers': 1,
+    # maximum number of scans that are being parsed or waiting to be consumed per worker
+    'max_in_flight_per_worker': 4,
+}
+
+# the archive opened by each zip parsing worker process
+worker_zip_file: Union[None, zipfile.ZipFile] = None
+worker_inventory_config: Union[None, dict] = None
+
+
+def get_inventory_zip_file(inventory_num: int, inventory_config: dict) -> str:
     ocr_dir = os.path.join(inventory_config['base_dir'], inventory_config['ocr_type'])
-    inv_file = os.path.join(ocr_dir, f'{inventory_num}.zip')
-    z = zipfile.ZipFile(inv_file)
-    for scan_file in z.namelist():
-        with z.open(scan_file) as fh:
-            scan_data = fh.read()
-            if inventory_config['ocr_type'] == 'hocr':
-                scan_info = file_parser.get_scan_info(scan_file, inventory_config['data_dir'])
-                scan_doc = hocr_page_parser.get_scan_hocr(scan_info, hocr_data=scan_data, config=inventory_config)
-            else:
-                scan_doc = pagexml_parser.get_scan_pagexml(scan_file, inventory_config, pagexml_data=scan_data)
-            yield scan_doc
+    return os.path.join(ocr_dir, f'{inventory_num}.zip')
+
+
+def get_zip_parsing_config(inventory_config: dict) -> Dict[str, int]:
+    zip_parsing_config = {key: value for key, value in default_zip_parsing_config.items()}
+    if 'zip_parsing' in inventory_config:
+        zip_parsing_config.update(inventory_config['zip_parsing'])
+    return zip_parsing_config
+
+
+def parse_zip_scan(z: zipfile.ZipFile, scan_file: str, inventory_config: dict):
+    """Read a scan file from an inventory zip archive and parse it as hOCR or PageXML."""
+    with z.open(scan_file) as fh:
+        scan_data = fh.read()
+    if inventory_config['ocr_type'] == 'hocr':
+        scan_info = file_parser.get_scan_info(scan_file, inventory_config['data_dir'])
+        return hocr_page_parser.get_scan_hocr(scan_info, hocr_data=scan_data, config=inventory_config)
+    else:
+        return pagexml_parser.get_scan_pagexml(scan_file, inventory_config, pagexml_data=scan_data)
+
+
+def init_zip_worker(inv_file: str, inventory_config: dict) -> None:
+    # each worker opens the archive itself, as a ZipFile can't be shared between processes
+    global worker_zip_file, worker_inventory_config
+    worker_zip_file = zipfile.ZipFile(inv_file)
+    worker_inventory_config = inventory_config
+
+
+def parse_zip_scan_in_worker(scan_file: str):
+    return parse_zip_scan(worker_zip_file, scan_file, worker_inventory_config)
+
+
+def parse_inventory_from_zip(inventory_num: int, inventory_config: dict,
+                             num_workers: Union[None, int] = None) -> iter:
+    """Parse the scans in the zip archive of an inventory, yielding them in the order
+    of the archive. With more than one worker, the scans are distributed over worker
+    processes that each open the archive independently. The number of scans that are
+    being parsed or waiting to be consumed is bounded by max_in_flight_per_worker per
+    worker, so memory use doesn't grow when the consumer is slower than the workers.
+
+    :param inventory_num: the number of the inventory
+    :type inventory_num: int
+    :param inventory_config: the inventory configuration, with the optional 'zip_parsing'
+    settings num_workers and max_in_flight_per_worker
+    :type inventory_config: dict
+    :param num_workers: the number of worker processes, overrides the config
+    :type num_workers: Union[None, int]
+    :return: an iterator over the parsed scans
+    :rtype: iter
+    """
+    inv_file = get_inventory_zip_file(inventory_num, inventory_config)
+    zip_parsing_config = get_zip_parsing_config(inventory_config)
+    if num_workers is None:
+        num_workers = zip_parsing_config['num_workers']
+    if num_workers > 1 and multiprocessing.current_process().daemon:
+        # e.g. when the inventory itself is processed in a worker of a multiprocessing pool
+        print('Cannot start zip parsing workers from a daemonic process, parsing sequentially')
+        num_workers = 1
+    if num_workers <= 1:
+        with zipfile.ZipFile(inv_file) as z:
+            for scan_file in z.namelist():
+                yield parse_zip_scan(z, scan_file, inventory_config)
+        return None
+    with zipfile.ZipFile(inv_file) as z:
+        scan_files = z.namelist()
+    max_in_flight = num_workers * zip_parsing_config['max_in_flight_per_worker']
+    yield from parse_zip_scans_in_parallel(inv_file, scan_files, inventory_config, num_workers, max_in_flight)
+
+
+def parse_zip_scans_in_parallel(inv_file: str, scan_files: List[str], inventory_config: dict,
+                                num_workers: int, max_in_flight: int) -> iter:
+    with ProcessPoolExecutor(max_workers=num_workers, initializer=init_zip_worker,
+                             initargs=(inv_file, inventory_config)) as executor:
+        futures = deque()
+        scan_file_iter = iter(scan_files)
+        try:
+            for scan_file in scan_file_iter:
+                futures.append(executor.submit(parse_zip_scan_in_worker, scan_file))
+                if len(futures) >= max_in_flight:
+                    break
+            while len(futures) > 0:
+                # wait for the oldest scan, so scans are yielded in archive order
+                scan_doc = futures.popleft().result()
+                next_scan_file = next(scan_file_iter, None)
+                if next_scan_file is not None:
+                    futures.append(executor.submit(parse_zip_scan_in_worker, next_scan_file))
+                yield scan_doc
+        finally:
+            # if the consumer stops early or parsing fails, don't parse the remaining scans
+            for future in futures:
+                future.cancel()
 
 
 def parse_inventory_from_text_repo(inventory_num: int, inventory_config: dict,
                                    inventory_metadata: dict) -> iter:
-    ocr_dir = os.path.join(inventory_config['base_dir'], inventory_config['ocr_type'])
-    inv_file = os.path.join(ocr_dir, f'{inventory_num}.zip')
+    inv_file = get_inventory_zip_file(inventory_num, inventory_config)
     z = zipfile.ZipFile(inv_file)
     for scan_file in z.namelist():
-        with z.open(scan_file) as fh:
-            scan_data = fh.read()
-            if inventory_config['ocr_type'] == 'hocr':
-                scan_info = file_parser.get_scan_info(scan_file, inventory_config['data_dir'])
-                scan_doc = hocr_page_parser.get_scan_hocr(scan_info, hocr_data=scan_data, config=inventory_config)
-            else:
-                scan_doc = pagexml_parser.get_scan_pagexml(scan_file, inventory_config, pagexml_data=scan_data)
-            yield scan_doc
+        yield parse_zip_scan(z, scan_file, inventory_config)